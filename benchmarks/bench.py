@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Load benchmarks for the drop serving path.
+
+Builds synthetic registries and fixtures in a throwaway HOME, starts a real
+server on localhost and drives it with a concurrent HTTP load generator.
+
+    python benchmarks/bench.py run                          # 10 / 1k / 100k pages, all scenarios
+    python benchmarks/bench.py run --sizes 10 1000 -d 5 -o before.json
+    python benchmarks/bench.py run --server "workers=4, engine='asyncio'"
+    python benchmarks/bench.py compare before.json after.json
+
+Scenarios:
+    index      GET /                         (listing)
+    page       GET /p/<random page>/         (registry lookup + small file)
+    deep       GET /p/<dir page>/<deep path> (long manifest, deep tree)
+    auth       POST password                 (login)
+    protected  GET with auth cookie
+    large      GET 64 MB file                (streaming throughput)
+
+Each result has requests/s, p50/p99 latency, MB/s and peak server RSS.
+The load generator is Python too and can saturate before the server does:
+compare runs made on the same machine with the same settings.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, UTC
+from pathlib import Path
+
+
+REPO = Path(__file__).resolve().parent.parent
+SRC = REPO / "src"
+
+SIZES = [10, 1000, 100_000]
+SCENARIOS = ["index", "page", "deep", "auth", "protected", "large"]
+DURATION = 10.0  # seconds per scenario
+CONCURRENCY = 16
+LARGE_CONCURRENCY = 4  # clients for the large-file scenario
+PORT = 8197
+
+DEEP_DEPTH = 8  # directory levels in the deep page
+DEEP_FILES = 2000
+MANIFEST_PATTERNS = 500  # non-matching patterns before the one that matches
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+PASSWORD = "bench"
+
+# Fixed IDs of the special pages; filler pages get random ones
+SMALL_ID = "benchsmall000000"
+DEEP_ID = "benchdeep0000000"
+AUTH_ID = "benchauth0000000"
+LARGE_ID = "benchlarge000000"
+
+
+def build_fixtures(root: Path) -> dict:
+    """Create the published files. Returns paths and the deep page's files."""
+    root.mkdir(parents=True, exist_ok=True)
+    small = root / "small.html"
+    small.write_text("<!doctype html><title>bench</title>" + "<p>drop benchmark</p>" * 100)
+
+    deep = root / "deep"
+    deep_files = []
+    for i in range(DEEP_FILES):
+        rel = "/".join(f"d{(i + level) % 4}" for level in range(i % DEEP_DEPTH + 1)) + f"/f{i}.html"
+        path = deep / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"<p>file {i}</p>")
+        deep_files.append(rel)
+    (deep / "index.html").write_text("<p>deep</p>")
+    patterns = [f"other{i}/**" if i % 2 else f"*.tmp{i}" for i in range(MANIFEST_PATTERNS)]
+    tops = sorted({rel.split("/", 1)[0] for rel in deep_files})
+    (deep / ".drop-publish").write_text("\n".join(patterns + ["index.html"] + [f"{top}/**" for top in tops]) + "\n")
+
+    large = root / "large.bin"
+    block = os.urandom(1024 * 1024)
+    with open(large, "wb") as f:
+        for _ in range(LARGE_FILE_SIZE // len(block)):
+            f.write(block)
+
+    return {"small": small, "deep": deep, "large": large, "deep_files": deep_files}
+
+
+def _password_hash() -> str:
+    from drop.utils import hash_password  # the server's own scheme
+
+    return hash_password(PASSWORD)
+
+
+def _entry(source: Path, password_hash: str = "") -> dict:
+    return {
+        "source": str(source),
+        "is_dir": source.is_dir(),
+        "password_hash": password_hash,
+        "created_at": datetime.now(UTC).isoformat(),
+        "description": "",
+        "name": "",
+        "type": "static",
+        "run_cmd": "",
+        "port": 0,
+        "pid": 0,
+    }
+
+
+def build_registry(home: Path, fixtures: dict, size: int, backend: str) -> list[str]:
+    """Write a registry of `size` pages (4 special + filler). Returns filler IDs."""
+    drop_dir = home / ".drop"
+    shutil.rmtree(drop_dir, ignore_errors=True)
+    drop_dir.mkdir(parents=True)
+    pages = {
+        SMALL_ID: _entry(fixtures["small"]),
+        DEEP_ID: _entry(fixtures["deep"]),
+        AUTH_ID: _entry(fixtures["small"], _password_hash()),
+        LARGE_ID: _entry(fixtures["large"]),
+    }
+    rng = random.Random(size)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
+    filler = []
+    small = _entry(fixtures["small"])
+    while len(pages) < size:
+        page_id = "".join(rng.choice(alphabet) for _ in range(16))
+        pages[page_id] = dict(small, name=f"page-{len(filler)}")
+        filler.append(page_id)
+    (drop_dir / "pages.json").write_text(json.dumps(pages, indent=2))
+    if backend == "sqlite":
+        subprocess.run([sys.executable, "-m", "drop.cli", "migrate"], env=_env(home), check=True,
+                       stdout=subprocess.DEVNULL)
+    return filler or [SMALL_ID]
+
+
+def _env(home: Path) -> dict:
+    env = dict(os.environ, HOME=str(home))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    return env
+
+
+def start_server(home: Path, port: int, options: str) -> subprocess.Popen:
+    """Start run_server() in a child process and wait until it answers."""
+    call = f"run_server(port={port}, host='127.0.0.1'{', ' + options if options else ''})"
+    proc = subprocess.Popen(
+        [sys.executable, "-c", f"from drop.server import run_server; {call}"],
+        env=_env(home), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited with status {proc.returncode}: {call}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                pass
+        except OSError:
+            time.sleep(0.1)
+            continue
+        # First request loads the registry; keep it out of the measurements
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        conn.request("GET", f"/p/{SMALL_ID}/")
+        conn.getresponse().read()
+        conn.close()
+        return proc
+    stop_server(proc)
+    raise SystemExit("Server did not start within 60 s")
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, 15)
+        proc.wait(timeout=40)
+    except (OSError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, 9)
+        proc.wait()
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident memory of pid and its children (Linux), 0 if unknown."""
+    total = 0
+    try:
+        pids = [pid]
+        for task in os.listdir(f"/proc/{pid}/task"):
+            pids += [int(p) for p in Path(f"/proc/{pid}/task/{task}/children").read_text().split()]
+        for p in pids:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return total
+
+
+def scenario_requests(scenario: str, filler: list[str], deep_files: list[str]):
+    """Return a function producing (method, path, body, headers) for scenario."""
+    auth_cookie = {"Cookie": f'drop_auth_{AUTH_ID}="{_password_hash()}"'}
+    form = {"Content-Type": "application/x-www-form-urlencoded"}
+    if scenario == "index":
+        return lambda rng: ("GET", "/", None, {})
+    if scenario == "page":
+        return lambda rng: ("GET", f"/p/{rng.choice(filler)}/", None, {})
+    if scenario == "deep":
+        return lambda rng: ("GET", f"/p/{DEEP_ID}/{rng.choice(deep_files)}", None, {})
+    if scenario == "auth":
+        return lambda rng: ("POST", f"/p/{AUTH_ID}/", f"password={PASSWORD}", form)
+    if scenario == "protected":
+        return lambda rng: ("GET", f"/p/{AUTH_ID}/", None, auth_cookie)
+    if scenario == "large":
+        return lambda rng: ("GET", f"/p/{LARGE_ID}/", None, {})
+    raise ValueError(scenario)
+
+
+def drive(port: int, make_request, duration: float, concurrency: int, server_pid: int) -> dict:
+    """Run concurrent clients for duration seconds and summarize."""
+    latencies: list[list[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    received = [0] * concurrency
+    peak_rss = rss_bytes(server_pid)
+    stop = threading.Event()
+    deadline = time.perf_counter() + duration
+
+    def client(n: int) -> None:
+        rng = random.Random(n)
+        conn = None
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(rng)
+            start = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                size = 0
+                while chunk := response.read(1024 * 1024):
+                    size += len(chunk)
+                if response.status >= 400:
+                    errors[n] += 1
+                received[n] += size
+                if response.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                errors[n] += 1
+                if conn is not None:
+                    conn.close()
+                conn = None
+                continue
+            latencies[n].append(time.perf_counter() - start)
+        if conn is not None:
+            conn.close()
+
+    def sample_rss() -> None:
+        nonlocal peak_rss
+        while not stop.wait(0.2):
+            peak_rss = max(peak_rss, rss_bytes(server_pid))
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    merged = sorted(latency for per_client in latencies for latency in per_client)
+
+    def percentile(p: float) -> float | None:
+        if not merged:
+            return None
+        return round(merged[min(len(merged) - 1, int(len(merged) * p))] * 1000, 3)
+
+    return {
+        "requests": len(merged),
+        "errors": sum(errors),
+        "rps": round(len(merged) / elapsed, 1),
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "mb_per_s": round(sum(received) / elapsed / 1e6, 2),
+        "peak_rss_mb": round(peak_rss / 1e6, 1),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "-C", str(REPO), "describe", "--always", "--dirty"],
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    sys.path.insert(0, str(SRC))
+    from drop import __version__
+
+    work = Path(tempfile.mkdtemp(prefix="drop-bench-"))
+    results = []
+    try:
+        print(f"Building fixtures in {work} ...", file=sys.stderr)
+        fixtures = build_fixtures(work / "site")
+        for size in args.sizes:
+            filler = build_registry(work / "home", fixtures, size, args.backend)
+            proc = start_server(work / "home", args.port, args.server)
+            try:
+                for scenario in args.scenarios:
+                    concurrency = min(args.concurrency, LARGE_CONCURRENCY) if scenario == "large" else args.concurrency
+                    make_request = scenario_requests(scenario, filler, fixtures["deep_files"])
+                    result = {"pages": size, "scenario": scenario, "concurrency": concurrency}
+                    result.update(drive(args.port, make_request, args.duration, concurrency, proc.pid))
+                    results.append(result)
+                    print(f"{size:>7} pages  {scenario:<10} {result['rps']:>9.1f} req/s  "
+                          f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  "
+                          f"{result['mb_per_s']} MB/s  rss {result['peak_rss_mb']} MB  "
+                          f"errors {result['errors']}", file=sys.stderr)
+            finally:
+                stop_server(proc)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "version": __version__,
+            "revision": _git_revision(),
+            "created_at": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "server": args.server,
+            "backend": args.backend,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    output = args.output or REPO / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Saved: {output}", file=sys.stderr)
+    return 0
+
+
+def _delta(old: float | None, new: float | None) -> float | None:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def cmd_compare(args: argparse.Namespace) -> int:
+    old = json.loads(Path(args.old).read_text())
+    new = json.loads(Path(args.new).read_text())
+    before = {(r["pages"], r["scenario"]): r for r in old["results"]}
+    print(f"{old['meta'].get('revision') or args.old} -> {new['meta'].get('revision') or args.new}")
+    print(f"{'pages':>7}  {'scenario':<10} {'req/s':>21} {'p99 ms':>23}")
+    regressions = 0
+    for result in new["results"]:
+        previous = before.get((result["pages"], result["scenario"]))
+        if previous is None:
+            continue
+        rps = _delta(previous["rps"], result["rps"])
+        p99 = _delta(previous["p99_ms"], result["p99_ms"])
+        worse = (rps is not None and rps < -args.threshold) or (p99 is not None and p99 > args.threshold)
+        regressions += worse
+        rps_text = f"{previous['rps']:.0f} -> {result['rps']:.0f} ({rps:+.1f}%)" if rps is not None else "-"
+        p99_text = f"{previous['p99_ms']} -> {result['p99_ms']} ({p99:+.1f}%)" if p99 is not None else "-"
+        print(f"{result['pages']:>7}  {result['scenario']:<10} {rps_text:>21} {p99_text:>23}"
+              f"{'  REGRESSION' if worse else ''}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="drop load benchmarks",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p_run = subparsers.add_parser("run", help="Run benchmarks and save JSON results")
+    p_run.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Registry sizes (pages)")
+    p_run.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    p_run.add_argument("--duration", "-d", type=float, default=DURATION, help="Seconds per scenario")
+    p_run.add_argument("--concurrency", "-c", type=int, default=CONCURRENCY, help="Concurrent clients")
+    p_run.add_argument("--server", default="", help="Extra run_server() arguments, e.g. \"workers=4\"")
+    p_run.add_argument("--backend", choices=["json", "sqlite"], default="json", help="Registry backend")
+    p_run.add_argument("--port", type=int, default=PORT)
+    p_run.add_argument("--output", "-o", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    p_run.set_defaults(func=cmd_run)
+
+    p_compare = subparsers.add_parser("compare", help="Compare two result files")
+    p_compare.add_argument("old")
+    p_compare.add_argument("new")
+    p_compare.add_argument("--threshold", type=float, default=10.0,
+                           help="Percent change in req/s or p99 counted as a regression (default: 10)")
+    p_compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Page access tracking and inactivity expiry for drop.
+
+Hits are counted in memory and merged into access.json by a background
+thread (write-behind), so serving never touches the registry. A crash
+loses at most one flush interval of counts.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from . import storage
+from .storage import DROP_DIR, PageInfo, atomic_write_text, file_lock
+
+
+ACCESS_FILE = DROP_DIR / "access.json"
+ACCESS_LOCK = DROP_DIR / "access.json.lock"
+FLUSH_INTERVAL = 30  # seconds between write-behind flushes
+SWEEP_INTERVAL = 3600  # seconds between expiry sweeps in the server
+INACTIVE_DAYS = 30  # pages unvisited this long are removed (unless --keep)
+WARN_DAYS = 7  # `drop list` warns this many days before removal
+
+DAY = 86400
+
+# {page_id: [hits, last access]} not yet written to ACCESS_FILE
+_pending: dict[str, list] = {}
+_lock = threading.Lock()
+_flusher: threading.Thread | None = None
+
+
+def _after_fork() -> None:
+    # Threads do not survive fork: each worker starts its own flusher
+    global _flusher, _lock
+    _flusher = None
+    _lock = threading.Lock()
+    _pending.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def record(page_id: str) -> None:
+    """Count one access to page_id."""
+    now = time.time()
+    with _lock:
+        entry = _pending.get(page_id)
+        if entry is None:
+            _pending[page_id] = [1, now]
+        else:
+            entry[0] += 1
+            entry[1] = now
+    if _flusher is None:
+        _start_flusher()
+
+
+def _start_flusher() -> None:
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="drop-access", daemon=True)
+    _flusher.start()
+
+
+def _flush_loop() -> None:
+    last_sweep = time.monotonic()
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+            if time.monotonic() - last_sweep >= SWEEP_INTERVAL:
+                last_sweep = time.monotonic()
+                sweep()
+        except Exception:
+            pass  # Retry next interval; pending counts are kept on failure
+
+
+def load() -> dict:
+    """Load {"since": epoch, "pages": {page_id: {"hits": n, "last_access": epoch}}}.
+
+    "since" is when tracking began: pages older than that count as visited
+    then, so upgrading never expires everything at once.
+    """
+    try:
+        stats = json.loads(ACCESS_FILE.read_text())
+        if isinstance(stats.get("pages"), dict):
+            return stats
+    except Exception:
+        pass
+    return {"since": time.time(), "pages": {}}
+
+
+def flush() -> None:
+    """Merge pending counts into access.json (safe across processes)."""
+    global _pending
+    with _lock:
+        if not _pending:
+            return
+        pending, _pending = _pending, {}
+    try:
+        with file_lock(ACCESS_LOCK):
+            stats = load()
+            for page_id, (hits, last) in pending.items():
+                entry = stats["pages"].setdefault(page_id, {"hits": 0, "last_access": 0})
+                entry["hits"] += hits
+                entry["last_access"] = max(entry["last_access"], last)
+            atomic_write_text(ACCESS_FILE, json.dumps(stats))
+    except BaseException:
+        # Put counts back so the next flush writes them
+        with _lock:
+            for page_id, (hits, last) in pending.items():
+                entry = _pending.setdefault(page_id, [0, 0])
+                entry[0] += hits
+                entry[1] = max(entry[1], last)
+        raise
+
+
+def last_activity(info: PageInfo, stats: dict, page_id: str) -> float:
+    """Last access time, or publish (or tracking start) time if never visited."""
+    try:
+        created = datetime.fromisoformat(info["created_at"]).timestamp()
+    except (KeyError, ValueError):
+        created = 0.0
+    return max(created, stats["since"], stats["pages"].get(page_id, {}).get("last_access", 0))
+
+
+def days_left(info: PageInfo, stats: dict, page_id: str, now: float | None = None) -> float | None:
+    """Days until page expires, None if it never does (--keep)."""
+    if info.get("keep"):
+        return None
+    now = time.time() if now is None else now
+    return INACTIVE_DAYS - (now - last_activity(info, stats, page_id)) / DAY
+
+
+def _app_running(info: PageInfo) -> bool:
+    pid = info.get("pid", 0)
+    if info.get("type") != "app" or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def sweep() -> list[str]:
+    """Remove pages inactive for INACTIVE_DAYS. Returns removed IDs.
+
+    Pages added with --keep and running apps are never removed.
+    """
+    flush()
+    pages = storage.load_pages()
+    now = time.time()
+    with file_lock(ACCESS_LOCK):
+        stats = load()
+        expired = []
+        for page_id, info in pages.items():
+            left = days_left(info, stats, page_id, now)
+            if left is not None and left <= 0 and not _app_running(info):
+                expired.append(page_id)
+        if expired:
+            storage.remove_pages(expired)
+            from . import snapshots  # deferred: keeps `drop` startup light
+
+            snapshots.gc(storage.load_pages())
+        # Forget stats of pages no longer registered; first sweep starts the clock
+        gone = set(expired)
+        live = {
+            page_id: entry for page_id, entry in stats["pages"].items()
+            if page_id in pages and page_id not in gone
+        }
+        if len(live) != len(stats["pages"]) or not ACCESS_FILE.exists():
+            atomic_write_text(ACCESS_FILE, json.dumps({"since": stats["since"], "pages": live}))
+    return expired
@@ -0,0 +1,204 @@
+"""Serving pages straight out of .zip and .tar archives.
+
+The member index (where each file's data starts, its size and compression)
+is read once per archive version and cached. Stored members are plain byte
+spans of the archive and go out like any file, zero-copy; deflated zip
+members are sent as gzip without recompressing, or inflated from a
+memory map. The archive must contain a .drop-publish manifest, and the
+manifest and .env rules are applied when the index is built.
+
+Replace a published archive atomically (write elsewhere, then rename):
+truncating a mapped file in place can crash the server.
+"""
+
+import mmap
+import os
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+from .utils import MANIFEST_FILE, ManifestMatcher, file_fingerprint, is_env_file, parse_manifest
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar")
+INDEX_CACHE_SIZE = 64  # archives whose index is kept in memory
+INFLATE_CHUNK = 256 * 1024  # compressed bytes fed to zlib at a time
+
+
+class ArchiveError(Exception):
+    """Archive cannot be published (unreadable, no manifest, ...)."""
+
+
+class ArchiveMember(NamedTuple):
+    offset: int  # start of the member's data in the archive file
+    size: int  # uncompressed size
+    compressed_size: int
+    deflated: bool  # zip deflate; False means stored as-is
+    crc: int  # CRC-32 of the content (zip only, else 0)
+    mtime: float
+
+
+def is_archive(path: Path) -> bool:
+    """Check if a file is published as an archive page."""
+    return path.suffix.lower() in ARCHIVE_SUFFIXES
+
+
+def _normalize(name: str) -> str | None:
+    """Member name as a relative path, None if it could escape the root."""
+    if name.startswith("/") or "\\" in name:
+        return None
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    return "/".join(parts)
+
+
+def _zip_members(path: Path, data: mmap.mmap) -> dict[str, ArchiveMember]:
+    import zipfile
+
+    members = {}
+    try:
+        with zipfile.ZipFile(path) as archive:
+            infos = archive.infolist()
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ArchiveError(f"{path.name}: {e}") from e
+    for info in infos:
+        mode = info.external_attr >> 16
+        if info.is_dir() or (mode & 0o170000) == 0o120000:
+            continue  # Directories and symlinks are never served
+        if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            continue  # Encrypted or unsupported compression
+        name = _normalize(info.filename)
+        if name is None:
+            continue
+        # The local header may carry a different extra field than the central one
+        header = data[info.header_offset:info.header_offset + 30]
+        if len(header) < 30 or header[:4] != b"PK\x03\x04":
+            raise ArchiveError(f"{path.name}: corrupt entry {info.filename}")
+        offset = (
+            info.header_offset + 30
+            + int.from_bytes(header[26:28], "little") + int.from_bytes(header[28:30], "little")
+        )
+        if offset + info.compress_size > len(data):
+            raise ArchiveError(f"{path.name}: truncated entry {info.filename}")
+        try:
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+        except (OverflowError, ValueError):
+            mtime = 0.0
+        members[name] = ArchiveMember(
+            offset, info.file_size, info.compress_size,
+            info.compress_type == zipfile.ZIP_DEFLATED, info.CRC, mtime,
+        )
+    return members
+
+
+def _tar_members(path: Path) -> dict[str, ArchiveMember]:
+    import tarfile
+
+    members = {}
+    try:
+        # "r:" only: compressed tarballs have no random access
+        with tarfile.open(path, "r:") as archive:
+            for info in archive:
+                if not info.isreg() or info.issparse():
+                    continue  # Links, devices and sparse files are never served
+                name = _normalize(info.name)
+                if name is not None:
+                    members[name] = ArchiveMember(info.offset_data, info.size, info.size, False, 0, info.mtime)
+    except (tarfile.TarError, OSError) as e:
+        raise ArchiveError(f"{path.name}: {e} (compressed tarballs are not supported, use .zip or .tar)") from e
+    return members
+
+
+class ArchiveIndex:
+    """Published members of one archive version, with the archive mapped for reads."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.fingerprint = file_fingerprint(path)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        data = self._map if self._map is not None else b""
+        if path.suffix.lower() == ".zip":
+            members = _zip_members(path, data)
+        else:
+            members = _tar_members(path)
+
+        # Manifest at the root, or inside a single top-level folder (zip of dist/)
+        root = ""
+        if MANIFEST_FILE not in members:
+            tops = {name.split("/", 1)[0] for name in members}
+            if len(tops) != 1 or f"{next(iter(tops))}/{MANIFEST_FILE}" not in members:
+                raise ArchiveError(f"Archive requires {MANIFEST_FILE} manifest")
+            root = next(iter(tops)) + "/"
+        manifest = members[root + MANIFEST_FILE]
+        self.patterns = parse_manifest(b"".join(self.read(manifest)).decode("utf-8", "replace"))
+        matcher = ManifestMatcher(self.patterns)
+
+        self.members: dict[str, ArchiveMember] = {}
+        for name, member in members.items():
+            if not name.startswith(root):
+                continue
+            relative = name[len(root):]
+            if is_env_file(relative.rsplit("/", 1)[-1]) or not matcher.matches(relative):
+                continue
+            self.members[relative] = member
+
+    def lookup(self, filepath: str) -> tuple[str, ArchiveMember] | None:
+        """Find a request path: (relative path, member), trying index.html."""
+        member = self.members.get(filepath)
+        if member is not None:
+            return filepath, member
+        index = f"{filepath.rstrip('/')}/index.html" if filepath.strip("/") else "index.html"
+        member = self.members.get(index)
+        return (index, member) if member is not None else None
+
+    def etag(self, member: ArchiveMember) -> str:
+        """Strong ETag: changes with the archive and differs per member."""
+        _ino, size, mtime_ns = self.fingerprint or (0, 0, 0)
+        return f"{mtime_ns:x}-{size:x}-{member.offset:x}"
+
+    def read(self, member: ArchiveMember) -> Iterator[bytes]:
+        """Member content in chunks, inflated if needed."""
+        data = self._map
+        end = member.offset + member.compressed_size
+        if data is None or end > len(data):
+            raise ArchiveError(f"{self.path.name}: changed while reading")
+        view = memoryview(data)[member.offset:end]
+        if not member.deflated:
+            for start in range(0, len(view), INFLATE_CHUNK):
+                yield bytes(view[start:start + INFLATE_CHUNK])
+            return
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        for start in range(0, len(view), INFLATE_CHUNK):
+            chunk = inflater.decompress(view[start:start + INFLATE_CHUNK])
+            if chunk:
+                yield chunk
+        tail = inflater.flush()
+        if tail:
+            yield tail
+
+
+# {archive path: index of its current version}
+_indexes: dict[Path, ArchiveIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path: Path) -> ArchiveIndex:
+    """Cached index of path, rebuilt when the archive changes. Raises ArchiveError."""
+    fingerprint = file_fingerprint(path)
+    if fingerprint is None:
+        raise FileNotFoundError(path)
+    index = _indexes.get(path)
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    index = ArchiveIndex(path)
+    with _indexes_lock:
+        if len(_indexes) >= INDEX_CACHE_SIZE:
+            _indexes.clear()
+        _indexes[path] = index
+    return index
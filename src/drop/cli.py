@@ -8,26 +8,123 @@ Examples:
     drop start                    # Start server
     drop add ./report.html        # Publish file
     drop add ./dist/              # Publish folder
+    drop add out/*.html --json    # Publish many, JSON lines output
     drop list                     # List pages
     drop remove abc123            # Remove page
+    drop migrate                  # Move registry to SQLite
     drop stop                     # Stop server
 """
 
 import argparse
+import json
 import os
 import re
 import signal
 import subprocess
 import sys
 import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime, UTC
 from pathlib import Path
 
-from . import storage
+from . import access, archives, storage
 from .utils import generate_page_id, generate_password, hash_password, detect_ip, load_manifest, MANIFEST_FILE, has_systemd
 
 
-def _start_with_systemd(port: int, host: str) -> int:
+_timings: list[tuple[str, float]] = []  # (phase, seconds) for --timing
+
+
+@contextmanager
+def _timed(phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append((phase, time.perf_counter() - start))
+
+
+def _process_uptime() -> float | None:
+    """Seconds since this process was started (Linux only)."""
+    try:
+        fields = Path("/proc/self/stat").read_text().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")  # field 22: starttime
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _print_timings(startup: float | None) -> None:
+    if startup is not None:
+        print(f"timing: {'startup (interpreter + imports)':<32} {startup * 1000:8.1f} ms", file=sys.stderr)
+    for phase, seconds in _timings:
+        print(f"timing: {phase:<32} {seconds * 1000:8.1f} ms", file=sys.stderr)
+
+
+def _detect_ip(refresh: bool = False) -> str:
+    """Detected IP, cached in ~/.drop/env.json."""
+    with _timed("detect ip"):
+        return storage.cached_env("ip", detect_ip, refresh)
+
+
+def _host() -> str:
+    """Saved host override, else detected IP."""
+    return storage.load_host() or _detect_ip()
+
+
+def _has_systemd() -> bool:
+    """Systemd availability, cached in ~/.drop/env.json."""
+    with _timed("systemd probe"):
+        return storage.cached_env("systemd", has_systemd)
+
+
+def _service_active() -> bool:
+    """Check whether drop.service is active."""
+    with _timed("systemctl is-active"):
+        result = subprocess.run(
+            ["systemctl", "--user", "is-active", "drop.service"],
+            capture_output=True,
+            text=True,
+        )
+    return result.stdout.strip() == "active"
+
+
+def _app_url(host: str, page_id: str, name: str, server_port: int | None = None) -> str:
+    """App URL through the drop server's /a/ proxy."""
+    server_port = server_port or storage.load_port() or 8080
+    return f"http://{host}:{server_port}/a/{name or page_id}/"
+
+
+def _load_pages() -> dict[str, storage.PageInfo]:
+    with _timed("load registry"):
+        return storage.load_pages()
+
+
+def _server_call(port: int, args: argparse.Namespace) -> str:
+    """Build the run_server(...) call used by systemd and the PID fallback."""
+    options = [f"port={port}"]
+    if getattr(args, "strict_paths", False):
+        options.append("strict_paths=True")
+    if getattr(args, "etag", "stat") != "stat":
+        options.append(f"etag={args.etag!r}")
+    if getattr(args, "sendfile", "direct") != "direct":
+        options.append(f"sendfile={args.sendfile!r}")
+    if getattr(args, "workers", 1) > 1:
+        options.append(f"workers={args.workers}")
+    if getattr(args, "engine", "threaded") != "threaded":
+        options.append(f"engine={args.engine!r}")
+    if getattr(args, "threads", 16) != 16:
+        options.append(f"threads={args.threads}")
+    if getattr(args, "metrics", None):
+        options.append(f"metrics_listen={args.metrics!r}")
+    if getattr(args, "memory_cache", 64) != 64:
+        options.append(f"memory_cache_mb={args.memory_cache}")
+    if getattr(args, "memory_cache_max", 256) != 256:
+        options.append(f"memory_cache_max_kb={args.memory_cache_max}")
+    return f"run_server({', '.join(options)})"
+
+
+def _start_with_systemd(port: int, host: str, server_call: str) -> int:
     """Start server using systemd."""
     # Update unit file with current port
     unit_path = Path.home() / ".config/systemd/user/drop.service"
@@ -37,10 +134,10 @@ def _start_with_systemd(port: int, host: str) -> int:
 
     # Read and update ExecStart with port
     content = unit_path.read_text()
-    # Replace the run_server() call to include port
+    # Replace the run_server() call to include port and options
     new_content = re.sub(
         r'run_server\([^)]*\)',
-        f'run_server(port={port})',
+        server_call,
         content
     )
     unit_path.write_text(new_content)
@@ -77,6 +174,88 @@ def _stop_with_systemd() -> int:
     return 0
 
 
+APP_READY_TIMEOUT = 30.0  # default seconds to wait for an app to accept connections
+APP_POLL_START = 0.05  # first readiness poll interval (seconds), doubled each try...
+APP_POLL_MAX = 0.25  # ...up to this (a refused connect is cheap)
+APP_LOG_MAX = 5 * 1024 * 1024  # log size before it is rotated to <id>.log.1
+APP_LOG_TAIL = 20  # log lines shown when an app fails to start
+
+
+def _port_open(port: int) -> bool:
+    """Check if something accepts connections on 127.0.0.1:port."""
+    import socket
+
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def _app_log(page_id: str) -> Path:
+    """Open-for-append log path for an app, rotated when large."""
+    storage.LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    log = storage.LOGS_DIR / f"{page_id}.log"
+    try:
+        if log.stat().st_size > APP_LOG_MAX:
+            log.replace(log.with_name(log.name + ".1"))
+    except OSError:
+        pass
+    return log
+
+
+def _log_tail(log: Path) -> str:
+    try:
+        lines = log.read_text(errors="replace").splitlines()
+    except OSError:
+        return ""
+    return "\n".join(f"  {line}" for line in lines[-APP_LOG_TAIL:])
+
+
+def _launch_app(page_id: str, page: storage.PageInfo, timeout: float) -> tuple[bool, str, float]:
+    """Start an app and wait until its port accepts connections.
+
+    Returns (ready, error message, seconds taken). Output goes to LOGS_DIR.
+    """
+    started = time.monotonic()
+    port = page["port"]
+    if _port_open(port):
+        return False, f"port {port} is already in use", 0.0
+
+    source = Path(page["source"])
+    source_dir = source if source.is_dir() else source.parent
+    log = _app_log(page_id)
+    with open(log, "ab") as out:
+        out.write(f"--- {datetime.now().isoformat(timespec='seconds')} {page['run_cmd']}\n".encode())
+        out.flush()
+        proc = subprocess.Popen(
+            page["run_cmd"],
+            shell=True,
+            cwd=source_dir,
+            stdin=subprocess.DEVNULL,
+            stdout=out,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    storage.update_page_pid(page_id, proc.pid)
+
+    # Poll with exponential backoff: fast apps are seen fast, slow ones not hammered
+    delay = APP_POLL_START
+    deadline = started + timeout
+    while True:
+        if _port_open(port):
+            return True, "", time.monotonic() - started
+        code = proc.poll()
+        if code is not None:
+            storage.update_page_pid(page_id, 0)
+            return False, f"exited with status {code} (log: {log})", time.monotonic() - started
+        if time.monotonic() >= deadline:
+            # Left running: it may still come up; `drop stop` ends it
+            return False, f"port {port} not open after {timeout:g}s, still running (log: {log})", timeout
+        time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, APP_POLL_MAX)
+
+
 def cmd_start_app(args: argparse.Namespace) -> int:
     """Start an app by name/ID."""
     page = storage.get_page(args.name)
@@ -89,40 +268,51 @@ def cmd_start_app(args: argparse.Namespace) -> int:
         return 1
 
     # Check if already running
+    full_id = storage.get_full_page_id(args.name)
+    host = _host()
     status = storage.get_app_status(args.name)
     if status == "running":
-        host = storage.load_host() or detect_ip()
-        print(f"App already running: http://{host}:{page['port']}/")
+        print(f"App already running: {_app_url(host, full_id, page.get('name', ''))}")
         return 0
 
-    # Start the app
-    source_dir = Path(page["source"]).parent if not Path(page["source"]).is_dir() else Path(page["source"])
-    run_cmd = page["run_cmd"]
-
-    proc = subprocess.Popen(
-        run_cmd,
-        shell=True,
-        cwd=source_dir,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True,
-    )
+    ready, error, seconds = _launch_app(full_id, page, args.timeout)
+    if not ready:
+        print(f"Error: App failed to start: {error}", file=sys.stderr)
+        tail = _log_tail(storage.LOGS_DIR / f"{full_id}.log")
+        if tail:
+            print(tail, file=sys.stderr)
+        return 1
+    print(f"App started in {seconds:.2f}s: {_app_url(host, full_id, page.get('name', ''))} (direct: http://{host}:{page['port']}/)")
+    return 0
 
-    # Save PID
-    full_id = storage.get_full_page_id(args.name)
-    storage.update_page_pid(full_id, proc.pid)
 
-    # Wait and verify
-    time.sleep(1)
-    try:
-        os.kill(proc.pid, 0)
-        host = storage.load_host() or detect_ip()
-        print(f"App started: http://{host}:{page['port']}/")
+def cmd_start_all_apps(args: argparse.Namespace) -> int:
+    """Start every registered app that is not running, concurrently."""
+    apps = {
+        page_id: info for page_id, info in _load_pages().items()
+        if info.get("type") == "app" and storage.app_status(info) != "running"
+    }
+    if not apps:
+        print("No stopped apps")
         return 0
-    except OSError:
-        storage.update_page_pid(full_id, 0)
-        print("Error: App failed to start", file=sys.stderr)
-        return 1
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    host = _host()
+    with ThreadPoolExecutor(max_workers=len(apps)) as pool:
+        futures = {page_id: pool.submit(_launch_app, page_id, info, args.timeout) for page_id, info in apps.items()}
+        results = {page_id: future.result() for page_id, future in futures.items()}
+
+    failed = 0
+    for page_id, (ready, error, seconds) in results.items():
+        label = apps[page_id].get("name") or page_id[:8]
+        if ready:
+            print(f"  {label:<20} ready in {seconds:6.2f}s  {_app_url(host, page_id, apps[page_id].get('name', ''))}")
+        else:
+            failed += 1
+            print(f"  {label:<20} failed: {error}", file=sys.stderr)
+    print(f"Started {len(apps) - failed} of {len(apps)} apps")
+    return 1 if failed else 0
 
 
 def cmd_stop_app(args: argparse.Namespace) -> int:
@@ -162,9 +352,15 @@ def cmd_start(args: argparse.Namespace) -> int:
     # If name provided, start app instead
     if hasattr(args, 'name') and args.name:
         return cmd_start_app(args)
+    if getattr(args, "all_apps", False):
+        return cmd_start_all_apps(args)
 
     port = args.port
-    host = args.host or detect_ip()
+    host = args.host or _detect_ip(refresh=True)
+
+    # Expire pages nobody visited for INACTIVE_DAYS (the server repeats this hourly)
+    for page_id in access.sweep():
+        print(f"Removed: {page_id} (inactive {access.INACTIVE_DAYS} days)")
 
     # Save config
     storage.save_port(port)
@@ -172,16 +368,11 @@ def cmd_start(args: argparse.Namespace) -> int:
         storage.save_host(args.host)
 
     # Check if already running (systemd or PID)
-    if has_systemd():
-        result = subprocess.run(
-            ["systemctl", "--user", "is-active", "drop.service"],
-            capture_output=True,
-            text=True,
-        )
-        if result.stdout.strip() == "active":
+    if _has_systemd():
+        if _service_active():
             print(f"Server already running: http://{host}:{port}")
             return 0
-        return _start_with_systemd(port, host)
+        return _start_with_systemd(port, host, _server_call(port, args))
 
     # Fallback: PID-based management
     pid = storage.load_pid()
@@ -196,7 +387,7 @@ def cmd_start(args: argparse.Namespace) -> int:
     # Start server in background
     cmd = [
         sys.executable, "-c",
-        f"from drop.server import run_server; run_server(port={port})"
+        f"from drop.server import run_server; {_server_call(port, args)}"
     ]
 
     proc = subprocess.Popen(
@@ -227,13 +418,8 @@ def cmd_stop(args: argparse.Namespace) -> int:
     if hasattr(args, 'name') and args.name:
         return cmd_stop_app(args)
 
-    if has_systemd():
-        result = subprocess.run(
-            ["systemctl", "--user", "is-active", "drop.service"],
-            capture_output=True,
-            text=True,
-        )
-        if result.stdout.strip() == "active":
+    if _has_systemd():
+        if _service_active():
             return _stop_with_systemd()
         print("Server not running")
         return 0
@@ -254,21 +440,80 @@ def cmd_stop(args: argparse.Namespace) -> int:
     return 0
 
 
+LIST_WORKERS = 16  # threads checking page sources for list/status (network filesystems)
+
+# `drop list --sort` orders
+LIST_SORT_KEYS = {
+    "created": lambda row: row["created_at"],
+    "name": lambda row: row["name"] or row["id"],
+    "source": lambda row: row["source"],
+    "expires": lambda row: (row["days_left"] is None, row["days_left"] or 0.0),  # soonest first, --keep last
+}
+
+
+def _page_kind(info: storage.PageInfo) -> str:
+    """Label for list/status: snapshot, archive, app or static."""
+    return "snapshot" if info.get("snapshot") else info.get("type", "static")
+
+
+def _page_url(host: str, server_port: int, page_id: str, info: storage.PageInfo) -> str:
+    name = info.get("name", "")
+    if info.get("type") == "app":
+        return _app_url(host, page_id, name, server_port)
+    if name:
+        return f"http://{host}:{server_port}/p/{page_id}/{name}/"
+    return f"http://{host}:{server_port}/p/{page_id}/"
+
+
+def _page_rows(pages: dict[str, storage.PageInfo], host: str, server_port: int) -> list[dict]:
+    """One row per page for list/status, with every source checked in one batch.
+
+    The checks run on a thread pool: on a network filesystem each stat() is
+    a round trip. App liveness comes from the entries already loaded.
+    """
+    # Snapshots serve their own copy, their source may be gone
+    sources = sorted({info["source"] for info in pages.values() if not info.get("snapshot")})
+    with _timed("check sources"):
+        if len(sources) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(LIST_WORKERS, len(sources))) as pool:
+                exists = dict(zip(sources, pool.map(os.path.exists, sources)))
+        else:
+            exists = {source: os.path.exists(source) for source in sources}
+
+    stats = access.load()
+    now = time.time()
+    rows = []
+    for page_id, info in pages.items():
+        left = access.days_left(info, stats, page_id, now)
+        rows.append({
+            "id": page_id,
+            "name": info.get("name", ""),
+            "type": _page_kind(info),
+            "url": _page_url(host, server_port, page_id, info),
+            "source": info["source"],
+            "source_exists": bool(info.get("snapshot")) or exists[info["source"]],
+            "status": storage.app_status(info) if info.get("type") == "app" else "",
+            "public": not info["password_hash"],
+            "description": info.get("description", ""),
+            "created_at": info["created_at"],
+            "days_left": None if left is None else round(left, 1),
+            "run": info.get("run_cmd", ""),
+        })
+    return rows
+
+
 def cmd_status(args: argparse.Namespace) -> int:
     """Show server status."""
     port = storage.load_port() or 8080
-    host = storage.load_host() or detect_ip()
+    host = _host()
 
     running = False
     systemd_managed = False
 
-    if has_systemd():
-        result = subprocess.run(
-            ["systemctl", "--user", "is-active", "drop.service"],
-            capture_output=True,
-            text=True,
-        )
-        if result.stdout.strip() == "active":
+    if _has_systemd():
+        if _service_active():
             running = True
             systemd_managed = True
     else:
@@ -280,6 +525,14 @@ def cmd_status(args: argparse.Namespace) -> int:
             except OSError:
                 storage.clear_pid()
 
+    rows = _page_rows(_load_pages(), host, port)
+    if args.json:
+        print(json.dumps({
+            "server": {"url": f"http://{host}:{port}", "running": running, "systemd": systemd_managed},
+            "pages": rows,
+        }))
+        return 0
+
     if running:
         extra = " (systemd)" if systemd_managed else ""
         print(f"Server: http://{host}:{port} (running{extra})")
@@ -287,14 +540,12 @@ def cmd_status(args: argparse.Namespace) -> int:
         print("Server: not running")
 
     print()
-    pages = storage.load_pages()
-    if not pages:
+    if not rows:
         print("No pages published")
     else:
         print("Pages:")
-        for page_id, info in pages.items():
-            source = info["source"]
-            created = datetime.fromisoformat(info["created_at"])
+        for row in rows:
+            created = datetime.fromisoformat(row["created_at"])
             age = datetime.now(UTC) - created
             if age.days > 0:
                 age_str = f"{age.days}d ago"
@@ -303,17 +554,79 @@ def cmd_status(args: argparse.Namespace) -> int:
             else:
                 age_str = f"{age.seconds // 60}m ago"
 
-            lock = "" if info["password_hash"] else " (public)"
-            print(f"  {page_id}  {source}  {age_str}{lock}")
+            status = f" [{row['status']}]" if row["status"] else ""
+            lock = " (public)" if row["public"] else ""
+            warning = "" if row["source_exists"] else " ⚠️ source deleted"
+            print(f"  {row['id']}  {row['source']}  {age_str}{status}{lock}{warning}")
 
     return 0
 
 
-def cmd_add(args: argparse.Namespace) -> int:
-    """Add a page or app."""
-    source = Path(args.path).resolve()
+ADD_WORKERS = 8  # threads validating sources/manifests for batch `drop add`
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _add_paths(args: argparse.Namespace) -> list[str]:
+    """Paths from the command line plus --from-file (one per line, '-' for stdin)."""
+    paths = list(args.path)
+    if args.from_file:
+        text = sys.stdin.read() if args.from_file == "-" else Path(args.from_file).read_text()
+        paths += [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    return paths
+
+
+def _check_source(path: str, is_app: bool, raw: bool = False) -> tuple[Path, list[str] | None, str]:
+    """Validate one source. Returns (resolved path, manifest, error or '')."""
+    source = Path(path).resolve()
     if not source.exists():
-        print(f"Error: {args.path} not found", file=sys.stderr)
+        return source, None, f"{path} not found"
+    if source.is_file() and not is_app and not raw and archives.is_archive(source):
+        # Archive page: the manifest lives inside the archive
+        try:
+            return source, archives.get_index(source).patterns, ""
+        except (archives.ArchiveError, OSError) as e:
+            return source, None, f"{e} (use --raw to publish the file itself)"
+    # Directory requires manifest (for static only)
+    if source.is_dir() and not is_app:
+        manifest = load_manifest(source)
+        if manifest is None:
+            return source, None, f"Directory requires {MANIFEST_FILE} manifest"
+        return source, manifest, ""
+    return source, None, ""
+
+
+def _published_files(source: Path, manifest: list[str] | None) -> tuple[int, int]:
+    """What a static or archive page serves: (file count, total bytes)."""
+    if source.is_file():
+        if manifest is not None:
+            members = archives.get_index(source).members.values()
+            return len(members), sum(member.size for member in members)
+        return 1, source.stat().st_size
+    from . import fileindex
+
+    index = fileindex.FileIndex(source, manifest, watch=False, limit=None)
+    return len(index.files), index.total_size
+
+
+def cmd_add(args: argparse.Namespace) -> int:
+    """Add one or more pages, or an app."""
+    try:
+        paths = _add_paths(args)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not paths:
+        print("Error: no paths given", file=sys.stderr)
+        return 1
+    batch = len(paths) > 1
+    if batch and (args.name or args.run or args.port):
+        print("Error: --name, --run and --port need a single path", file=sys.stderr)
         return 1
 
     # Validate app args
@@ -324,74 +637,142 @@ def cmd_add(args: argparse.Namespace) -> int:
     if args.port and not args.run:
         print("Error: --run is required when using --port", file=sys.stderr)
         return 1
+    if is_app and args.snapshot:
+        print("Error: --snapshot cannot be used with --run", file=sys.stderr)
+        return 1
 
-    # Directory requires manifest (for static only)
-    if source.is_dir() and not is_app:
-        manifest = load_manifest(source)
-        if manifest is None:
-            print(f"Error: Directory requires {MANIFEST_FILE} manifest", file=sys.stderr)
+    if batch:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=ADD_WORKERS) as pool:
+            checked = list(pool.map(lambda path: _check_source(path, is_app, args.raw), paths))
+    else:
+        checked = [_check_source(paths[0], is_app, args.raw)]
+
+    # All or nothing: one bad path fails the whole batch
+    failed = False
+    for path, (source, manifest, error) in zip(paths, checked):
+        if not error:
+            if manifest is not None and not args.json:
+                print(f"Using manifest: {', '.join(manifest)}")
+            continue
+        failed = True
+        print(f"Error: {path}: {error}" if batch and source.exists() else f"Error: {error}", file=sys.stderr)
+        if manifest is None and source.is_dir():
             print(f"Create {source / MANIFEST_FILE} with allowed file patterns:", file=sys.stderr)
             print("  index.html", file=sys.stderr)
             print("  assets/**", file=sys.stderr)
-            return 1
-        print(f"Using manifest: {', '.join(manifest)}")
+    if failed:
+        return 1
 
-    page_id = generate_page_id()
+    kinds = [
+        "app" if is_app else "archive" if source.is_file() and manifest is not None else "static"
+        for source, manifest, _error in checked
+    ]
+    if args.snapshot and "archive" in kinds:
+        print("Error: --snapshot cannot be used with archives (add --raw to publish the archive file)", file=sys.stderr)
+        return 1
 
-    # Handle password (default: no password)
-    if args.password:
-        password = args.password if args.password is not True else generate_password()
-        password_hash = hash_password(password)
-    else:
-        password = None
-        password_hash = ""
+    digests = [""] * len(checked)
+    counts: list[tuple[int, int] | None] = [None] * len(checked)
+    if args.snapshot:
+        from . import snapshots
+
+        for i, (source, manifest, _error) in enumerate(checked):
+            try:
+                digests[i], count, size = snapshots.create(source, manifest)
+            except (snapshots.SnapshotError, OSError) as e:
+                print(f"Error: snapshot failed: {e}", file=sys.stderr)
+                return 1
+            counts[i] = count, size
+            if not args.json:
+                print(f"Snapshot: {count} files, {_format_size(size)}")
+    elif not is_app:
+        from .fileindex import FileIndexError
+
+        with _timed("index files"):
+            for i, (source, manifest, _error) in enumerate(checked):
+                try:
+                    counts[i] = count, size = _published_files(source, manifest)
+                except (archives.ArchiveError, FileIndexError, OSError) as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    return 1
+                if not args.json:
+                    print(f"Files: {count} files, {_format_size(size)}")
 
     name = args.name or ""
+    entries: dict[str, storage.PageInfo] = {}
+    passwords: dict[str, str | None] = {}
+    page_counts: dict[str, tuple[int, int] | None] = {}
+    for (source, _manifest, _error), kind, digest, count in zip(checked, kinds, digests, counts):
+        page_id = generate_page_id()
+
+        # Handle password (default: no password)
+        if args.password:
+            password = args.password if args.password is not True else generate_password()
+            password_hash = hash_password(password)
+        else:
+            password = None
+            password_hash = ""
+
+        entries[page_id] = storage.page_info(
+            source,
+            password_hash,
+            args.desc or "",
+            name,
+            page_type=kind,
+            run_cmd=args.run or "",
+            port=args.port or 0,
+            keep=args.keep,
+            snapshot=digest,
+        )
+        passwords[page_id] = password
+        page_counts[page_id] = count
 
     # Add to storage
-    storage.add_page(
-        page_id,
-        source,
-        password_hash,
-        args.desc or "",
-        name,
-        page_type="app" if is_app else "static",
-        run_cmd=args.run or "",
-        port=args.port or 0,
-    )
+    storage.add_pages(entries)
 
     # Get URL
     server_port = storage.load_port() or 8080
-    host = storage.load_host() or detect_ip()
-
-    if is_app:
-        # App URL is direct port access
-        url = f"http://{host}:{args.port}/"
-        print(f"App registered: {url}")
-        print(f"Run 'drop start {page_id}' to start the app")
-    else:
-        # Static URL through drop server
-        if name:
+    host = _host()
+
+    for page_id, password in passwords.items():
+        if is_app:
+            # App URL through the server's proxy
+            url = _app_url(host, page_id, name, server_port)
+        elif name:
+            # Static URL through drop server
             url = f"http://{host}:{server_port}/p/{page_id}/{name}/"
         else:
             url = f"http://{host}:{server_port}/p/{page_id}/"
-        print(f"Published: {url}")
 
-    if password:
-        print(f"Password: {password}")
+        if args.json:
+            count = page_counts[page_id]
+            print(json.dumps({
+                "id": page_id, "name": name, "url": url, "password": password,
+                "snapshot": entries[page_id]["snapshot"],
+                "files": count[0] if count else None, "bytes": count[1] if count else None,
+            }))
+            continue
+        if is_app:
+            print(f"App registered: {url}")
+            print(f"Run 'drop start {page_id}' to start the app")
+        else:
+            print(f"Published: {url}")
+        if password:
+            print(f"Password: {password}")
 
     return 0
 
 
 def cmd_list(args: argparse.Namespace) -> int:
     """List pages (filtered by current directory by default)."""
-    pages = storage.load_pages()
+    pages = _load_pages()
     if not pages:
-        print("No pages published")
+        if not args.json:
+            print("No pages published")
         return 0
 
-    server_port = storage.load_port() or 8080
-    host = storage.load_host() or detect_ip()
     cwd = Path.cwd().resolve()
 
     # Filter by current directory unless --all
@@ -407,51 +788,71 @@ def cmd_list(args: argparse.Namespace) -> int:
         pages = filtered
 
     if not pages:
-        print(f"No pages from {cwd}")
-        print("Use 'drop list --all' to see all pages")
+        if not args.json:
+            print(f"No pages from {cwd}")
+            print("Use 'drop list --all' to see all pages")
         return 0
 
-    for page_id, info in pages.items():
-        page_type = info.get("type", "static")
-        name = info.get("name", "")
-
-        if page_type == "app":
-            # App: show direct port URL
-            port = info.get("port", 0)
-            url = f"http://{host}:{port}/"
-            status = storage.get_app_status(page_id)
-            status_str = f" [{status}]"
+    if args.type:
+        pages = {page_id: info for page_id, info in pages.items() if _page_kind(info) == args.type}
+    rows = _page_rows(pages, _host(), storage.load_port() or 8080)
+    if args.status:
+        rows = [row for row in rows if row["status"] == args.status]
+    if args.missing:
+        rows = [row for row in rows if not row["source_exists"]]
+    rows.sort(key=LIST_SORT_KEYS[args.sort])
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return 0
+    if not rows:
+        print("No matching pages")
+        return 0
+
+    for row in rows:
+        type_label = f"[{row['type']}]" if row["type"] != "static" else ""
+        status_str = f" [{row['status']}]" if row["status"] else ""
+        lock = " (public)" if row["public"] else ""
+        source_warning = "" if row["source_exists"] else " ⚠️ source deleted"
+
+        # Warn before inactivity expiry
+        left = row["days_left"]
+        if left is not None and left <= access.WARN_DAYS:
+            inactive = access.INACTIVE_DAYS - left
+            expiry_warning = f" ⚠️ inactive {inactive:.0f} days, will be removed in {max(left, 0):.0f} days"
         else:
-            # Static: show drop server URL
-            if name:
-                url = f"http://{host}:{server_port}/p/{page_id}/{name}/"
-            else:
-                url = f"http://{host}:{server_port}/p/{page_id}/"
-            status_str = ""
+            expiry_warning = ""
+
+        print(f"{row['id'][:8]}  {type_label}{status_str}  {row['url']}{lock}{source_warning}{expiry_warning}")
 
-        lock = "" if info["password_hash"] else " (public)"
+        if row["description"]:
+            print(f"  {row['description']}")
+        print(f"  Source: {row['source']}")
+        if row["type"] == "app":
+            print(f"  Run: {row['run']}")
 
-        # Check source exists
-        source_exists = Path(info["source"]).exists()
-        source_warning = " ⚠️ source deleted" if not source_exists else ""
+    return 0
 
-        type_label = f"[{page_type}]" if page_type == "app" else ""
-        print(f"{page_id[:8]}  {type_label}{status_str}  {url}{lock}{source_warning}")
 
-        desc = info.get("description", "")
-        if desc:
-            print(f"  {desc}")
-        print(f"  Source: {info['source']}")
-        if page_type == "app":
-            print(f"  Run: {info.get('run_cmd', '')}")
+def _collect_garbage() -> None:
+    """Delete snapshot objects that no page references any more."""
+    from . import snapshots
 
-    return 0
+    try:
+        removed, freed = snapshots.gc(storage.load_pages())
+    except OSError as e:
+        print(f"Warning: snapshot cleanup failed: {e}", file=sys.stderr)
+        return
+    if removed:
+        print(f"Freed {_format_size(freed)} of snapshot data ({removed} objects)")
 
 
 def cmd_remove(args: argparse.Namespace) -> int:
     """Remove a page."""
     if storage.remove_page(args.id):
         print(f"Removed: {args.id}")
+        _collect_garbage()
         return 0
     else:
         print(f"Error: page {args.id} not found", file=sys.stderr)
@@ -460,15 +861,17 @@ def cmd_remove(args: argparse.Namespace) -> int:
 
 def cmd_cleanup(args: argparse.Namespace) -> int:
     """Remove entries with deleted source files."""
-    pages = storage.load_pages()
+    pages = _load_pages()
     if not pages:
         print("No pages to clean")
+        _collect_garbage()
         return 0
 
     removed = []
     for page_id, info in list(pages.items()):
         source = Path(info["source"])
-        if not source.exists():
+        # Snapshots keep serving their copy after the source is gone
+        if not source.exists() and not info.get("snapshot"):
             # Stop app if running
             if info.get("type") == "app":
                 pid = info.get("pid", 0)
@@ -478,16 +881,63 @@ def cmd_cleanup(args: argparse.Namespace) -> int:
                     except OSError:
                         pass
             removed.append(page_id)
-            del pages[page_id]
 
     if removed:
-        storage.save_pages(pages)
+        storage.remove_pages(removed)
         for page_id in removed:
             print(f"Removed: {page_id} (source deleted)")
         print(f"Cleaned {len(removed)} stale entries")
     else:
         print("No stale entries found")
+    _collect_garbage()
+
+    return 0
+
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    """Move the registry between pages.json and pages.db."""
+    try:
+        count = storage.migrate_registry(args.to)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Migrated {count} pages to {args.to}")
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Export the registry as pages.json-format JSON."""
+    text = json.dumps(storage.load_pages(), indent=2)
+    if args.output:
+        storage.atomic_write_text(Path(args.output).resolve(), text + "\n")
+        print(f"Exported to {args.output}")
+    else:
+        print(text)
+    return 0
 
+
+def cmd_profile(args: argparse.Namespace) -> int:
+    """Show or change request timing/profiling settings of the running server."""
+    from . import profiling
+
+    config = dict(profiling.DEFAULTS) if args.off else profiling.load_config()
+    if args.server_timing is not None:
+        config["server_timing"] = args.server_timing == "on"
+    if args.slow is not None:
+        config["slow_ms"] = args.slow
+    if args.sample is not None:
+        if not 0 <= args.sample <= 1:
+            print("Error: --sample must be between 0 and 1", file=sys.stderr)
+            return 1
+        config["profile_rate"] = args.sample
+    if args.off or args.server_timing is not None or args.slow is not None or args.sample is not None:
+        profiling.save_config(config)
+
+    slow = f">= {config['slow_ms']} ms -> {profiling.SLOW_LOG}" if config["slow_ms"] else "off"
+    sample = f"{config['profile_rate']:.2%} -> {profiling.PROFILES_DIR}" if config["profile_rate"] else "off"
+    print(f"Server-Timing header: {'on' if config['server_timing'] else 'off'}")
+    print(f"Slow request log:     {slow}")
+    print(f"Profiled requests:    {sample}")
     return 0
 
 
@@ -497,13 +947,35 @@ def main() -> None:
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog=__doc__,
     )
+    parser.add_argument("--timing", action="store_true", help="Report where command time goes (stderr)")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # start
     p_start = subparsers.add_parser("start", help="Start server or app")
     p_start.add_argument("name", nargs="?", help="App name/ID to start (omit for server)")
     p_start.add_argument("--port", "-p", type=int, default=8080, help="Server port (default: 8080)")
+    p_start.add_argument("--all-apps", action="store_true", help="Start all stopped apps in parallel")
+    p_start.add_argument("--timeout", type=float, default=APP_READY_TIMEOUT, metavar="SECONDS",
+                         help=f"Wait this long for an app's port to open (default: {APP_READY_TIMEOUT:g})")
     p_start.add_argument("--host", help="Override auto-detected IP")
+    p_start.add_argument("--strict-paths", action="store_true",
+                         help="Open files in one no-symlink walk (refuses all symlinks)")
+    p_start.add_argument("--etag", choices=["stat", "hash"], default="stat",
+                         help="ETag from mtime+size (default) or cached content hash")
+    p_start.add_argument("--sendfile", choices=["direct", "x-sendfile", "x-accel"], default="direct",
+                         help="Send file bodies directly (default) or via front proxy header")
+    p_start.add_argument("--workers", "-w", type=int, default=1,
+                         help="Pre-fork N worker processes (default: 1, threaded dev server)")
+    p_start.add_argument("--threads", type=int, default=16,
+                         help="Threads per worker for --workers/--engine asyncio (default: 16)")
+    p_start.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                         help="asyncio: event loop for many idle/slow connections")
+    p_start.add_argument("--metrics", metavar="ADDR",
+                         help="Serve /metrics on PORT, HOST:PORT or unix:/path instead of the main port")
+    p_start.add_argument("--memory-cache", type=int, default=64, metavar="MB",
+                         help="Keep hot small files in memory, up to MB per worker (default: 64, 0 = off)")
+    p_start.add_argument("--memory-cache-max", type=int, default=256, metavar="KB",
+                         help="Largest file kept in memory (default: 256)")
     p_start.set_defaults(func=cmd_start)
 
     # stop
@@ -513,22 +985,39 @@ def main() -> None:
 
     # status
     p_status = subparsers.add_parser("status", help="Show status")
+    p_status.add_argument("--json", action="store_true", help="Print server and pages as one JSON object")
     p_status.set_defaults(func=cmd_status)
 
     # add
-    p_add = subparsers.add_parser("add", help="Publish a file or folder")
-    p_add.add_argument("path", help="File or folder to publish")
+    p_add = subparsers.add_parser("add", help="Publish files or folders")
+    p_add.add_argument("path", nargs="*", help="Files or folders to publish")
+    p_add.add_argument("--from-file", "-f", metavar="FILE",
+                       help="Also publish paths listed in FILE, one per line ('-' for stdin)")
+    p_add.add_argument("--json", action="store_true",
+                       help="Print one JSON line per page: id, name, url, password")
     p_add.add_argument("--name", "-n", help="Human-readable name for URL (slug)")
     p_add.add_argument("--password", "-p", nargs="?", const=True, default=None,
                        help="Protect with password (auto-generate if no value given)")
     p_add.add_argument("--desc", "-d", help="Description for listing")
     p_add.add_argument("--run", "-r", help="Command to run (makes this an app)")
     p_add.add_argument("--port", type=int, help="Port the app listens on (required with --run)")
+    p_add.add_argument("--keep", action="store_true",
+                       help=f"Never auto-remove (default: removed after {access.INACTIVE_DAYS} days without visits)")
+    p_add.add_argument("--raw", action="store_true",
+                       help="Publish a .zip/.tar as a downloadable file instead of serving its contents")
+    p_add.add_argument("--snapshot", "-s", action="store_true",
+                       help="Publish a copy of the files as they are now (cached by browsers, survives source changes)")
     p_add.set_defaults(func=cmd_add)
 
     # list
     p_list = subparsers.add_parser("list", help="List published pages")
     p_list.add_argument("--all", "-a", action="store_true", help="Show all pages (not just current directory)")
+    p_list.add_argument("--json", action="store_true", help="Print one JSON line per page")
+    p_list.add_argument("--type", "-t", choices=["static", "app", "archive", "snapshot"], help="Only pages of this type")
+    p_list.add_argument("--status", choices=["running", "stopped", "crashed"], help="Only apps in this state")
+    p_list.add_argument("--missing", action="store_true", help="Only pages whose source was deleted")
+    p_list.add_argument("--sort", choices=list(LIST_SORT_KEYS), default="created",
+                        help="Order pages by creation (default), name, source or time left before expiry")
     p_list.set_defaults(func=cmd_list)
 
     # remove
@@ -537,11 +1026,39 @@ def main() -> None:
     p_remove.set_defaults(func=cmd_remove)
 
     # cleanup
-    p_cleanup = subparsers.add_parser("cleanup", help="Remove entries with deleted sources")
+    p_cleanup = subparsers.add_parser("cleanup", help="Remove entries with deleted sources, free unused snapshots")
     p_cleanup.set_defaults(func=cmd_cleanup)
 
+    # profile
+    p_profile = subparsers.add_parser("profile", help="Request timing and profiling (applies without restart)")
+    p_profile.add_argument("--server-timing", choices=["on", "off"], help="Per-phase Server-Timing header")
+    p_profile.add_argument("--slow", type=float, metavar="MS", help="Log requests slower than MS to slow.log (0 = off)")
+    p_profile.add_argument("--sample", type=float, metavar="RATE",
+                           help="Profile this fraction of requests with cProfile, e.g. 0.01 (0 = off)")
+    p_profile.add_argument("--off", action="store_true", help="Turn everything off")
+    p_profile.set_defaults(func=cmd_profile)
+
+    # migrate
+    p_migrate = subparsers.add_parser("migrate", help="Move registry to SQLite (or back to JSON)")
+    p_migrate.add_argument("--to", choices=["sqlite", "json"], default="sqlite",
+                           help="Target backend (default: sqlite)")
+    p_migrate.set_defaults(func=cmd_migrate)
+
+    # export
+    p_export = subparsers.add_parser("export", help="Export registry as JSON")
+    p_export.add_argument("--output", "-o", help="Write to file instead of stdout")
+    p_export.set_defaults(func=cmd_export)
+
     args = parser.parse_args()
-    sys.exit(args.func(args))
+    if not args.timing:
+        sys.exit(args.func(args))
+    startup = _process_uptime()
+    try:
+        with _timed(f"command ({args.command})"):
+            code = args.func(args)
+    finally:
+        _print_timings(startup)
+    sys.exit(code)
 
 
 if __name__ == "__main__":
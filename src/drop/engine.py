@@ -0,0 +1,482 @@
+"""Server engines for drop."""
+
+import asyncio
+import io
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote_to_bytes
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from .static import FileBody
+
+
+GRACEFUL_TIMEOUT = 30.0  # seconds workers get to finish in-flight requests
+RESPAWN_DELAY = 1.0  # pause before respawning a worker that died young
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Werkzeug handler that lets file bodies sendfile() straight to the socket.
+
+    Safe because werkzeug writes each body chunk unbuffered before asking
+    for the next one, so headers are on the wire when a FileBody takes over.
+    """
+
+    def make_environ(self) -> dict:
+        environ = super().make_environ()
+        environ["drop.socket"] = self.connection
+        return environ
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handling connections on a fixed-size thread pool."""
+
+    multithread = True
+
+    def __init__(self, *args, threads: int = 16, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="drop-worker")
+
+    def process_request(self, request, client_address) -> None:
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        """Stop accepting and wait for in-flight requests to finish."""
+        super().server_close()
+        if hasattr(self, "_pool"):
+            self._pool.shutdown(wait=True)
+
+
+def listen_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(
+    app,
+    host: str,
+    port: int,
+    threads: int,
+    shared: socket.socket | None,
+    on_exit: Callable[[], None] | None,
+    engine: str,
+    on_start: Callable[[], None] | None = None,
+) -> None:
+    """Worker process body: serve until SIGTERM, then drain and exit."""
+    if on_start is not None:
+        on_start()
+    # SO_REUSEPORT: own socket per worker, kernel balances accepts between them
+    sock = shared or listen_socket(host, port, reuse_port=True)
+    if engine == "asyncio":
+        serve_asyncio(app, host, port, threads, sock=sock, on_exit=on_exit)
+        os._exit(0)
+
+    server = PooledWSGIServer(
+        host, port, app, RequestHandler, fd=sock.fileno(), threads=threads,
+    )
+    server.multiprocess = True
+
+    def stop(signum, frame) -> None:
+        # shutdown() blocks until serve_forever() returns, so not on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    code = 0
+    try:
+        server.serve_forever()
+    except Exception:
+        code = 1
+    finally:
+        server.server_close()
+        if on_exit is not None:
+            on_exit()
+    os._exit(code)
+
+
+def serve_prefork(
+    app,
+    host: str,
+    port: int,
+    workers: int,
+    threads: int = 16,
+    on_exit: Callable[[], None] | None = None,
+    engine: str = "threaded",
+    on_start: Callable[[], None] | None = None,
+) -> None:
+    """
+    Run app in N pre-forked worker processes, each with a bounded thread pool
+    ("threaded") or an event loop plus thread pool ("asyncio").
+    The master respawns workers that die and, on SIGTERM/SIGINT, lets them
+    drain in-flight requests for up to GRACEFUL_TIMEOUT seconds.
+    on_start runs in each worker before it serves, on_exit after it stops.
+    """
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    # Without SO_REUSEPORT all workers accept() on one inherited socket
+    shared = None if reuse_port else listen_socket(host, port, reuse_port=False)
+    if reuse_port:
+        # Fail in the master (not N times in workers) if the port is taken
+        listen_socket(host, port, reuse_port=True).close()
+
+    children: dict[int, float] = {}  # {pid: started_at}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app, host, port, threads, shared, on_exit, engine, on_start)
+            finally:
+                os._exit(1)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f" * Serving on http://{host}:{port} with {workers} {engine} workers x {threads} threads",
+          file=sys.stderr)
+
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            # Graceful drain: workers stop accepting and finish in-flight requests
+            deadline = time.monotonic() + GRACEFUL_TIMEOUT
+            _signal_all(children, signal.SIGTERM)
+        elif deadline is not None and time.monotonic() >= deadline:
+            _signal_all(children, signal.SIGKILL)
+            deadline = float("inf")
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+
+        started_at = children.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        print(f" * Worker {pid} exited (status {status}), respawning", file=sys.stderr)
+        if time.monotonic() - started_at < RESPAWN_DELAY:
+            # Crash loop guard
+            time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            spawn()
+
+
+def _signal_all(children: dict[int, float], signum: int) -> None:
+    for pid in list(children):
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
+
+
+# Asyncio engine: one coroutine per connection, app calls on a bounded pool
+
+KEEPALIVE_TIMEOUT = 75.0  # seconds an idle keep-alive connection is kept
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 64 * 1024 * 1024  # request bodies are buffered in memory
+
+
+class _Connection:
+    """State of one client connection for graceful shutdown."""
+
+    __slots__ = ("task", "busy")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.busy = False
+
+
+class AsyncServer:
+    """
+    HTTP/1.1 server on asyncio running a WSGI app.
+    Idle keep-alive connections cost a coroutine, not a thread. The app
+    (path checks, file stats, reads) runs on a bounded thread pool, bodies
+    are written with backpressure, and FileBody spans go out via
+    loop.sendfile().
+    """
+
+    def __init__(self, app, threads: int = 16) -> None:
+        self.app = app
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="drop-async")
+        self.connections: set[_Connection] = set()
+        self.server: asyncio.base_events.Server | None = None
+        self.sockname = ("", 0)
+
+    async def start(self, sock: socket.socket) -> None:
+        self.server = await asyncio.start_server(self._handle, sock=sock, limit=MAX_HEADER_SIZE)
+        self.sockname = sock.getsockname()[:2]
+
+    async def stop(self) -> None:
+        """Stop accepting, drop idle connections, let busy ones finish."""
+        self.server.close()
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.connections and time.monotonic() < deadline:
+            for conn in list(self.connections):
+                if not conn.busy:
+                    conn.task.cancel()
+            await asyncio.sleep(0.1)
+        for conn in list(self.connections):
+            conn.task.cancel()
+        self.pool.shutdown(wait=False)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = _Connection(asyncio.current_task())
+        self.connections.add(conn)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._simple_response(writer, 431)
+                    break
+                conn.busy = True
+                keep_alive = await self._serve_one(head, reader, writer)
+                conn.busy = False
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(conn)
+            writer.close()
+
+    async def _simple_response(self, writer: asyncio.StreamWriter, code: int) -> None:
+        body = HTTPStatus(code).phrase.encode()
+        writer.write(
+            f"HTTP/1.1 {code} {HTTPStatus(code).phrase}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _serve_one(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Serve one request. Returns True if the connection may be reused."""
+        try:
+            request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+            method, target, version = request_line.split(" ")
+            headers = []
+            for line in header_lines:
+                name, sep, value = line.partition(":")
+                if not sep or not name or name != name.strip():
+                    raise ValueError(line)
+                headers.append((name, value.strip()))
+        except ValueError:
+            await self._simple_response(writer, 400)
+            return False
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            await self._simple_response(writer, 505)
+            return False
+
+        lowered = {name.lower(): value for name, value in headers}
+        connection = lowered.get("connection", "").lower()
+        keep_alive = "close" not in connection if version == "HTTP/1.1" else "keep-alive" in connection
+
+        body = await self._read_body(lowered, reader, writer)
+        if body is None:
+            return False
+
+        environ = self._environ(method, target, version, headers, body, writer)
+        response: dict = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = status
+            response["headers"] = response_headers
+            return lambda data: None  # Legacy write() callable is not supported
+
+        loop = asyncio.get_running_loop()
+        try:
+            app_iter = await loop.run_in_executor(self.pool, self.app, environ, start_response)
+        except Exception:
+            await self._simple_response(writer, 500)
+            return False
+
+        try:
+            return await self._send(loop, method, version, keep_alive, response, app_iter, writer)
+        finally:
+            close = getattr(app_iter, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self.pool, close)
+
+    async def _read_body(self, lowered: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bytes | None:
+        if lowered.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        try:
+            if "chunked" in lowered.get("transfer-encoding", "").lower():
+                chunks = []
+                total = 0
+                while True:
+                    size_line = await reader.readuntil(b"\r\n")
+                    size = int(size_line.split(b";")[0], 16)
+                    total += size
+                    if total > MAX_BODY_SIZE:
+                        await self._simple_response(writer, 413)
+                        return None
+                    if size == 0:
+                        # Skip trailers
+                        while await reader.readuntil(b"\r\n") != b"\r\n":
+                            pass
+                        return b"".join(chunks)
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readexactly(2)
+            length = int(lowered.get("content-length", "0") or 0)
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            await self._simple_response(writer, 400)
+            return None
+        if length > MAX_BODY_SIZE:
+            await self._simple_response(writer, 413)
+            return None
+        return await reader.readexactly(length) if length > 0 else b""
+
+    def _environ(self, method: str, target: str, version: str, headers: list, body: bytes,
+                 writer: asyncio.StreamWriter) -> dict:
+        path, _, query = target.partition("?")
+        if "://" in path:
+            # Absolute-form request target
+            path = "/" + path.split("://", 1)[1].partition("/")[2]
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.input_terminated": True,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            "SERVER_SOFTWARE": "drop-asyncio",
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+            "QUERY_STRING": query,
+            "REQUEST_URI": target,
+            "RAW_URI": target,
+            "REMOTE_ADDR": peer[0],
+            "REMOTE_PORT": peer[1],
+            "SERVER_NAME": str(self.sockname[0]),
+            "SERVER_PORT": str(self.sockname[1]),
+            "SERVER_PROTOCOL": version,
+            "CONTENT_LENGTH": str(len(body)) if body else "",
+        }
+        for name, value in headers:
+            if "_" in name:
+                continue
+            key = name.upper().replace("-", "_")
+            if key in ("CONTENT_LENGTH", "TRANSFER_ENCODING"):
+                continue
+            if key != "CONTENT_TYPE":
+                key = f"HTTP_{key}"
+                if key in environ:
+                    value = f"{environ[key]},{value}"
+            environ[key] = value
+        return environ
+
+    async def _send(self, loop, method: str, version: str, keep_alive: bool, response: dict,
+                    app_iter, writer: asyncio.StreamWriter) -> bool:
+        status = response["status"]
+        headers = [(k, v) for k, v in response["headers"] if k.lower() not in ("connection", "keep-alive")]
+        code = int(status.split(" ", 1)[0])
+        has_length = any(k.lower() == "content-length" for k, v in headers)
+        no_body = method == "HEAD" or code in (204, 304) or 100 <= code < 200
+        chunked = not has_length and not no_body and version == "HTTP/1.1"
+        if not has_length and not no_body and not chunked:
+            keep_alive = False  # HTTP/1.0 body delimited by close
+        if chunked:
+            headers.append(("Transfer-Encoding", "chunked"))
+        headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+
+        head = f"HTTP/1.1 {status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers) + "\r\n"
+        writer.write(head.encode("latin-1"))
+        response["sent"] = True
+
+        if no_body:
+            await writer.drain()
+            return keep_alive
+
+        if isinstance(app_iter, FileBody):
+            await writer.drain()
+            file = await loop.run_in_executor(self.pool, app_iter.open)
+            for segment in app_iter.segments:
+                if isinstance(segment, bytes):
+                    writer.write(segment)
+                    await writer.drain()
+                else:
+                    offset, length = segment
+                    await loop.sendfile(writer.transport, file, offset, length)
+            return keep_alive
+
+        iterator = iter(app_iter)
+        while True:
+            # next() may block (file reads, proxied upstreams), so off the loop
+            chunk = await loop.run_in_executor(self.pool, next, iterator, None)
+            if chunk is None:
+                break
+            if not chunk:
+                continue
+            if chunked:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            else:
+                writer.write(chunk)
+            # Backpressure: wait for slow clients instead of buffering the body
+            await writer.drain()
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return keep_alive
+
+
+def serve_asyncio(app, host: str, port: int, threads: int = 16, sock: socket.socket | None = None,
+                  on_exit: Callable[[], None] | None = None) -> None:
+    """Run app on the asyncio engine until SIGTERM/SIGINT."""
+    sock = sock or listen_socket(host, port, reuse_port=False)
+    print(f" * Serving on http://{host}:{port} (asyncio engine, {threads} threads)", file=sys.stderr)
+
+    async def main() -> None:
+        server = AsyncServer(app, threads)
+        await server.start(sock)
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopped.set)
+        await stopped.wait()
+        await server.stop()
+
+    try:
+        asyncio.run(main())
+    finally:
+        if on_exit is not None:
+            on_exit()
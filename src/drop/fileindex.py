@@ -0,0 +1,547 @@
+"""Allowed-file index of directory pages.
+
+A directory page's manifest is expanded once into {relative path: file
+metadata}, so a request is admitted with one dict lookup instead of
+resolving the path and matching the manifest. On Linux the index follows
+the tree with inotify and re-checks only the paths that changed; without
+inotify (other platforms, watch limit reached) it is rebuilt when older
+than RESCAN_INTERVAL.
+
+Full builds never run on a request: the server indexes a page in the
+background and keeps serving the previous version (or per-request checks)
+until the new one is swapped in. Requests the index cannot answer on its
+own (".." in the path, trees with symlinked directories) fall back to the
+per-request checks as well.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from .utils import MANIFEST_FILE, ManifestMatcher, is_env_file, load_manifest, safe_path
+
+
+RESCAN_INTERVAL = 2.0  # seconds an unwatched index may lag behind the tree
+RETRY_INTERVAL = 60.0  # seconds before indexing a page that failed again
+MAX_FILES = 100_000  # bigger trees are served by per-request checks
+INDEX_CACHE_SIZE = 256  # directory pages indexed per process
+BUILD_WORKERS = 2  # background threads building indexes
+EVENT_BUFFER = 64 * 1024
+
+# inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+# (watched directory relative to the page, mask, name)
+Event = tuple[str, int, str]
+
+
+class FileIndexError(Exception):
+    """Directory cannot be indexed (no manifest, too many files, gone)."""
+
+
+class IndexEntry(NamedTuple):
+    path: str  # file to serve (symlinks resolved)
+    size: int
+    mtime: float
+
+
+class _Inotify:
+    """The process's inotify instance; each watch maps back to the indexes using it.
+
+    One instance for all pages: the kernel allows few per user
+    (fs.inotify.max_user_instances, often 128), shared with prefork workers.
+    Two pages over the same directory get the same watch descriptor.
+    """
+
+    def __init__(self, libc: ctypes.CDLL, fd: int) -> None:
+        self.libc = libc
+        self.fd = fd
+        self.lock = threading.Lock()
+        self.owners: dict[int, dict["FileIndex", str]] = {}  # {wd: {index: relative directory}}
+        # poll() is cheaper than a read() failing with EAGAIN on every request
+        self._poll = select.poll()
+        self._poll.register(fd, select.POLLIN)
+
+    def add(self, index: "FileIndex", path: str, directory: str) -> int | None:
+        """Watch a directory for index. Returns the wd, 0 if it is gone, None if refused."""
+        with self.lock:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                return 0 if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR) else None
+            self.owners.setdefault(wd, {})[index] = directory
+            return wd
+
+    def remove(self, index: "FileIndex", wds: list[int]) -> None:
+        """Drop index's interest in watches; the last user removes the watch."""
+        with self.lock:
+            for wd in wds:
+                owners = self.owners.get(wd)
+                if owners is None or owners.pop(index, None) is None or owners:
+                    continue
+                del self.owners[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def dispatch(self) -> None:
+        """Queue pending events on the indexes they concern."""
+        if not self._poll.poll(0):
+            return
+        with self.lock:
+            while True:
+                try:
+                    data = os.read(self.fd, EVENT_BUFFER)
+                except BlockingIOError:
+                    return
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = os.fsdecode(data[offset:offset + length].split(b"\0", 1)[0])
+                    offset += length
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were lost: every index must be rebuilt
+                        for index in {index for owners in self.owners.values() for index in owners}:
+                            index.pending.append(("", mask, ""))
+                        continue
+                    if mask & IN_IGNORED:
+                        self.owners.pop(wd, None)  # Watch gone with its directory
+                        continue
+                    for index, directory in self.owners.get(wd, {}).items():
+                        index.pending.append((directory, mask, name))
+
+
+_inotify: _Inotify | None = None
+_inotify_tried = False
+_inotify_lock = threading.Lock()
+_warned = False
+
+
+def _shared_inotify() -> _Inotify | None:
+    """The process's inotify instance, None where unavailable."""
+    global _inotify, _inotify_tried
+    if _inotify_tried:
+        return _inotify
+    with _inotify_lock:
+        if _inotify_tried:
+            return _inotify
+        _inotify_tried = True
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        except (OSError, AttributeError):
+            return None  # Not Linux
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            _warn(f"inotify unavailable ({os.strerror(ctypes.get_errno())})")
+            return None
+        _inotify = _Inotify(libc, fd)
+        return _inotify
+
+
+def _warn(reason: str) -> None:
+    global _warned
+    if not _warned:
+        _warned = True
+        print(f" * {reason}: directory pages are rescanned every {RESCAN_INTERVAL:g}s instead", file=sys.stderr)
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Part of a manifest pattern before its first wildcard."""
+    cut = len(pattern)
+    for char in "*?[":
+        position = pattern.find(char)
+        if position != -1:
+            cut = min(cut, position)
+    return pattern[:cut]
+
+
+class _Tree:
+    """One build of an index: allowed files, plus the watches that keep them current."""
+
+    def __init__(self, index: "FileIndex", patterns: list[str]) -> None:
+        self.index = index
+        self.base = index.base
+        self.limit = index.limit
+        self.matcher = ManifestMatcher(patterns)
+        self.prefixes = [_literal_prefix(pattern) for pattern in patterns]
+        self.files: dict[str, IndexEntry] = {}
+        self.dirs: set[str] = set()  # manifest-allowed directories (served by their index.html)
+        self.links = False  # has symlinked directories: misses need the slow checks
+        self.wds: dict[str, int] = {}  # {relative directory: wd}
+        self.unlisted: set[str] = set()  # directories that could not be listed
+        self.watched = index.watch and _shared_inotify() is not None
+
+    def unwatch(self, keep: set[int] = frozenset()) -> None:
+        """Release this build's watches, except those a newer build also holds."""
+        if self.wds and _inotify is not None:
+            _inotify.remove(self.index, [wd for wd in self.wds.values() if wd not in keep])
+        self.wds = {}
+
+    def _may_contain(self, directory: str) -> bool:
+        """Whether any pattern can match below directory (else it is not walked)."""
+        below = directory + "/"
+        return any(prefix.startswith(below) or below.startswith(prefix) for prefix in self.prefixes)
+
+    def scan(self, top: str) -> None:
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            path = os.path.join(self.base, directory) if directory else self.base
+            # Watch before listing: nothing created in between is missed
+            if self.watched:
+                wd = _inotify.add(self.index, path, directory)
+                if wd is None:
+                    # Out of inotify watches: rescan periodically instead
+                    _warn("Cannot add inotify watch (raise fs.inotify.max_user_watches)")
+                    self.watched = False
+                    self.unwatch()
+                elif wd:
+                    self.wds[directory] = wd
+            try:
+                entries = os.scandir(path)
+            except OSError:
+                self.unlisted.add(directory)
+                continue
+            with entries:
+                for entry in entries:
+                    relative = f"{directory}/{entry.name}" if directory else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if self._may_contain(relative):
+                            if self.matcher.matches(relative):
+                                self.dirs.add(relative)
+                            stack.append(relative)
+                        continue
+                    # Most files fail the manifest: skip them without a stat()
+                    if not entry.is_symlink() and not self.matcher.matches(relative):
+                        continue
+                    self.check(relative)
+                    if self.limit is not None and len(self.files) > self.limit:
+                        raise FileIndexError(f"{self.base}: more than {self.limit} files")
+
+    def check(self, relative: str) -> None:
+        """Re-decide one path: add, update or drop its entry."""
+        entry = self._entry(relative)
+        if entry is None:
+            self.files.pop(relative, None)
+        else:
+            self.files[relative] = entry
+
+    def _entry(self, relative: str) -> IndexEntry | None:
+        if is_env_file(relative.rsplit("/", 1)[-1]):
+            return None
+        path = os.path.join(self.base, relative)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return None
+        if stat.S_ISLNK(st.st_mode):
+            if os.path.isdir(path):
+                self.links = self.links or Path(path).resolve().is_relative_to(self.base)
+                return None
+            # Same rules as per-request checks: the target must stay inside base
+            target = safe_path(Path(self.base), relative, self.matcher)
+            if target is None:
+                return None
+            try:
+                st = target.stat()
+            except OSError:
+                return None
+            path = str(target)
+        elif not self.matcher.matches(relative):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return IndexEntry(path, st.st_size, st.st_mtime)
+
+    def apply(self, events: list[Event]) -> bool:
+        """Update entries for events. False if only a rebuild can catch up."""
+        for directory, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                return False
+            if not name:
+                if directory == "" and mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    return False  # The page's directory itself is gone
+                continue
+            relative = f"{directory}/{name}" if directory else name
+            if relative == MANIFEST_FILE:
+                return False  # New rules for every path
+            if mask & IN_ISDIR:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget(relative)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    self._forget(relative)  # A replaced directory may hold other files
+                    if self._may_contain(relative):
+                        if self.matcher.matches(relative):
+                            self.dirs.add(relative)
+                        self.scan(relative)
+                elif relative in self.unlisted:
+                    # chmod may have made it readable; other attribute changes keep its entries
+                    self.unlisted.discard(relative)
+                    self.scan(relative)
+            else:
+                self.check(relative)
+        return self.watched
+
+    def _forget(self, directory: str) -> None:
+        below = directory + "/"
+        for name in [name for name in self.files if name.startswith(below)]:
+            del self.files[name]
+        self.dirs = {name for name in self.dirs if name != directory and not name.startswith(below)}
+        self.unlisted = {name for name in self.unlisted if name != directory and not name.startswith(below)}
+        gone = [name for name in self.wds if name == directory or name.startswith(below)]
+        if gone and _inotify is not None:
+            _inotify.remove(self.index, [self.wds.pop(name) for name in gone])
+
+
+class FileIndex:
+    """Manifest-allowed files of one directory, kept current."""
+
+    def __init__(
+        self,
+        base: Path,
+        manifest: list[str] | ManifestMatcher | None = None,
+        watch: bool = True,
+        limit: int | None = MAX_FILES,
+    ) -> None:
+        """Index base by manifest (default: its .drop-publish). Raises FileIndexError."""
+        self.base = str(base.resolve())
+        self.limit = limit
+        self.watch = watch
+        self._fixed = manifest.patterns if isinstance(manifest, ManifestMatcher) else manifest
+        self._lock = threading.Lock()
+        self.pending: deque[Event] = deque()  # filled by _Inotify.dispatch()
+        self.broken = False
+        self._closed = False
+        self._stale = False
+        self._rebuilding = False
+        self._replay: list[Event] = []  # events applied while a rebuild was walking
+        self._paths: dict[str, Path] = {}  # Path objects of served files, built once
+        self._scanned = time.monotonic()
+        self._tree = self._build()
+
+    @property
+    def files(self) -> dict[str, IndexEntry]:
+        return self._tree.files
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self._tree.files.values())
+
+    def close(self) -> None:
+        """Release the watches (the index stops following the tree)."""
+        with self._lock:
+            self._tree.unwatch()
+            self.watch = False
+            self._closed = True
+
+    def _build(self) -> _Tree:
+        patterns = self._fixed if self._fixed is not None else load_manifest(Path(self.base))
+        if patterns is None:
+            raise FileIndexError(f"{self.base}: no {MANIFEST_FILE} manifest")
+        if not os.path.isdir(self.base):
+            raise FileIndexError(f"{self.base}: not a directory")
+        tree = _Tree(self, patterns)
+        try:
+            tree.scan("")
+        except FileIndexError:
+            tree.unwatch()
+            raise
+        return tree
+
+    def _rebuild(self) -> None:
+        """Build a new tree off the request path and swap it in."""
+        self._scanned = time.monotonic()
+        try:
+            tree = self._build()
+        except (FileIndexError, OSError):
+            with self._lock:
+                self.broken = True
+                self._rebuilding = False
+                self._tree.unwatch()
+            return
+        with self._lock:
+            if self._closed:
+                self._rebuilding = False
+                tree.unwatch()
+                return
+            old, self._tree = self._tree, tree
+            # Changes seen while walking may have missed the new tree
+            if not tree.apply(self._replay):
+                self._stale = True
+            self._replay = []
+            self._paths = {}
+            self._rebuilding = False
+            self.watch = tree.watched
+        old.unwatch(keep=set(tree.wds.values()))
+
+    def _refresh(self) -> None:
+        """Apply queued changes; schedule a rebuild if they cannot be applied."""
+        tree = self._tree
+        if self.pending:
+            events = []
+            while self.pending:
+                events.append(self.pending.popleft())
+            if self._rebuilding:
+                self._replay += events
+            try:
+                if not tree.apply(events):
+                    self._stale = True
+            except FileIndexError:
+                self._stale = True
+        elif not tree.watched and time.monotonic() - self._scanned >= RESCAN_INTERVAL:
+            self._stale = True
+        if self._stale and not self._rebuilding:
+            self._stale = False
+            self._rebuilding = True
+            _submit(self._rebuild)
+
+    def lookup(self, filepath: str) -> Path | int | None:
+        """File to serve for a request path, or 403/404.
+
+        None when the index cannot tell and the caller must check the path
+        itself.
+        """
+        parts = [part for part in filepath.split("/") if part not in ("", ".")]
+        if ".." in parts:
+            return None
+        relative = "/".join(parts)
+        if self.watch and _inotify is not None:
+            _inotify.dispatch()
+        with self._lock:
+            if self.broken:
+                return None
+            self._refresh()
+            tree = self._tree
+            entry = tree.files.get(relative)
+            if entry is None and relative in tree.dirs:
+                # Try index.html in directory
+                entry = tree.files.get(f"{relative}/index.html")
+                if entry is None:
+                    return 403
+        if entry is None:
+            return None if tree.links else 404
+        path = self._paths.get(entry.path)
+        if path is None:
+            if len(self._paths) > len(tree.files):
+                self._paths.clear()  # Mostly deleted files
+            path = self._paths[entry.path] = Path(entry.path)
+        return path
+
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _submit(fn, *args) -> None:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BUILD_WORKERS, thread_name_prefix="drop-index")
+    _executor.submit(fn, *args)
+
+
+# {source directory: (index or None if not built (yet), when it was tried)}, LRU order
+_indexes: OrderedDict[str, tuple[FileIndex | None, float]] = OrderedDict()
+_loading: set[str] = set()
+_indexes_lock = threading.Lock()
+
+
+def _after_fork() -> None:
+    # The inotify fd is shared with the parent: removing watches through it, or
+    # reading from it, would take them from the parent. Start from scratch.
+    global _inotify, _inotify_tried, _inotify_lock, _executor, _indexes_lock
+    if _inotify is not None:
+        os.close(_inotify.fd)
+    _inotify = None
+    _inotify_tried = False
+    _inotify_lock = threading.Lock()
+    _executor = None
+    _indexes.clear()
+    _loading.clear()
+    _indexes_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def get(source: str) -> FileIndex | None:
+    """Index of a directory page. None while it is being built in the background,
+    or if it cannot be indexed."""
+    now = time.monotonic()
+    with _indexes_lock:
+        cached = _indexes.get(source)
+        if cached is not None:
+            _indexes.move_to_end(source)
+            index, tried = cached
+            if index is not None and not index.broken:
+                return index
+            if source in _loading or now - tried < RETRY_INTERVAL:
+                return None
+        _loading.add(source)
+        _indexes[source] = (None, now)
+        _indexes.move_to_end(source)
+        _evict()
+    _submit(_load, source)
+    return None
+
+
+def _load(source: str) -> None:
+    try:
+        index = FileIndex(Path(source))
+    except FileIndexError:
+        index = None
+    with _indexes_lock:
+        _loading.discard(source)
+        if source not in _indexes:
+            # Evicted or unpublished meanwhile
+            if index is not None:
+                index.close()
+            return
+        previous = _indexes[source][0]
+        if previous is not None:
+            previous.close()
+        _indexes[source] = (index, time.monotonic())
+
+
+def _evict() -> None:
+    while len(_indexes) > INDEX_CACHE_SIZE:
+        # Least recently used page: its watches go with it
+        index, _tried = _indexes.popitem(last=False)[1]
+        if index is not None:
+            index.close()
+
+
+def retain(sources: set[str]) -> None:
+    """Close the indexes of directories no page publishes any more."""
+    with _indexes_lock:
+        for source in [source for source in _indexes if source not in sources]:
+            index, _tried = _indexes.pop(source)
+            if index is not None:
+                index.close()
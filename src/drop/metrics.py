@@ -0,0 +1,227 @@
+"""Prometheus metrics for drop.
+
+Each thread counts into its own dict, which no other thread writes, so
+recording takes no lock; a scrape adds the dicts up. With several worker
+processes each worker also dumps its totals to metrics/<pid>.json every few
+seconds and the scraped worker sums the files of all live workers.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+from .storage import DROP_DIR, atomic_write_text
+
+
+METRICS_DIR = DROP_DIR / "metrics"
+DUMP_INTERVAL = 5.0  # seconds between per-worker dumps (multi-worker staleness)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# {name: (type, help)}; histograms hold [count per bucket..., +Inf count, sum]
+METRICS = {
+    "drop_requests_total": ("counter", "HTTP requests by route, page and status."),
+    "drop_request_duration_seconds": ("histogram", "Time to produce the response, by route."),
+    "drop_response_bytes_total": ("counter", "Response body bytes (Content-Length), by route and page."),
+    "drop_auth_failures_total": ("counter", "Wrong passwords, by page."),
+    "drop_rate_limited_total": ("counter", "Login attempts rejected by the rate limiter, by page."),
+    "drop_cache_requests_total": ("counter", "Cache lookups by cache and result."),
+    "drop_cache_evictions_total": ("counter", "Entries evicted to stay within budget, by cache."),
+}
+
+SHARED = False  # several worker processes: aggregate through METRICS_DIR
+
+_local = threading.local()
+_shards: list[tuple[threading.Thread, dict]] = []  # per-thread counters
+_retired: dict = {}  # totals of threads that have exited
+_shards_lock = threading.Lock()
+_compact_at = 64
+
+
+def _after_fork() -> None:
+    # A new worker starts from zero; the parent's totals are not its own
+    global _shards_lock
+    _shards.clear()
+    _retired.clear()
+    _local.__dict__.clear()
+    _shards_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _merge(into: dict, shard: dict) -> None:
+    for key, value in shard.items():
+        if isinstance(value, list):
+            total = into.get(key)
+            if total is None:
+                into[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    total[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _shard() -> dict:
+    global _compact_at
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+            if len(_shards) >= _compact_at:
+                # Thread-per-request servers: fold finished threads away
+                for entry in [entry for entry in _shards if not entry[0].is_alive()]:
+                    _merge(_retired, entry[1])
+                    _shards.remove(entry)
+                _compact_at = max(64, 2 * len(_shards))
+    return shard
+
+
+def inc(name: str, labels: tuple = (), value: float = 1) -> None:
+    """Add value to counter name{labels}; labels is a tuple of (key, value) pairs."""
+    shard = _shard()
+    key = (name, labels)
+    shard[key] = shard.get(key, 0) + value
+
+
+def observe(name: str, labels: tuple, seconds: float) -> None:
+    """Record one sample in histogram name{labels}."""
+    shard = _shard()
+    key = (name, labels)
+    hist = shard.get(key)
+    if hist is None:
+        hist = shard[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+    hist[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    hist[-1] += seconds
+
+
+def totals() -> dict:
+    """Sum of all threads of this process."""
+    with _shards_lock:
+        result: dict = {}
+        _merge(result, _retired)
+        for _, shard in _shards:
+            _merge(result, shard.copy())
+    return result
+
+
+def _dump_path(pid: int):
+    return METRICS_DIR / f"{pid}.json"
+
+
+def dump() -> None:
+    """Write this worker's totals for other workers to aggregate."""
+    rows = [[name, [list(label) for label in labels], value] for (name, labels), value in totals().items()]
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(_dump_path(os.getpid()), json.dumps(rows))
+
+
+def _dump_loop() -> None:
+    while True:
+        time.sleep(DUMP_INTERVAL)
+        try:
+            dump()
+        except OSError:
+            pass
+
+
+def start_worker() -> None:
+    """Start periodic dumps in a worker process (multi-worker mode only)."""
+    if SHARED:
+        threading.Thread(target=_dump_loop, name="drop-metrics", daemon=True).start()
+
+
+def clear_dumps() -> None:
+    """Forget dumps left by a previous server run."""
+    if METRICS_DIR.is_dir():
+        for path in METRICS_DIR.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+def collect() -> dict:
+    """Totals of this process plus, in multi-worker mode, all live workers."""
+    result = totals()
+    if not SHARED:
+        return result
+    me = os.getpid()
+    for path in METRICS_DIR.glob("*.json"):
+        try:
+            pid = int(path.stem)
+            if pid == me:
+                continue
+            os.kill(pid, 0)
+        except ValueError:
+            continue
+        except OSError:
+            path.unlink(missing_ok=True)  # Worker is gone
+            continue
+        try:
+            rows = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        _merge(result, {(name, tuple(tuple(label) for label in labels)): value for name, labels, value in rows})
+    return result
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple, le: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if le:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(values: dict | None = None) -> str:
+    """Prometheus text exposition of collect()."""
+    values = collect() if values is None else values
+    by_name: dict[str, list] = {}
+    for (name, labels), value in values.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name.get(name, [])):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, str(bound))} {cumulative}")
+            cumulative += value[-2]
+            lines.append(f"{name}_bucket{_labels(labels, '+Inf')} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {value[-1]}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    # Hit ratios derived from the cache counters
+    lookups: dict[str, list[float]] = {}
+    for labels, value in by_name.get("drop_cache_requests_total", []):
+        fields = dict(labels)
+        counts = lookups.setdefault(fields.get("cache", ""), [0, 0])
+        counts[fields.get("result") == "hit"] += value
+    lines.append("# HELP drop_cache_hit_ratio Share of cache lookups that hit, by cache.")
+    lines.append("# TYPE drop_cache_hit_ratio gauge")
+    for cache, (misses, hits) in sorted(lookups.items()):
+        lines.append(f'drop_cache_hit_ratio{{cache="{cache}"}} {hits / (hits + misses):.6f}')
+    return "\n".join(lines) + "\n"
+
+
+def wsgi_app(environ, start_response):
+    """Standalone WSGI app serving only /metrics (for a separate port or socket)."""
+    if environ.get("PATH_INFO") != "/metrics":
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Not found"]
+    body = render().encode()
+    start_response("200 OK", [
+        ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+        ("Content-Length", str(len(body))),
+    ])
+    return [body]
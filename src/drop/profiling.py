@@ -0,0 +1,161 @@
+"""Per-request phase timing and sampled profiling for the drop server.
+
+Settings live in profiling.json (written by `drop profile`) and are
+re-read while the server runs. Everything is off by default, and disabled
+phases cost one thread-local lookup.
+"""
+
+import cProfile
+import json
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from .storage import DROP_DIR, atomic_write_text
+from .utils import file_fingerprint
+
+
+CONFIG_FILE = DROP_DIR / "profiling.json"
+PROFILES_DIR = DROP_DIR / "profiles"
+SLOW_LOG = DROP_DIR / "slow.log"
+CONFIG_CHECK_INTERVAL = 1.0  # seconds between checks for a changed config file
+MAX_PROFILES = 200  # oldest .prof files are deleted beyond this
+
+DEFAULTS = {
+    "server_timing": False,  # add a Server-Timing header to every response
+    "slow_ms": 0,  # log requests slower than this to slow.log (0 = off)
+    "profile_rate": 0.0,  # fraction of requests profiled into profiles/
+}
+
+_config = dict(DEFAULTS)
+_config_fingerprint: object = None
+_config_checked = 0.0
+_local = threading.local()
+_NULL = nullcontext()
+
+
+def load_config() -> dict:
+    """Settings from profiling.json merged over DEFAULTS."""
+    try:
+        stored = json.loads(CONFIG_FILE.read_text())
+    except Exception:
+        stored = {}
+    return {key: stored.get(key, value) for key, value in DEFAULTS.items()}
+
+
+def save_config(config: dict) -> None:
+    atomic_write_text(CONFIG_FILE, json.dumps(config, indent=2))
+
+
+def _current_config() -> dict:
+    global _config, _config_fingerprint, _config_checked
+    now = time.monotonic()
+    if now - _config_checked >= CONFIG_CHECK_INTERVAL:
+        _config_checked = now
+        fingerprint = file_fingerprint(CONFIG_FILE)
+        if fingerprint != _config_fingerprint:
+            _config_fingerprint = fingerprint
+            _config = load_config()
+    return _config
+
+
+class _Phase:
+    __slots__ = ("name", "phases", "start")
+
+    def __init__(self, name: str, phases: list) -> None:
+        self.name = name
+        self.phases = phases
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.phases.append((self.name, time.perf_counter() - self.start))
+
+
+def phase(name: str):
+    """Context manager timing one phase of the current request (no-op when off)."""
+    phases = getattr(_local, "phases", None)
+    if phases is None:
+        return _NULL
+    return _Phase(name, phases)
+
+
+def begin() -> None:
+    """Start tracking the current request if any feature is on."""
+    config = _current_config()
+    profile = config["profile_rate"] > 0 and random.random() < config["profile_rate"]
+    if not (config["server_timing"] or config["slow_ms"] > 0 or profile):
+        return
+    _local.phases = []
+    _local.started = time.perf_counter()
+    _local.profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _local.profiler = profiler
+        except ValueError:
+            pass  # Python 3.12+: another thread's profile is running
+
+
+def end(method: str, path: str, status: int) -> str | None:
+    """Finish the current request. Returns a Server-Timing value if enabled."""
+    phases = getattr(_local, "phases", None)
+    if phases is None:
+        return None
+    total = time.perf_counter() - _local.started
+    profiler = _local.profiler
+    reset()  # also stops the profiler
+    config = _config
+    total_ms = total * 1000
+
+    if profiler is not None:
+        _save_profile(profiler, path, total_ms)
+
+    if config["slow_ms"] > 0 and total_ms >= config["slow_ms"]:
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "method": method,
+            "path": path,
+            "status": status,
+            "ms": round(total_ms, 3),
+            "phases": {name: round(seconds * 1000, 3) for name, seconds in phases},
+        }
+        try:
+            # O_APPEND: whole lines from concurrent workers do not interleave
+            with open(SLOW_LOG, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass
+
+    if not config["server_timing"]:
+        return None
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in phases]
+    parts.append(f"total;dur={total_ms:.3f}")
+    return ", ".join(parts)
+
+
+def reset() -> None:
+    """Drop tracking state of the current thread (end of request)."""
+    profiler = getattr(_local, "profiler", None)
+    if profiler is not None:
+        profiler.disable()
+    _local.phases = None
+    _local.profiler = None
+
+
+def _save_profile(profiler: cProfile.Profile, path: str, total_ms: float) -> None:
+    """Write a pstats file; open with `python -m pstats FILE` or snakeviz."""
+    slug = "".join(c if c.isalnum() else "_" for c in path.strip("/"))[:60] or "root"
+    name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{slug}-{total_ms:.0f}ms.prof"
+    try:
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(PROFILES_DIR / name)
+        profiles = sorted(PROFILES_DIR.glob("*.prof"))
+        for old in profiles[:-MAX_PROFILES]:
+            old.unlink(missing_ok=True)
+    except OSError:
+        pass
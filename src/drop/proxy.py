@@ -0,0 +1,311 @@
+"""Reverse proxy from the drop server to registered apps.
+
+`/a/<name>/...` is forwarded to the app's port on 127.0.0.1 with the
+prefix stripped (and sent as X-Forwarded-Prefix). Upstream connections are
+kept alive and reused; request and response bodies stream through in
+chunks. WebSocket upgrades take over the client socket, so they need an
+engine that exposes it (threaded, the default).
+"""
+
+import http.client
+import os
+import selectors
+import socket
+import threading
+import time
+from collections.abc import Iterator
+from urllib.parse import quote
+
+from flask import Request, Response
+from werkzeug.datastructures import Headers
+
+
+UPSTREAM_HOST = "127.0.0.1"
+UPSTREAM_TIMEOUT = 60.0  # seconds without upstream progress before giving up
+POOL_MAX_IDLE = 16  # idle keep-alive connections kept per app port
+POOL_IDLE_TIMEOUT = 4.0  # seconds; below common app keep-alive timeouts (Node: 5 s)
+CHUNK = 64 * 1024
+TUNNEL_IDLE_TIMEOUT = 3600.0  # seconds a silent WebSocket stays open
+MAX_TUNNELS = 8  # open WebSockets per process; each holds a request thread (server sets half the pool)
+
+# Per-connection headers, never forwarded (RFC 9110 7.6.1)
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade",
+}
+
+
+class UpstreamPool:
+    """Idle keep-alive connections to local app ports."""
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, idle_timeout: float = POOL_IDLE_TIMEOUT) -> None:
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle: dict[int, list[tuple[http.client.HTTPConnection, float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, port: int) -> tuple[http.client.HTTPConnection, bool]:
+        """A connection to port: (connection, True if reused)."""
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(port, [])
+            while idle:
+                conn, released = idle.pop()
+                if now - released < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        return http.client.HTTPConnection(UPSTREAM_HOST, port, timeout=UPSTREAM_TIMEOUT), False
+
+    def put(self, port: int, conn: http.client.HTTPConnection) -> None:
+        """Return a connection whose response was read completely."""
+        with self._lock:
+            idle = self._idle.setdefault(port, [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+
+_pool = UpstreamPool()
+_tunnels = 0  # WebSockets being relayed
+_tunnels_lock = threading.Lock()
+
+
+def _after_fork() -> None:
+    # Connections and locks belong to the parent
+    global _pool, _tunnels, _tunnels_lock
+    _pool = UpstreamPool()
+    _tunnels = 0
+    _tunnels_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _forward_headers(request: Request, prefix: str) -> list[tuple[str, str]]:
+    """Client headers for the app: hop-by-hop and drop's auth cookie removed."""
+    headers = []
+    for name, value in request.headers.items():
+        lowered = name.lower()
+        if lowered in HOP_BY_HOP or lowered == "content-length":
+            continue
+        if lowered == "cookie":
+            # The app never sees drop's own auth cookies
+            value = "; ".join(
+                part for part in value.split("; ") if not part.lstrip().startswith("drop_auth_")
+            )
+            if not value:
+                continue
+        headers.append((name, value))
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    client = request.remote_addr or ""
+    headers.append(("X-Forwarded-For", f"{forwarded_for}, {client}" if forwarded_for else client))
+    headers.append(("X-Forwarded-Proto", request.scheme))
+    headers.append(("X-Forwarded-Host", request.host))
+    headers.append(("X-Forwarded-Prefix", prefix))
+    return headers
+
+
+def _response_headers(upstream: http.client.HTTPResponse, port: int, prefix: str) -> Headers:
+    headers = Headers()
+    for name, value in upstream.getheaders():
+        lowered = name.lower()
+        if lowered in HOP_BY_HOP:
+            continue
+        if lowered == "location":
+            # Keep redirects inside the app's prefix
+            for origin in (f"http://{UPSTREAM_HOST}:{port}", f"http://localhost:{port}"):
+                if value.startswith(origin):
+                    value = value[len(origin):] or "/"
+            if value.startswith("/") and not value.startswith("//"):
+                value = prefix + value
+        headers.add(name, value)
+    return headers
+
+
+def _request_body(request: Request) -> Iterator[bytes] | None:
+    if request.content_length:
+        stream, remaining = request.stream, request.content_length
+
+        def fixed() -> Iterator[bytes]:
+            nonlocal remaining
+            while remaining > 0:
+                chunk = stream.read(min(CHUNK, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+        return fixed()
+    if "chunked" in request.headers.get("Transfer-Encoding", "").lower():
+        return iter(lambda: request.stream.read(CHUNK), b"")
+    return None
+
+
+class _UpstreamBody:
+    """Response body streamed from the app; the connection goes back to the pool when done."""
+
+    def __init__(self, port: int, conn: http.client.HTTPConnection, upstream: http.client.HTTPResponse) -> None:
+        self.port = port
+        self.conn = conn
+        self.upstream = upstream
+
+    def __iter__(self) -> Iterator[bytes]:
+        while chunk := self.upstream.read1(CHUNK):
+            yield chunk
+        self.upstream.read()  # Marks the response complete so the connection is reusable
+
+    def close(self) -> None:
+        if self.upstream.isclosed() and not self.upstream.will_close:
+            _pool.put(self.port, self.conn)
+        else:
+            self.conn.close()  # Client went away mid-body, or upstream closes
+
+
+def upstream_target(request: Request, prefix: str, path: str) -> str:
+    """Path and query for the app: the client's raw URI minus prefix, so escapes survive."""
+    raw = request.environ.get("RAW_URI") or request.environ.get("REQUEST_URI") or ""
+    if raw.startswith(prefix + "/"):
+        return raw[len(prefix):]
+    target = "/" + quote(path)
+    if request.query_string:
+        target += "?" + request.query_string.decode("latin-1")
+    return target
+
+
+def forward(request: Request, port: int, target: str, prefix: str) -> Response:
+    """Proxy the current request to 127.0.0.1:port + target. 502 if the app is down."""
+    headers = _forward_headers(request, prefix)
+    body = _request_body(request)
+    chunked = body is not None and not request.content_length
+    if request.content_length:
+        headers.append(("Content-Length", str(request.content_length)))
+    elif chunked:
+        headers.append(("Transfer-Encoding", "chunked"))
+
+    for attempt in range(2):
+        conn, reused = _pool.get(port)
+        try:
+            conn.putrequest(request.method, target, skip_host=True, skip_accept_encoding=True)
+            for name, value in headers:
+                conn.putheader(name, value)
+            conn.endheaders()
+            if body is not None:
+                for chunk in body:
+                    conn.send(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+                if chunked:
+                    conn.send(b"0\r\n\r\n")
+            upstream = conn.getresponse()
+            break
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            # A pooled connection the app already closed: retry once on a fresh
+            # one, unless part of a streamed body is gone
+            if reused and attempt == 0 and body is None:
+                continue
+            return _bad_gateway("App closed the connection")
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            return _bad_gateway(f"App not reachable on port {port}" if isinstance(e, ConnectionRefusedError)
+                                else f"App error: {e}")
+
+    response = Response(_UpstreamBody(port, conn, upstream), f"{upstream.status} {upstream.reason}",
+                        direct_passthrough=True)
+    response.headers = _response_headers(upstream, port, prefix)
+    return response
+
+
+def _bad_gateway(message: str) -> Response:
+    return Response(message, 502, mimetype="text/plain")
+
+
+# WebSocket: relay raw bytes between client and app after the handshake
+
+def is_upgrade(request: Request) -> bool:
+    return (
+        "upgrade" in request.headers.get("Connection", "").lower()
+        and request.headers.get("Upgrade", "").lower() == "websocket"
+    )
+
+
+class _Hijacked(Response):
+    """Placeholder returned after a tunnel: the socket was taken over."""
+
+    def __call__(self, environ, start_response):
+        # werkzeug treats this as a dropped connection and writes nothing
+        raise ConnectionAbortedError("connection upgraded")
+
+
+def tunnel(request: Request, port: int, target: str, prefix: str) -> Response:
+    """Hand a WebSocket upgrade to the app and relay bytes until either side closes.
+
+    A tunnel occupies its request thread for its whole life, so at most
+    MAX_TUNNELS are open at once (503 above that) and static pages keep
+    threads to be served from.
+    """
+    global _tunnels
+    client = request.environ.get("drop.socket")
+    if client is None:
+        return Response("WebSocket proxying needs the threaded engine", 501, mimetype="text/plain")
+    with _tunnels_lock:
+        if _tunnels >= MAX_TUNNELS:
+            response = Response("Too many WebSocket connections", 503, mimetype="text/plain")
+            response.headers["Retry-After"] = "5"
+            return response
+        _tunnels += 1
+    try:
+        return _tunnel(request, client, port, target, prefix)
+    finally:
+        with _tunnels_lock:
+            _tunnels -= 1
+
+
+def _tunnel(request: Request, client: socket.socket, port: int, target: str, prefix: str) -> Response:
+    headers = _forward_headers(request, prefix) + [("Connection", "Upgrade"), ("Upgrade", request.headers["Upgrade"])]
+    head = f"{request.method} {target} HTTP/1.1\r\nHost: {request.host}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+
+    try:
+        upstream = socket.create_connection((UPSTREAM_HOST, port), timeout=UPSTREAM_TIMEOUT)
+    except OSError:
+        return _bad_gateway(f"App not reachable on port {port}")
+    hijacked = _Hijacked(status=101)
+    try:
+        upstream.sendall(head.encode("latin-1"))
+        # Past the app's handshake answer both sides speak frames
+        reply = b""
+        while b"\r\n\r\n" not in reply:
+            data = upstream.recv(CHUNK)
+            if not data:
+                return _bad_gateway("App closed the connection")
+            reply += data
+            if len(reply) > CHUNK:
+                return _bad_gateway("App sent an oversized handshake")
+        # Relayed as-is; a refused upgrade ends after the app's first answer
+        client.sendall(reply)
+        if reply.startswith((b"HTTP/1.1 101", b"HTTP/1.0 101")):
+            _relay(client, upstream)
+    except OSError:
+        pass
+    finally:
+        upstream.close()
+    return hijacked
+
+
+def _relay(client: socket.socket, upstream: socket.socket) -> None:
+    """Copy bytes both ways until a side closes."""
+    client.settimeout(None)
+    upstream.settimeout(None)
+    peers = {client: upstream, upstream: client}
+    with selectors.DefaultSelector() as selector:
+        for sock in peers:
+            selector.register(sock, selectors.EVENT_READ)
+        while True:
+            ready = selector.select(TUNNEL_IDLE_TIMEOUT)
+            if not ready:
+                return
+            for key, _ in ready:
+                data = key.fileobj.recv(CHUNK)
+                if not data:
+                    return
+                peers[key.fileobj].sendall(data)
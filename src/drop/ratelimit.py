@@ -0,0 +1,143 @@
+"""Login rate limiting for drop.
+
+Token buckets per (IP, page): `limit` failed attempts are allowed per
+`window` seconds, refilled continuously. Checks are O(1), memory is
+bounded, and the SQLite backend shares limits between server processes.
+"""
+
+import itertools
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+MAX_KEYS = 100_000  # tracked (IP, page) pairs before the least recent are dropped
+SWEEP_EVERY = 1000  # operations between evictions of idle keys
+
+
+class MemoryRateLimiter:
+    """In-process limiter: LRU of token buckets, idle buckets evicted."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = MAX_KEYS) -> None:
+        self.limit = limit
+        self.rate = limit / window  # tokens per second
+        self.window = window
+        self.max_keys = max_keys
+        # {(ip, page_id): (tokens, updated_at)}, least recently updated first
+        self._buckets: OrderedDict[tuple[str, str], tuple[float, float]] = OrderedDict()
+        self._ops = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: tuple[str, str], now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.limit)
+        tokens, updated_at = bucket
+        return min(self.limit, tokens + (now - updated_at) * self.rate)
+
+    def allow(self, ip: str, page_id: str) -> bool:
+        """Check if IP may try a password for page. Returns True if allowed."""
+        with self._lock:
+            return self._tokens((ip, page_id), time.monotonic()) >= 1
+
+    def record_failure(self, ip: str, page_id: str) -> None:
+        """Spend one token for a failed attempt."""
+        key = (ip, page_id)
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[key] = (max(self._tokens(key, now) - 1, 0.0), now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if next(self._ops) % SWEEP_EVERY == 0:
+                self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        # Oldest first: stop at the first bucket that has not refilled yet
+        while self._buckets:
+            key, (tokens, updated_at) = next(iter(self._buckets.items()))
+            if tokens + (now - updated_at) * self.rate < self.limit:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SqliteRateLimiter:
+    """Limiter backed by a local SQLite file, shared by all worker processes."""
+
+    def __init__(self, path: Path, limit: int, window: float, max_keys: int = MAX_KEYS) -> None:
+        self.path = path
+        self.limit = limit
+        self.rate = limit / window
+        self.window = window
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._ops = itertools.count(1)  # next() is atomic: no lock needed across threads
+        # Schema via a throwaway connection: this may run before workers fork,
+        # and SQLite connections must not cross a fork
+        db = self._open()
+        try:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS buckets_updated ON buckets(updated)")
+        finally:
+            db.close()
+
+    def _open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._open()
+        return db
+
+    def _tokens(self, db: sqlite3.Connection, key: str, now: float) -> float:
+        row = db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return float(self.limit)
+        return min(self.limit, row[0] + (now - row[1]) * self.rate)
+
+    def allow(self, ip: str, page_id: str) -> bool:
+        """Check if IP may try a password for page. Returns True if allowed."""
+        return self._tokens(self._connect(), f"{ip} {page_id}", time.time()) >= 1
+
+    def record_failure(self, ip: str, page_id: str) -> None:
+        """Spend one token for a failed attempt."""
+        key = f"{ip} {page_id}"
+        now = time.time()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            tokens = max(self._tokens(db, key, now) - 1, 0.0)
+            db.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            if next(self._ops) % SWEEP_EVERY == 0:
+                self._sweep(db, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _sweep(self, db: sqlite3.Connection, now: float) -> None:
+        # A bucket idle for a full window has refilled and carries no state
+        db.execute("DELETE FROM buckets WHERE updated <= ?", (now - self.window,))
+        db.execute(
+            "DELETE FROM buckets WHERE key IN ("
+            " SELECT key FROM buckets ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        )
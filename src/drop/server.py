@@ -1,44 +1,91 @@
 """Flask server for drop."""
 
+import atexit
+import bisect
+import hashlib
+import html
+import json
 import mimetypes
+import os
+import re
+import signal
+import socket
+import stat
+import sys
+import threading
 import time
-from collections import defaultdict
 from pathlib import Path
 
-from flask import Flask, request, make_response, send_file, Response
-
-from .storage import get_page, load_pages
-from .utils import verify_password, safe_path, load_manifest
+from flask import Flask, request, make_response, Response
+from werkzeug.serving import BaseWSGIServer
+
+from . import access, archives, fileindex, metrics, profiling, proxy, snapshots, static
+from .engine import RequestHandler, listen_socket, serve_asyncio, serve_prefork
+from .ratelimit import MemoryRateLimiter, SqliteRateLimiter
+from .storage import DROP_DIR, PageInfo, RegistrySnapshot, registry_snapshot
+from .utils import (
+    MANIFEST_FILE,
+    PathCache,
+    file_fingerprint,
+    get_manifest_matcher,
+    open_beneath,
+    safe_path,
+    supports_open_beneath,
+    verify_password,
+)
 
 
 app = Flask(__name__)
 
-# Rate limiting: {ip: {page_id: [(timestamp, ...)]}}
-_attempts: dict[str, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+# Rate limiting: token bucket per (ip, page_id); shared via SQLite with workers
 RATE_LIMIT = 3  # attempts
 RATE_WINDOW = 60  # seconds
+RATE_LIMIT_DB = DROP_DIR / "ratelimit.db"
+_limiter: MemoryRateLimiter | SqliteRateLimiter = MemoryRateLimiter(RATE_LIMIT, RATE_WINDOW)
 COOKIE_TTL = 15 * 60  # 15 minutes
 
+# Path resolution cache: {page_id: PathCache of filepath -> target or status}
+PATH_CACHE_SIZE = 256  # resolutions per page
+PATH_CACHE_TTL = 2.0  # seconds a change the stamps miss may go unnoticed
+_path_caches: dict[str, PathCache] = {}
+_path_caches_snapshot: RegistrySnapshot | None = None
 
-def _check_rate_limit(ip: str, page_id: str) -> bool:
-    """Check if IP is rate limited. Returns True if allowed."""
-    now = time.time()
-    attempts = _attempts[ip][page_id]
+# Allowed-file indexes of directory pages, pruned when the registry changes
+_indexes_snapshot: RegistrySnapshot | None = None
+
+# Strict mode: validate and open in one O_NOFOLLOW walk, no symlinks at all
+STRICT_PATHS = False
+
+# /metrics on the main app, unless served on a separate port or Unix socket
+METRICS_ROUTE = True
+_last_snapshot: RegistrySnapshot | None = None
 
-    # Clean old attempts
-    _attempts[ip][page_id] = [t for t in attempts if now - t < RATE_WINDOW]
+# Index and /api/pages: paginated by cursor (last page ID seen), rendered
+# pages cached until the registry snapshot changes
+LISTING_LIMIT = 100  # default entries per page
+LISTING_MAX_LIMIT = 1000
+LISTING_CACHE_SIZE = 256  # rendered (kind, cursor, limit) pages per snapshot
+LISTING_FIELDS = ("name", "description", "type", "is_dir", "created_at")  # never source/password_hash
+LISTING_CURSOR = re.compile(r"[A-Za-z0-9_-]{1,128}")  # page ID syntax
+# (snapshot, page IDs sorted, {key: (body, etag, next cursor)})
+_listing: tuple[RegistrySnapshot, list[str], dict] | None = None
 
-    return len(_attempts[ip][page_id]) < RATE_LIMIT
+
+def _check_rate_limit(ip: str, page_id: str) -> bool:
+    """Check if IP is rate limited. Returns True if allowed."""
+    return _limiter.allow(ip, page_id)
 
 
 def _record_attempt(ip: str, page_id: str) -> None:
     """Record a failed attempt."""
-    _attempts[ip][page_id].append(time.time())
+    _limiter.record_failure(ip, page_id)
 
 
-def _login_form(error: str = "") -> str:
-    """Generate login form HTML."""
+def _login_form(error: str = "", action: str = "", next_url: str = "") -> str:
+    """Generate login form HTML (posting to action, the current URL by default)."""
     error_html = f'<p style="color:red">{error}</p>' if error else ""
+    action_attr = f' action="{html.escape(action)}"' if action else ""
+    next_html = f'<input type="hidden" name="next" value="{html.escape(next_url)}">' if next_url else ""
     return f"""<!DOCTYPE html>
 <html>
 <head>
@@ -54,8 +101,9 @@ def _login_form(error: str = "") -> str:
     </style>
 </head>
 <body>
-    <form method="POST">
+    <form method="POST"{action_attr}>
         {error_html}
+        {next_html}
         <input type="password" name="password" placeholder="Password" autofocus>
         <button type="submit">View</button>
     </form>
@@ -63,23 +111,151 @@ def _login_form(error: str = "") -> str:
 </html>"""
 
 
+def _snapshot() -> RegistrySnapshot:
+    """registry_snapshot(), counting reuse (hit) vs reload (miss)."""
+    global _last_snapshot
+    snapshot = registry_snapshot()
+    hit = snapshot is _last_snapshot
+    if not hit:
+        _last_snapshot = snapshot
+    metrics.inc("drop_cache_requests_total", (("cache", "registry"), ("result", "hit" if hit else "miss")))
+    return snapshot
+
+
+def _path_cache(snapshot: RegistrySnapshot, page_id: str) -> PathCache:
+    """Per-page resolution cache, dropped wholesale when the registry changes."""
+    global _path_caches_snapshot
+    if _path_caches_snapshot is not snapshot:
+        _path_caches.clear()
+        _path_caches_snapshot = snapshot
+    cache = _path_caches.get(page_id)
+    if cache is None:
+        cache = _path_caches.setdefault(page_id, PathCache(PATH_CACHE_SIZE, PATH_CACHE_TTL))
+    return cache
+
+
+def _file_index(snapshot: RegistrySnapshot, page: PageInfo) -> fileindex.FileIndex | None:
+    """Index of a directory page (None: resolve each request instead)."""
+    global _indexes_snapshot
+    if _indexes_snapshot is not snapshot:
+        fileindex.retain({info["source"] for info in snapshot.pages.values() if info["is_dir"]})
+        _indexes_snapshot = snapshot
+    return fileindex.get(page["source"])
+
+
+def _warm_indexes() -> None:
+    """Start indexing every live directory page (server start; builds run in the background)."""
+    for page in registry_snapshot().pages.values():
+        if page["is_dir"] and page.get("type", "static") == "static" and not page.get("snapshot"):
+            fileindex.get(page["source"])
+
+
+def _resolve_target(page: PageInfo, filepath: str) -> Path | int:
+    """Resolve request to a file to serve, or an HTTP error status."""
+    source = Path(page["source"])
+    if page["is_dir"]:
+        # Compiled manifest for directory (cached until the file changes)
+        with profiling.phase("manifest"):
+            manifest = get_manifest_matcher(source)
+        with profiling.phase("safe_path"):
+            target = safe_path(source, filepath, manifest)
+    else:
+        # Single file: ignore filepath, no manifest needed
+        with profiling.phase("safe_path"):
+            target = safe_path(source.parent, source.name) if source.exists() else None
+
+    if not target or not target.exists():
+        return 404
+
+    if target.is_dir():
+        # Try index.html in directory
+        index = target / "index.html"
+        if index.exists():
+            return index
+        return 403
+    return target
+
+
+def _cached_target(cache: PathCache, page: PageInfo, filepath: str) -> Path | int:
+    """_resolve_target() through the page's resolution cache."""
+    # Stamp: a manifest edit, or the requested path being deleted, replaced
+    # or created, invalidates the entry at once instead of after the TTL
+    source = Path(page["source"])
+    if page["is_dir"]:
+        stamp = (file_fingerprint(source / MANIFEST_FILE), file_fingerprint(source / filepath))
+    else:
+        stamp = file_fingerprint(source)
+    target = cache.get(filepath, stamp)
+    if target is PathCache.MISS:
+        metrics.inc("drop_cache_requests_total", (("cache", "path"), ("result", "miss")))
+        target = _resolve_target(page, filepath)
+        cache.put(filepath, target, stamp)
+    else:
+        metrics.inc("drop_cache_requests_total", (("cache", "path"), ("result", "hit")))
+    return target
+
+
+def _open_target(page: PageInfo, filepath: str) -> tuple[int, str] | int:
+    """Strict-mode resolve: open the file in one walk. Returns (fd, name) or status."""
+    source = Path(page["source"])
+    if page["is_dir"]:
+        fd = open_beneath(source, filepath, get_manifest_matcher(source))
+        name = filepath.rsplit("/", 1)[-1]
+    else:
+        fd = open_beneath(source.parent, source.name)
+        name = source.name
+    if fd is None:
+        return 404
+
+    if stat.S_ISDIR(os.fstat(fd).st_mode):
+        # Try index.html in directory
+        try:
+            index_fd = os.open("index.html", os.O_RDONLY | os.O_NOFOLLOW, dir_fd=fd)
+        except OSError:
+            return 403
+        finally:
+            os.close(fd)
+        fd, name = index_fd, "index.html"
+
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        return 404
+    return fd, name
+
+
+def _check_auth(page_id: str, page: PageInfo, action: str = "", next_url: str = "") -> Response | None:
+    """Login form if page needs a password the client has not given, else None."""
+    if page["password_hash"]:
+        auth_cookie = request.cookies.get(f"drop_auth_{page_id}")
+        if auth_cookie != page["password_hash"]:
+            return make_response(_login_form(action=action, next_url=next_url), 200)
+    return None
+
+
+def _safe_next(next_url: str) -> str:
+    """Where to go after login: only proxied app paths on this server."""
+    if next_url.startswith("/a/") and "\\" not in next_url:
+        return next_url
+    return ""
+
+
 @app.route("/p/<page_id>/", defaults={"filepath": ""})
 @app.route("/p/<page_id>/<path:filepath>")
 def serve_page(page_id: str, filepath: str) -> Response:
     """Serve a published page."""
-    page = get_page(page_id)
-    if not page:
+    with profiling.phase("registry"):
+        snapshot = _snapshot()
+        full_id = snapshot.resolve(page_id)
+    if not full_id:
         return make_response("Not found", 404)
+    page = snapshot.pages[full_id]
+    request.environ["drop.page"] = full_id
 
-    # Check authentication
-    cookie_name = f"drop_auth_{page_id}"
-    if page["password_hash"]:
-        auth_cookie = request.cookies.get(cookie_name)
-        if auth_cookie != page["password_hash"]:
-            return make_response(_login_form(), 200)
+    login = _check_auth(page_id, page)
+    if login is not None:
+        return login
 
-    # Resolve file path
-    source = Path(page["source"])
+    access.record(full_id)
 
     # Strip name prefix from filepath if present
     page_name = page.get("name", "")
@@ -88,54 +264,152 @@ def serve_page(page_id: str, filepath: str) -> Response:
     elif page_name and filepath == page_name:
         filepath = ""
 
+    # Directory: serve requested file or index.html
+    if page["is_dir"] and not filepath:
+        filepath = "index.html"
+
+    if page.get("snapshot"):
+        return _serve_snapshot(page, filepath)
+    if page.get("type") == "archive":
+        return _serve_archive(page, filepath)
+
+    if STRICT_PATHS:
+        with profiling.phase("open"):
+            opened = _open_target(page, filepath)
+        if isinstance(opened, int):
+            return make_response("Forbidden" if opened == 403 else "Not found", opened)
+        fd, name = opened
+        with profiling.phase("mimetype"):
+            mimetype, _ = mimetypes.guess_type(name)
+        key = f"{page['source']}/{filepath}" if page["is_dir"] else page["source"]
+        with profiling.phase("response"):
+            return static.fd_response(fd, name, mimetype, key)
+
+    with profiling.phase("resolve"):
+        index = _file_index(snapshot, page) if page["is_dir"] else None
+
+        def resolve(path: str) -> Path | int:
+            # Index lookup; per-request checks for what it cannot answer
+            if index is None:
+                return _cached_target(_path_cache(snapshot, full_id), page, path)
+            target = index.lookup(path)
+            metrics.inc("drop_cache_requests_total", (("cache", "index"), ("result", "miss" if target is None else "hit")))
+            if target is None:
+                return _cached_target(_path_cache(snapshot, full_id), page, path)
+            return target
+
+        target = resolve(filepath)
+
+    if target == 403:
+        return make_response("Forbidden", 403)
+    if target == 404:
+        return make_response("Not found", 404)
+
+    find_sibling = None
     if page["is_dir"]:
-        # Directory: serve requested file or index.html
-        if not filepath:
-            filepath = "index.html"
-        # Load manifest for directory
-        manifest = load_manifest(source)
-        target = safe_path(source, filepath, manifest)
-    else:
-        # Single file: ignore filepath, no manifest needed
-        target = safe_path(source.parent, source.name) if source.exists() else None
+        # Precompressed foo.js.gz / foo.js.br must pass the same checks as foo.js
+        served = filepath
+        if target.name == "index.html" and not filepath.endswith("index.html"):
+            served = filepath.rstrip("/") + "/index.html"
+
+        def find_sibling(suffix: str) -> Path | None:
+            sibling = resolve(served + suffix)
+            return sibling if isinstance(sibling, Path) else None
+
+    # Hot small files: headers and body ready in memory
+    with profiling.phase("memory"):
+        response = static.memory_response(target)
+    if response is not None:
+        return response
 
-    if not target or not target.exists():
+    # Serve file
+    with profiling.phase("mimetype"):
+        mimetype, _ = mimetypes.guess_type(str(target))
+    try:
+        with profiling.phase("response"):
+            return static.file_response(target, mimetype, find_sibling)
+    except FileNotFoundError:
+        # Deleted since it was cached
         return make_response("Not found", 404)
 
-    if target.is_dir():
-        # Try index.html in directory
-        index = target / "index.html"
-        if index.exists():
-            target = index
+
+def _serve_snapshot(page: PageInfo, filepath: str) -> Response:
+    """Serve a file of a snapshot page from the object store."""
+    with profiling.phase("resolve"):
+        tree = snapshots.load_tree(page["snapshot"])
+        if tree is None:
+            return make_response("Not found", 404)
+        if page["is_dir"]:
+            found = snapshots.lookup(tree, filepath)
         else:
-            return make_response("Forbidden", 403)
+            # Single file: ignore filepath
+            found = next(iter(tree.items()), None)
+    if found is None:
+        return make_response("Not found", 404)
+    relative, (digest, _size, mtime) = found
+    name = relative.rsplit("/", 1)[-1]
+    with profiling.phase("mimetype"):
+        mimetype, _ = mimetypes.guess_type(name)
+    try:
+        with profiling.phase("response"):
+            return static.object_response(
+                snapshots.object_path(digest), digest, mtime, name, mimetype,
+                private=bool(page["password_hash"]),
+            )
+    except FileNotFoundError:
+        return make_response("Not found", 404)
 
-    # Serve file
-    mimetype, _ = mimetypes.guess_type(str(target))
-    return send_file(target, mimetype=mimetype)
+
+def _serve_archive(page: PageInfo, filepath: str) -> Response:
+    """Serve a member of an archive page."""
+    with profiling.phase("resolve"):
+        try:
+            index = archives.get_index(Path(page["source"]))
+        except (archives.ArchiveError, OSError):
+            return make_response("Not found", 404)
+        found = index.lookup(filepath)
+    if found is None:
+        return make_response("Not found", 404)
+    relative, member = found
+    name = relative.rsplit("/", 1)[-1]
+    with profiling.phase("mimetype"):
+        mimetype, _ = mimetypes.guess_type(name)
+    with profiling.phase("response"):
+        return static.member_response(index, member, index.etag(member), name, mimetype)
 
 
 @app.route("/p/<page_id>/", methods=["POST"], defaults={"filepath": ""})
 @app.route("/p/<page_id>/<path:filepath>", methods=["POST"])
 def auth_page(page_id: str, filepath: str) -> Response:
     """Handle password submission."""
-    page = get_page(page_id)
-    if not page:
+    with profiling.phase("registry"):
+        snapshot = _snapshot()
+        full_id = snapshot.resolve(page_id)
+    if not full_id:
         return make_response("Not found", 404)
+    page = snapshot.pages[full_id]
+    request.environ["drop.page"] = full_id
+    page_label = (("page", full_id[:8]),)
 
     ip = request.remote_addr or "unknown"
 
     # Check rate limit
-    if not _check_rate_limit(ip, page_id):
-        return make_response(_login_form("Too many attempts. Try again later."), 429)
+    with profiling.phase("ratelimit"):
+        allowed = _check_rate_limit(ip, page_id)
+    next_url = _safe_next(request.form.get("next", ""))
+    if not allowed:
+        metrics.inc("drop_rate_limited_total", page_label)
+        return make_response(_login_form("Too many attempts. Try again later.", next_url=next_url), 429)
 
     password = request.form.get("password", "")
 
-    if verify_password(password, page["password_hash"]):
+    with profiling.phase("verify"):
+        valid = verify_password(password, page["password_hash"])
+    if valid:
         # Success - set cookie and redirect
         response = make_response(_login_form())  # Will be replaced by redirect
         response.status_code = 303
-        response.headers["Location"] = request.path
+        response.headers["Location"] = next_url or request.path
         response.set_cookie(
             f"drop_auth_{page_id}",
             page["password_hash"],
@@ -146,23 +420,259 @@ def auth_page(page_id: str, filepath: str) -> Response:
         return response
     else:
         _record_attempt(ip, page_id)
-        return make_response(_login_form("Invalid password"), 401)
+        metrics.inc("drop_auth_failures_total", page_label)
+        return make_response(_login_form("Invalid password", next_url=next_url), 401)
+
+
+PROXY_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+
+@app.route("/a/<name>/", methods=PROXY_METHODS, defaults={"path": ""})
+@app.route("/a/<name>/<path:path>", methods=PROXY_METHODS)
+@app.route("/a/<name>/", websocket=True, defaults={"path": ""})  # werkzeug routes upgrades separately
+@app.route("/a/<name>/<path:path>", websocket=True)
+def proxy_app(name: str, path: str) -> Response:
+    """Forward to a registered app's port, behind the page password."""
+    with profiling.phase("registry"):
+        snapshot = _snapshot()
+        full_id = snapshot.resolve(name)
+    if not full_id or snapshot.pages[full_id].get("type") != "app":
+        return make_response("Not found", 404)
+    page = snapshot.pages[full_id]
+    request.environ["drop.page"] = full_id
+
+    # The form posts to /p/<name>/, which sets the cookie and comes back here
+    login = _check_auth(name, page, action=f"/p/{name}/", next_url=request.full_path.rstrip("?"))
+    if login is not None:
+        return login
+
+    access.record(full_id)
+    prefix = f"/a/{name}"
+    target = proxy.upstream_target(request, prefix, path)
+    with profiling.phase("upstream"):
+        if proxy.is_upgrade(request):
+            return proxy.tunnel(request, page["port"], target, prefix)
+        return proxy.forward(request, page["port"], target, prefix)
+
+
+def _listing_for(snapshot: RegistrySnapshot) -> tuple[RegistrySnapshot, list[str], dict]:
+    """Return listing state for snapshot, rebuilding it after registry changes."""
+    global _listing
+    listing = _listing
+    if listing is None or listing[0] is not snapshot:
+        listing = _listing = (snapshot, sorted(snapshot.pages), {})
+    return listing
+
+
+def _render_listing(kind: str, cursor: str, limit: int) -> tuple[bytes, str, str] | None:
+    """Render one page of the index ("html") or API ("json").
+
+    Returns (body, etag, next cursor or ""), None for a malformed cursor.
+    Pages are in ID order, so a cursor naming a page removed since still
+    resumes right after it.
+    """
+    if cursor and not LISTING_CURSOR.fullmatch(cursor):
+        return None
+    snapshot, ids, cache = _listing_for(_snapshot())
+    key = (kind, cursor, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.inc("drop_cache_requests_total", (("cache", "listing"), ("result", "hit")))
+        return cached
+    metrics.inc("drop_cache_requests_total", (("cache", "listing"), ("result", "miss")))
+    start = bisect.bisect_right(ids, cursor) if cursor else 0
+    chunk = ids[start:start + limit]
+    next_cursor = chunk[-1] if start + limit < len(ids) else ""
+
+    if kind == "json":
+        items = []
+        for page_id in chunk:
+            info = snapshot.pages[page_id]
+            item = {"id": page_id, **{field: info.get(field) for field in LISTING_FIELDS}}
+            item["protected"] = bool(info.get("password_hash"))
+            items.append(item)
+        body = json.dumps({"pages": items, "total": len(ids), "next_cursor": next_cursor or None})
+    elif not ids:
+        body = "No pages published"
+    else:
+        parts = ["<h1>Published Pages</h1><ul>"]
+        parts += [f'<li><a href="/p/{page_id}/">{html.escape(page_id)}</a></li>' for page_id in chunk]
+        parts.append("</ul>")
+        if next_cursor:
+            parts.append(f'<p><a href="/?cursor={next_cursor}&amp;limit={limit}">Next</a></p>')
+        body = "".join(parts)
+
+    data = body.encode()
+    result = (data, hashlib.sha1(data).hexdigest()[:20], next_cursor)
+    if len(cache) >= LISTING_CACHE_SIZE:
+        cache.clear()
+    cache[key] = result
+    return result
+
+
+def _listing_response(kind: str) -> Response:
+    """Serve a listing page with ETag revalidation."""
+    cursor = request.args.get("cursor", "")
+    try:
+        limit = min(max(int(request.args.get("limit", LISTING_LIMIT)), 1), LISTING_MAX_LIMIT)
+    except ValueError:
+        return make_response("Invalid limit", 400)
+    rendered = _render_listing(kind, cursor, limit)
+    if rendered is None:
+        return make_response("Invalid cursor", 400)
+    body, etag, next_cursor = rendered
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        mimetype = "application/json" if kind == "json" else "text/html"
+        response = Response(body, mimetype=mimetype)
+        if next_cursor:
+            response.headers["Link"] = f'<{request.path}?cursor={next_cursor}&limit={limit}>; rel="next"'
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/")
 def index() -> Response:
     """Index page."""
-    pages = load_pages()
-    if not pages:
-        return make_response("No pages published", 200)
+    return _listing_response("html")
 
-    html = "<h1>Published Pages</h1><ul>"
-    for page_id in pages:
-        html += f'<li><a href="/p/{page_id}/">{page_id}</a></li>'
-    html += "</ul>"
-    return make_response(html, 200)
 
+@app.route("/api/pages")
+def api_pages() -> Response:
+    """Page listing as JSON (no sources or password hashes)."""
+    return _listing_response("json")
 
-def run_server(port: int = 8080, host: str = "0.0.0.0") -> None:
-    """Run the Flask server."""
-    app.run(host=host, port=port, threaded=True)
+
+@app.route("/metrics")
+def metrics_page() -> Response:
+    """Prometheus metrics (404 when served on a separate listener)."""
+    if not METRICS_ROUTE:
+        return make_response("Not found", 404)
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.before_request
+def _start_timer() -> None:
+    request.environ["drop.started"] = time.perf_counter()
+    profiling.begin()
+
+
+@app.after_request
+def _record_request(response: Response) -> Response:
+    """Count request, status, bytes and latency."""
+    started = request.environ.get("drop.started")
+    route = (("route", request.endpoint or "unmatched"),)
+    page = request.environ.get("drop.page", "")[:8]
+    metrics.inc("drop_requests_total", route + (("page", page), ("status", str(response.status_code))))
+    if response.content_length and request.method != "HEAD":
+        metrics.inc("drop_response_bytes_total", route + (("page", page),), response.content_length)
+    if started is not None:
+        metrics.observe("drop_request_duration_seconds", route, time.perf_counter() - started)
+    server_timing = profiling.end(request.method, request.path, response.status_code)
+    if server_timing:
+        response.headers["Server-Timing"] = server_timing
+    return response
+
+
+@app.teardown_request
+def _end_profiling(exc: BaseException | None) -> None:
+    # Requests that skipped after_request must not leave a profiler running
+    profiling.reset()
+
+
+def _metrics_socket(listen: str) -> tuple[socket.socket, str]:
+    """Bind the metrics listener: "PORT", "HOST:PORT" or "unix:/path".
+
+    Returns the socket and the werkzeug host for it.
+    """
+    if listen.startswith("unix:"):
+        path = listen[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(socket.SOMAXCONN)
+        return sock, f"unix://{path}"
+    host, _, port = listen.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    return listen_socket(host, int(port), reuse_port=False), host
+
+
+def _serve_metrics(sock: socket.socket, host: str) -> None:
+    """Answer /metrics on a separate listener from a background thread."""
+    port = sock.getsockname()[1] if sock.family != socket.AF_UNIX else 0
+    server = BaseWSGIServer(host, port, metrics.wsgi_app, fd=sock.fileno())
+    threading.Thread(target=server.serve_forever, name="drop-metrics-http", daemon=True).start()
+
+
+def _flush() -> None:
+    """Persist write-behind state (ETag index, access counts)."""
+    static.flush()
+    access.flush()
+
+
+def run_server(
+    port: int = 8080,
+    host: str = "0.0.0.0",
+    strict_paths: bool = False,
+    etag: str = "stat",
+    sendfile: str = "direct",
+    workers: int = 1,
+    threads: int = 16,
+    engine: str = "threaded",
+    metrics_listen: str = "",
+    memory_cache_mb: int = 64,
+    memory_cache_max_kb: int = 256,
+) -> None:
+    """
+    Run the Flask server.
+    workers > 1 pre-forks that many processes with `threads` threads each.
+    engine="asyncio" serves connections from an event loop instead of a
+    thread per connection (for many slow or idle keep-alive clients).
+    metrics_listen ("PORT", "HOST:PORT" or "unix:/path") moves /metrics
+    off the main port.
+    memory_cache_mb / memory_cache_max_kb size the in-memory cache of small
+    files (per worker process; 0 MB turns it off).
+    """
+    global STRICT_PATHS, METRICS_ROUTE, _limiter
+    if strict_paths and not supports_open_beneath():
+        raise SystemExit("Error: --strict-paths is not supported on this platform")
+    STRICT_PATHS = strict_paths
+    static.ETAG_MODE = etag
+    static.SENDFILE_MODE = sendfile
+    static.configure_memory_cache(memory_cache_mb * 1024 * 1024, memory_cache_max_kb * 1024)
+    # WebSockets hold a request thread each: leave half the pool to everything else
+    proxy.MAX_TUNNELS = max(1, threads // 2)
+    if workers > 1:
+        # Limits must hold across processes, not per worker
+        _limiter = SqliteRateLimiter(RATE_LIMIT_DB, RATE_LIMIT, RATE_WINDOW)
+        # Each worker counts on its own; scrapes sum the workers' dumps
+        metrics.SHARED = True
+        metrics.clear_dumps()
+
+    # Bound before forking so all workers share one metrics listener
+    metrics_sock = _metrics_socket(metrics_listen) if metrics_listen else None
+    METRICS_ROUTE = metrics_sock is None
+
+    def on_start() -> None:
+        metrics.start_worker()
+        if not strict_paths:
+            _warm_indexes()
+        if metrics_sock is not None:
+            _serve_metrics(*metrics_sock)
+
+    if workers > 1:
+        serve_prefork(app, host, port, workers, threads, on_exit=_flush, engine=engine, on_start=on_start)
+        return
+    on_start()
+    if engine == "asyncio":
+        serve_asyncio(app, host, port, threads, on_exit=_flush)
+        return
+
+    atexit.register(_flush)
+    # Turn `drop stop` (SIGTERM) into a normal exit so atexit hooks run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    app.run(host=host, port=port, threaded=True, request_handler=RequestHandler)
@@ -0,0 +1,207 @@
+"""Content-addressed snapshots for drop.
+
+`drop add --snapshot` copies the published files into objects/, named by
+SHA-256 of their content, so identical files are stored once across pages
+and versions. A page's file list is itself an object (a "tree"), and the
+registry keeps only the tree digest. A snapshot never changes, so the
+server may let browsers cache it forever.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections.abc import Iterable
+from functools import lru_cache
+from pathlib import Path
+
+from .storage import DROP_DIR, PageInfo
+from .fileindex import FileIndex, FileIndexError
+from .utils import ManifestMatcher
+
+
+OBJECTS_DIR = DROP_DIR / "objects"
+SNAPSHOT_WORKERS = 8  # threads hashing and copying files
+GC_GRACE = 3600  # seconds an unreferenced object survives (covers adds in progress)
+TREE_CACHE_SIZE = 256  # parsed trees kept by the server
+
+HASH_CHUNK = 1024 * 1024
+
+# Tree: {"files": {relative path: [digest, size, mtime]}}
+Tree = dict[str, list]
+
+
+class SnapshotError(Exception):
+    """A source file could not be stored."""
+
+
+def object_path(digest: str) -> Path:
+    """Where the object with this digest lives."""
+    return OBJECTS_DIR / digest[:2] / digest[2:]
+
+
+def _hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _store(chunks: Iterable[bytes]) -> str:
+    """Write chunks into a new object (hashing as they go). Returns its digest."""
+    OBJECTS_DIR.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=OBJECTS_DIR, prefix=".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                h.update(chunk)
+                f.write(chunk)
+        digest = h.hexdigest()
+        path = object_path(digest)
+        path.parent.mkdir(exist_ok=True)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return digest
+
+
+def _read_chunks(path: Path) -> Iterable[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            yield chunk
+
+
+def _touch(path: Path) -> bool:
+    """Mark an existing object as in use (keeps gc() away). False if missing."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def store_file(path: Path) -> str:
+    """Add one file to the store. Returns its digest."""
+    # Hashing first means a file already stored is only read, never copied
+    digest = _hash_file(path)
+    if _touch(object_path(digest)):
+        return digest
+    # Copy and hash in one pass: the object is named for what was copied,
+    # even if the source changed since it was hashed
+    return _store(_read_chunks(path))
+
+
+def create(source: Path, manifest: list[str] | ManifestMatcher | None = None) -> tuple[str, int, int]:
+    """Snapshot a file or a directory's manifest-allowed files.
+
+    Returns (tree digest, file count, total bytes).
+    """
+    source = source.resolve()
+    if source.is_dir():
+        try:
+            index = FileIndex(source, manifest, watch=False, limit=None)
+        except FileIndexError as e:
+            raise SnapshotError(str(e)) from e
+        names = sorted(index.files)
+        paths = [Path(index.files[name].path) for name in names]
+    else:
+        names, paths = [source.name], [source]
+
+    def add(path: Path) -> list:
+        try:
+            st = path.stat()
+            return [store_file(path), st.st_size, st.st_mtime]
+        except OSError as e:
+            raise SnapshotError(f"{path}: {e.strerror or e}") from e
+
+    if len(paths) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # hashlib releases the GIL on large buffers, so threads hash in parallel
+        with ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS) as pool:
+            entries = list(pool.map(add, paths))
+    else:
+        entries = [add(path) for path in paths]
+
+    tree = {"files": dict(zip(names, entries))}
+    data = json.dumps(tree, sort_keys=True, separators=(",", ":")).encode()
+    digest = hashlib.sha256(data).hexdigest()
+    if not _touch(object_path(digest)):
+        digest = _store([data])
+    return digest, len(entries), sum(entry[1] for entry in entries)
+
+
+def load_tree(digest: str) -> Tree | None:
+    """File list of a snapshot, None if it cannot be read."""
+    try:
+        return _read_tree(digest)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+@lru_cache(maxsize=TREE_CACHE_SIZE)
+def _read_tree(digest: str) -> Tree:
+    # Immutable, so cached by digest; failures raise and are not cached (the
+    # object may be mid-write, or the read error transient)
+    return json.loads(object_path(digest).read_bytes())["files"]
+
+
+def lookup(tree: Tree, filepath: str) -> tuple[str, list] | None:
+    """Find a request path in a tree: (relative path, entry), trying index.html."""
+    entry = tree.get(filepath)
+    if entry is not None:
+        return filepath, entry
+    index = f"{filepath.rstrip('/')}/index.html" if filepath.strip("/") else "index.html"
+    entry = tree.get(index)
+    return (index, entry) if entry is not None else None
+
+
+def gc(pages: dict[str, PageInfo]) -> tuple[int, int]:
+    """Delete objects no page references. Returns (objects removed, bytes freed).
+
+    Objects younger than GC_GRACE are kept: they may belong to a `drop add`
+    that has not registered its page yet.
+    """
+    if not OBJECTS_DIR.is_dir():
+        return 0, 0
+    live = set()
+    for info in pages.values():
+        digest = info.get("snapshot", "")
+        if not digest:
+            continue
+        live.add(digest)
+        tree = load_tree(digest)
+        if tree is None:
+            continue
+        live.update(entry[0] for entry in tree.values())
+
+    cutoff = time.time() - GC_GRACE
+    removed = freed = 0
+    for shard in os.scandir(OBJECTS_DIR):
+        if not shard.is_dir(follow_symlinks=False):
+            # Temp file of an interrupted add
+            if shard.name.startswith(".") and shard.stat().st_mtime < cutoff:
+                os.unlink(shard.path)
+            continue
+        for entry in os.scandir(shard.path):
+            if shard.name + entry.name in live:
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if st.st_mtime >= cutoff:
+                continue
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += st.st_size
+        try:
+            os.rmdir(shard.path)
+        except OSError:
+            pass  # Not empty
+    return removed, freed
@@ -0,0 +1,822 @@
+"""Static file responses for drop: validators, conditional GET, compression."""
+
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+from urllib.parse import quote
+
+from flask import Response, request
+
+from . import metrics
+from .storage import DROP_DIR, atomic_write_text
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+
+# ETag flavour: "stat" (mtime + size, free) or "hash" (SHA-256 of content)
+ETAG_MODE = "stat"
+ETAG_INDEX_FILE = DROP_DIR / "etags.json"
+ETAG_HASH_MAX_SIZE = 64 * 1024 * 1024  # bigger files fall back to stat ETags
+ETAG_INDEX_MAX = 100_000  # entries kept in the sidecar index
+ETAG_SAVE_INTERVAL = 5.0  # seconds between sidecar writes
+
+# Compressed variants of text-like assets, built once and kept on disk
+COMPRESS = True
+COMPRESS_CACHE_DIR = DROP_DIR / "cache"
+COMPRESS_CACHE_BUDGET = 256 * 1024 * 1024  # bytes on disk before LRU eviction
+COMPRESS_MIN_SIZE = 512  # smaller bodies are not worth the header
+COMPRESS_MAX_SIZE = 32 * 1024 * 1024  # bigger files are served as-is
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/wasm",
+    "application/xml",
+    "font/otf",
+    "font/ttf",
+    "image/svg+xml",
+    "image/x-icon",
+    "image/vnd.microsoft.icon",
+}
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Body delivery: "direct" (sendfile from this process), or hand the file
+# to a front proxy with "x-sendfile" (Apache/lighttpd) / "x-accel" (nginx)
+SENDFILE_MODE = "direct"
+X_ACCEL_PREFIX = "/_drop_files"  # nginx: location /_drop_files/ { internal; alias /; }
+MAX_RANGES = 16  # more ranges than this get the whole file
+READ_CHUNK = 256 * 1024  # fallback streaming chunk when sendfile is unavailable
+
+# Small hot files kept in memory with ready-made headers (per server process)
+MEMORY_CACHE_BUDGET = 64 * 1024 * 1024  # bytes of bodies before LRU eviction (0 = off)
+MEMORY_CACHE_MAX_SIZE = 256 * 1024  # bigger files are always read from disk
+MEMORY_CACHE_REVALIDATE = 1.0  # seconds a cached file goes without a stat
+
+IMMUTABLE_MAX_AGE = 365 * 86400  # Cache-Control max-age for snapshot content
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"  # deflate, no name/mtime, unknown OS
+
+
+class EtagIndex:
+    """Content-hash ETags computed once and kept in a sidecar JSON index.
+
+    Entries are keyed by path and only trusted while (size, mtime_ns)
+    still match, so an edited file gets a fresh hash.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._entries: dict[str, list] | None = None  # {path: [size, mtime_ns, digest]}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, list]:
+        try:
+            entries = json.loads(self.path.read_text())
+            return entries if isinstance(entries, dict) else {}
+        except Exception:
+            return {}
+
+    def get(self, path: Path, st: os.stat_result) -> str:
+        """Return content digest for path, hashing it if not indexed yet."""
+        key = str(path)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            entry = self._entries.get(key)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        digest = _hash_file(path)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = [st.st_size, st.st_mtime_ns, digest]
+            while len(self._entries) > ETAG_INDEX_MAX:
+                del self._entries[next(iter(self._entries))]
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= ETAG_SAVE_INTERVAL:
+                self._save_locked()
+        return digest
+
+    def _save_locked(self) -> None:
+        # Merge with entries other server processes may have written
+        merged = self._load()
+        merged.update(self._entries)
+        self._entries = merged
+        try:
+            atomic_write_text(self.path, json.dumps(merged))
+        except OSError:
+            return
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """Write pending entries to disk."""
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+
+_etag_index = EtagIndex(ETAG_INDEX_FILE)
+
+
+def _hash_file(path: Path) -> str:
+    """SHA-256 of file content, truncated for header size."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()[:32]
+
+
+class CompressionCache:
+    """Compressed file variants under ~/.drop/cache/ with a byte-budget LRU.
+
+    Files are named by hash of (source path, size, mtime_ns), so an edited
+    source simply misses and its stale variant ages out of the budget.
+    """
+
+    def __init__(self, directory: Path, budget: int) -> None:
+        self.directory = directory
+        self.budget = budget
+        self._files: OrderedDict[str, int] | None = None  # {name: size}, LRU order
+        self._total = 0
+        self._incompressible: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _scan(self) -> None:
+        # Oldest first, so eviction after restart still follows last use roughly
+        self._files = OrderedDict()
+        self._total = 0
+        entries = []
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith("."):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, entry.name, st.st_size))
+        except OSError:
+            pass
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._total += size
+
+    def get(self, key: str, st: os.stat_result, encoding: str, read: Callable[[], bytes]) -> Path | None:
+        """Path of the compressed variant, building it on first use. None if not worth it."""
+        digest = hashlib.sha256(f"{key}\0{st.st_size}\0{st.st_mtime_ns}".encode()).hexdigest()
+        name = digest[:40] + ENCODING_SUFFIXES[encoding]
+        path = self.directory / name
+        with self._lock:
+            if self._files is None:
+                self._scan()
+            if name in self._incompressible:
+                return None
+            if name in self._files:
+                self._files.move_to_end(name)
+                metrics.inc("drop_cache_requests_total", (("cache", "compression"), ("result", "hit")))
+                return path
+
+        # Another server process may have built it already
+        try:
+            self._add(name, path.stat().st_size)
+            metrics.inc("drop_cache_requests_total", (("cache", "compression"), ("result", "hit")))
+            return path
+        except FileNotFoundError:
+            pass
+
+        metrics.inc("drop_cache_requests_total", (("cache", "compression"), ("result", "miss")))
+        data = read()
+        compressed = _compress(data, encoding)
+        if len(compressed) >= len(data):
+            with self._lock:
+                self._incompressible.add(name)
+            return None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp, path)
+        except OSError:
+            Path(tmp).unlink(missing_ok=True)
+            return None
+        self._add(name, len(compressed))
+        return path
+
+    def discard(self, path: Path) -> None:
+        """Forget a variant that vanished from disk."""
+        with self._lock:
+            if self._files is not None and path.name in self._files:
+                self._total -= self._files.pop(path.name)
+
+    def _add(self, name: str, size: int) -> None:
+        with self._lock:
+            if name in self._files:
+                self._total -= self._files[name]
+            self._files[name] = size
+            self._total += size
+            while self._total > self.budget and len(self._files) > 1:
+                old_name, old_size = self._files.popitem(last=False)
+                self._total -= old_size
+                (self.directory / old_name).unlink(missing_ok=True)
+
+
+_compression_cache = CompressionCache(COMPRESS_CACHE_DIR, COMPRESS_CACHE_BUDGET)
+
+
+class _HotFile:
+    __slots__ = ("version", "mtime", "compressible", "variants", "size", "checked")
+
+    def __init__(self, st: os.stat_result, compressible: bool) -> None:
+        self.version = (st.st_mtime_ns, st.st_size)
+        self.mtime = st.st_mtime
+        self.compressible = compressible
+        self.variants: dict[str | None, tuple[bytes, str, list]] = {}  # {encoding: (body, etag, headers)}
+        self.size = 0
+        self.checked = time.monotonic()
+
+
+class MemoryCache:
+    """Small file bodies in memory, LRU by total bytes.
+
+    Each entry holds the body of every encoding served so far with its
+    headers already built, keyed by path and checked against mtime + size
+    with at most one stat per `revalidate` seconds. Hits in between skip
+    stat, open and mimetype lookup.
+    """
+
+    def __init__(self, budget: int, max_size: int, revalidate: float) -> None:
+        self.budget = budget
+        self.max_size = max_size
+        self.revalidate = revalidate
+        self._files: OrderedDict[str, _HotFile] = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def fits(self, size: int) -> bool:
+        """Check if a file of this size is cached for the current request."""
+        return 0 < self.budget and size <= self.max_size and "Range" not in request.headers
+
+    def response(self, path: Path) -> Response | None:
+        """Serve path from memory, None on a miss."""
+        if not self.budget or "Range" in request.headers:
+            return None
+        key = str(path)
+        with self._lock:
+            hot = self._files.get(key)
+            if hot is not None:
+                self._files.move_to_end(key)
+        variant = None
+        if hot is not None:
+            now = time.monotonic()
+            if now - hot.checked >= self.revalidate:
+                try:
+                    st = os.stat(path)
+                    current = (st.st_mtime_ns, st.st_size) == hot.version
+                except OSError:
+                    current = False
+                if current:
+                    hot.checked = now
+                else:
+                    self._discard(key)
+                    hot = None
+            if hot is not None:
+                variant = hot.variants.get(accepted_encoding() if hot.compressible else None)
+        if variant is None:
+            return None  # Counted as a miss by load(), if the file is small enough
+        metrics.inc("drop_cache_requests_total", (("cache", "memory"), ("result", "hit")))
+        body, etag, headers = variant
+        if is_not_modified(etag, hot.mtime):
+            return _not_modified(etag, hot.mtime, vary=hot.compressible)
+        return Response(body, 200, headers)
+
+    def load(
+        self,
+        path: Path,
+        st: os.stat_result,
+        etag: str,
+        mimetype: str | None,
+        find_sibling: Callable[[str], Path | None] | None,
+    ) -> Response:
+        """Read a small file (or its compressed variant) into memory and serve it."""
+        metrics.inc("drop_cache_requests_total", (("cache", "memory"), ("result", "miss")))
+        compressible = is_compressible(mimetype, st.st_size)
+        encoding = accepted_encoding() if compressible else None
+        body = None
+        if encoding:
+            variant = _encoded_variant(path, st, etag, encoding, find_sibling, path.read_bytes)
+            if variant is not None:
+                try:
+                    body = variant[0].read_bytes()
+                    etag = variant[1]
+                except FileNotFoundError:
+                    _compression_cache.discard(variant[0])
+        if body is None:
+            encoding = None
+            body = path.read_bytes()
+
+        response = Response(body, mimetype=mimetype or "application/octet-stream")
+        if encoding:
+            response.content_encoding = encoding
+        else:
+            response.headers["Accept-Ranges"] = "bytes"
+        response.headers["Content-Disposition"] = _content_disposition(path.name)
+        response.set_etag(etag)
+        response.last_modified = st.st_mtime
+        response.cache_control.no_cache = True
+        if compressible:
+            response.vary.add("Accept-Encoding")
+
+        # Changed while being read: serve what was read, cache nothing
+        if encoding or len(body) == st.st_size:
+            self._store(str(path), st, compressible, encoding, (body, etag, list(response.headers.items())))
+        if is_not_modified(etag, st.st_mtime):
+            return _not_modified(etag, st.st_mtime, vary=compressible)
+        return response
+
+    def _store(self, key: str, st: os.stat_result, compressible: bool, encoding: str | None, variant: tuple) -> None:
+        with self._lock:
+            hot = self._files.get(key)
+            if hot is None or hot.version != (st.st_mtime_ns, st.st_size):
+                if hot is not None:
+                    self._total -= hot.size
+                hot = self._files[key] = _HotFile(st, compressible)
+            old = hot.variants.get(encoding)
+            if old is not None:
+                hot.size -= len(old[0])
+                self._total -= len(old[0])
+            hot.variants[encoding] = variant
+            hot.size += len(variant[0])
+            self._total += len(variant[0])
+            self._files.move_to_end(key)
+            while self._total > self.budget and self._files:
+                _, evicted = self._files.popitem(last=False)
+                self._total -= evicted.size
+                metrics.inc("drop_cache_evictions_total", (("cache", "memory"),))
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            hot = self._files.pop(key, None)
+            if hot is not None:
+                self._total -= hot.size
+
+
+_memory_cache = MemoryCache(MEMORY_CACHE_BUDGET, MEMORY_CACHE_MAX_SIZE, MEMORY_CACHE_REVALIDATE)
+
+
+def configure_memory_cache(budget: int, max_size: int) -> None:
+    """Replace the in-memory cache (budget 0 turns it off)."""
+    global _memory_cache
+    _memory_cache = MemoryCache(budget, max_size, MEMORY_CACHE_REVALIDATE)
+
+
+def memory_response(path: Path) -> Response | None:
+    """Serve a hot file straight from memory, None if it is not cached."""
+    return _memory_cache.response(path)
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # Built once and served many times, so favour ratio on small files
+        return brotli.compress(data, quality=11 if len(data) <= 1024 * 1024 else 6)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def is_compressible(mimetype: str | None, size: int) -> bool:
+    """Check if a response body is worth compressing."""
+    if not COMPRESS or not (COMPRESS_MIN_SIZE <= size <= COMPRESS_MAX_SIZE):
+        return False
+    return mimetype is not None and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES)
+
+
+def accepted_encoding() -> str | None:
+    """Best content coding the client accepts, None for identity."""
+    if "Range" in request.headers:
+        # Byte ranges refer to the identity body
+        return None
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def file_etag(path: Path, st: os.stat_result) -> str:
+    """Strong ETag for a file version."""
+    if ETAG_MODE == "hash" and st.st_size <= ETAG_HASH_MAX_SIZE:
+        return _etag_index.get(path, st)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def is_not_modified(etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since for the current request."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if since is not None:
+        return int(mtime) <= since.timestamp()
+    return False
+
+
+class FileBody:
+    """
+    WSGI body made of literal byte strings and (offset, length) file spans.
+    Under drop's own server engines ("drop.socket" in environ) spans go out
+    with zero-copy sendfile; other servers get them read in chunks.
+    The file is opened lazily, so HEAD and aborted requests never touch it.
+    """
+
+    def __init__(self, source: Path | int, segments: list[bytes | tuple[int, int]], sock=None) -> None:
+        self.source = source
+        self.segments = segments
+        self.sock = sock
+        self._file = None
+
+    def open(self):
+        """Open (or adopt the fd of) the underlying file."""
+        if self._file is None:
+            if isinstance(self.source, int):
+                self._file = os.fdopen(self.source, "rb")
+            else:
+                self._file = open(self.source, "rb")
+        return self._file
+
+    def __iter__(self):
+        file = None
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                yield segment
+                continue
+            offset, length = segment
+            file = file or self.open()
+            if self.sock is not None:
+                # Empty write makes the server flush headers/earlier parts first
+                yield b""
+                self.sock.sendfile(file, offset, length)
+                continue
+            fd = file.fileno()
+            while length > 0:
+                chunk = os.pread(fd, min(READ_CHUNK, length), offset)
+                if not chunk:
+                    return  # File shrank; connection closes short
+                offset += len(chunk)
+                length -= len(chunk)
+                yield chunk
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        elif isinstance(self.source, int):
+            os.close(self.source)
+
+
+def _not_modified(etag: str, mtime: float, vary: bool = False) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.last_modified = mtime
+    response.cache_control.no_cache = True
+    if vary:
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def _requested_ranges(size: int, etag: str, mtime: float) -> list[tuple[int, int]] | None:
+    """
+    Byte ranges to send as (offset, length), merged and sorted.
+    None means send the whole file; an empty list means 416.
+    """
+    header = request.headers.get("Range")
+    if request.method != "GET" or not header:
+        return None
+
+    # If-Range: only honour the range if the client's copy is current
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and int(mtime) != int(if_range.date.timestamp()):
+        return None
+
+    # Parsed by hand: werkzeug rejects unordered or overlapping range sets
+    units, _, specs = header.partition("=")
+    if units.strip().lower() != "bytes":
+        return None
+    spans = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        # Malformed Range is ignored (RFC 9110 14.2); isdigit() alone admits "²"
+        if not dash or not (first or last) or not all(
+            part.isascii() and part.isdecimal() for part in (first, last) if part
+        ):
+            return None
+        if not first:
+            start, stop = max(size - int(last), 0), size
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            stop = min(int(last) + 1, size) if last else size
+        if start < stop:
+            spans.append([start, stop])
+    if not spans:
+        return []
+
+    spans.sort()
+    merged = [spans[0]]
+    for start, stop in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    if len(merged) > MAX_RANGES:
+        return None
+    return [(start, stop - start) for start, stop in merged]
+
+
+def _content_disposition(name: str) -> str:
+    try:
+        name.encode("ascii")
+        return f'inline; filename="{name}"' if '"' not in name else "inline"
+    except UnicodeEncodeError:
+        return f"inline; filename*=UTF-8''{quote(name)}"
+
+
+def _file_response(
+    source: Path | int,
+    size: int,
+    mtime: float,
+    mimetype: str | None,
+    etag: str,
+    name: str,
+    encoding: str | None = None,
+    vary: bool = False,
+    base: int = 0,
+) -> Response:
+    """Build a 200/206/416 response streaming source (path or open fd).
+
+    base is where the content starts in source (archive members).
+    """
+    mimetype = mimetype or "application/octet-stream"
+    ranges = _requested_ranges(size, etag, mtime) if encoding is None else None
+
+    if ranges == []:
+        if isinstance(source, int):
+            os.close(source)
+        response = Response("Range Not Satisfiable", 416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if SENDFILE_MODE != "direct" and isinstance(source, Path) and encoding is None and not base:
+        # Front proxy reads the file and handles Range itself
+        response = Response(mimetype=mimetype)
+        if SENDFILE_MODE == "x-accel":
+            response.headers["X-Accel-Redirect"] = quote(f"{X_ACCEL_PREFIX}{source}")
+        else:
+            response.headers["X-Sendfile"] = str(source)
+    else:
+        sock = request.environ.get("drop.socket")
+        boundary = None
+        if ranges is None:
+            status, segments, length = 200, [(0, size)], size
+        elif len(ranges) == 1:
+            offset, span = ranges[0]
+            status, segments, length = 206, [ranges[0]], span
+        else:
+            boundary = secrets.token_hex(12)
+            segments = []
+            for offset, span in ranges:
+                segments.append(
+                    f"--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                    f"Content-Range: bytes {offset}-{offset + span - 1}/{size}\r\n\r\n".encode()
+                )
+                segments.append((offset, span))
+                segments.append(b"\r\n")
+            segments.append(f"--{boundary}--\r\n".encode())
+            status = 206
+            length = sum(len(s) if isinstance(s, bytes) else s[1] for s in segments)
+        if base:
+            segments = [s if isinstance(s, bytes) else (s[0] + base, s[1]) for s in segments]
+
+        response = Response(
+            FileBody(source, segments, sock),
+            status,
+            mimetype=f"multipart/byteranges; boundary={boundary}" if boundary else mimetype,
+            direct_passthrough=True,
+        )
+        response.content_length = length
+        if status == 206 and boundary is None:
+            offset, span = ranges[0]
+            response.headers["Content-Range"] = f"bytes {offset}-{offset + span - 1}/{size}"
+        if encoding is None:
+            response.headers["Accept-Ranges"] = "bytes"
+
+    response.headers["Content-Disposition"] = _content_disposition(name)
+    response.set_etag(etag)
+    response.last_modified = mtime
+    response.cache_control.no_cache = True
+    if encoding:
+        response.content_encoding = encoding
+    if vary:
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def _encoded_variant(
+    path: Path,
+    st: os.stat_result,
+    etag: str,
+    encoding: str,
+    find_sibling: Callable[[str], Path | None] | None,
+    read: Callable[[], bytes],
+) -> tuple[Path, str] | None:
+    """Pick a precompressed sibling or cached variant. Returns (file, etag)."""
+    suffix = ENCODING_SUFFIXES[encoding]
+    if find_sibling is not None:
+        # Shipped foo.js.gz / foo.js.br, if published and not older than foo.js
+        sibling = find_sibling(suffix)
+        if sibling is not None:
+            try:
+                sibling_st = os.stat(sibling)
+            except OSError:
+                sibling_st = None
+            if sibling_st is not None and sibling_st.st_mtime_ns >= st.st_mtime_ns:
+                return sibling, f"{file_etag(sibling, sibling_st)}-{encoding}"
+    variant = _compression_cache.get(str(path), st, encoding, read)
+    if variant is None:
+        return None
+    return variant, f"{etag}-{encoding}"
+
+
+def _encoded_response(
+    variant: Path,
+    variant_etag: str,
+    mtime: float,
+    mimetype: str | None,
+    name: str,
+    encoding: str,
+) -> Response | None:
+    """Serve a compressed variant; None if it vanished (evicted by another process)."""
+    if is_not_modified(variant_etag, mtime):
+        return _not_modified(variant_etag, mtime, vary=True)
+    try:
+        size = os.stat(variant).st_size
+    except FileNotFoundError:
+        _compression_cache.discard(variant)
+        return None
+    return _file_response(variant, size, mtime, mimetype, variant_etag, name, encoding, vary=True)
+
+
+def file_response(
+    path: Path,
+    mimetype: str | None,
+    find_sibling: Callable[[str], Path | None] | None = None,
+) -> Response:
+    """
+    Serve a file with ETag/Last-Modified; 304 without opening it if unchanged.
+    Supports single and multi-part byte ranges and zero-copy delivery.
+    Text-like files are sent gzip/brotli encoded when the client accepts it.
+    find_sibling(suffix) returns a published precompressed sibling, if any.
+    """
+    st = os.stat(path)
+    etag = file_etag(path, st)
+    if _memory_cache.fits(st.st_size):
+        return _memory_cache.load(path, st, etag, mimetype, find_sibling)
+    return _stat_response(path, st, etag, st.st_mtime, path.name, mimetype, find_sibling)
+
+
+def _stat_response(
+    path: Path,
+    st: os.stat_result,
+    etag: str,
+    mtime: float,
+    name: str,
+    mimetype: str | None,
+    find_sibling: Callable[[str], Path | None] | None,
+) -> Response:
+    compressible = is_compressible(mimetype, st.st_size)
+
+    encoding = accepted_encoding() if compressible else None
+    if encoding:
+        variant = _encoded_variant(path, st, etag, encoding, find_sibling, path.read_bytes)
+        if variant is not None:
+            response = _encoded_response(*variant, mtime, mimetype, name, encoding)
+            if response is not None:
+                return response
+
+    if is_not_modified(etag, mtime):
+        return _not_modified(etag, mtime, vary=compressible)
+    return _file_response(path, st.st_size, mtime, mimetype, etag, name, vary=compressible)
+
+
+def object_response(
+    path: Path,
+    digest: str,
+    mtime: float,
+    name: str,
+    mimetype: str | None,
+    private: bool = False,
+) -> Response:
+    """
+    Serve a snapshot object: the content digest is the ETag, and since a
+    snapshot URL never changes content, browsers may cache it for good.
+    private keeps shared caches out (password-protected pages).
+    """
+    st = os.stat(path)
+    response = _stat_response(path, st, digest[:32], mtime, name, mimetype, None)
+    if response.status_code in (200, 206, 304):
+        scope = "private" if private else "public"
+        response.headers["Cache-Control"] = f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return response
+
+
+def member_response(archive, member, etag: str, name: str, mimetype: str | None) -> Response:
+    """
+    Serve one member of an archives.ArchiveIndex with the usual validators.
+    Stored members are byte spans of the archive (ranges, sendfile); deflated
+    ones go out as gzip without recompressing when the client accepts it.
+    """
+    mtime = member.mtime
+    compressible = is_compressible(mimetype, member.size)
+    if not member.deflated:
+        encoding = accepted_encoding() if compressible else None
+        if encoding:
+            # Keyed by archive path, offset and archive stat: a new archive misses
+            st = os.stat(archive.path)
+            variant = _compression_cache.get(
+                f"{archive.path}@{member.offset}", st, encoding, lambda: b"".join(archive.read(member)),
+            )
+            if variant is not None:
+                response = _encoded_response(variant, f"{etag}-{encoding}", mtime, mimetype, name, encoding)
+                if response is not None:
+                    return response
+        if is_not_modified(etag, mtime):
+            return _not_modified(etag, mtime, vary=compressible)
+        return _file_response(
+            archive.path, member.size, mtime, mimetype, etag, name, vary=compressible, base=member.offset,
+        )
+
+    gzip_ok = request.accept_encodings.best_match(["gzip"]) == "gzip"
+    if gzip_ok:
+        etag = f"{etag}-gzip"
+    if is_not_modified(etag, mtime):
+        return _not_modified(etag, mtime, vary=True)
+    if gzip_ok:
+        # Raw deflate data framed as a gzip stream (RFC 1952): header, data, CRC-32 + size
+        trailer = member.crc.to_bytes(4, "little") + (member.size & 0xFFFFFFFF).to_bytes(4, "little")
+        segments = [GZIP_HEADER, (member.offset, member.compressed_size), trailer]
+        body = FileBody(archive.path, segments, request.environ.get("drop.socket"))
+        length = len(GZIP_HEADER) + member.compressed_size + len(trailer)
+    else:
+        body, length = archive.read(member), member.size
+    response = Response(body, mimetype=mimetype or "application/octet-stream", direct_passthrough=True)
+    response.content_length = length
+    if gzip_ok:
+        response.content_encoding = "gzip"
+    response.headers["Content-Disposition"] = _content_disposition(name)
+    response.set_etag(etag)
+    response.last_modified = mtime
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def fd_response(fd: int, name: str, mimetype: str | None, key: str) -> Response:
+    """
+    Serve an already-open file descriptor (strict path mode); takes ownership of fd.
+    key identifies the file for the compression cache (its path).
+    """
+    st = os.fstat(fd)
+    # Hash ETags are indexed by path; an fd has none, so use stat validators
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    compressible = is_compressible(mimetype, st.st_size)
+
+    encoding = accepted_encoding() if compressible else None
+    if encoding:
+        # No sibling lookup: that would need another checked walk
+        variant = _compression_cache.get(key, st, encoding, lambda: os.pread(fd, st.st_size, 0))
+        if variant is not None:
+            response = _encoded_response(variant, f"{etag}-{encoding}", st.st_mtime, mimetype, name, encoding)
+            if response is not None:
+                os.close(fd)
+                return response
+
+    if is_not_modified(etag, st.st_mtime):
+        os.close(fd)
+        return _not_modified(etag, st.st_mtime, vary=compressible)
+    return _file_response(fd, st.st_size, st.st_mtime, mimetype, etag, name, vary=compressible)
+
+
+def flush() -> None:
+    """Persist cached state (call on shutdown)."""
+    _etag_index.flush()
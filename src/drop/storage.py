@@ -1,10 +1,26 @@
 """Storage management for drop."""
 
+import bisect
 import json
 import os
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import TypedDict
+from types import MappingProxyType
+from typing import TYPE_CHECKING, TypedDict, TypeVar
+
+from .utils import file_fingerprint
+
+if TYPE_CHECKING:
+    import sqlite3
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers may race
+    fcntl = None
 
 
 class PageInfo(TypedDict):
@@ -19,13 +35,21 @@ class PageInfo(TypedDict):
     run_cmd: str  # Command to run (for apps)
     port: int  # App port (for apps)
     pid: int  # Running process PID (for apps, 0 if not running)
+    keep: bool  # Never auto-remove for inactivity
+    snapshot: str  # Digest of the published file tree in objects/, "" if served live
 
 
 DROP_DIR = Path.home() / ".drop"
 PAGES_FILE = DROP_DIR / "pages.json"
+PAGES_DB = DROP_DIR / "pages.db"  # SQLite registry; used instead of pages.json when present
 PID_FILE = DROP_DIR / "server.pid"
 PORT_FILE = DROP_DIR / "port"
 HOST_FILE = DROP_DIR / "host"
+LOGS_DIR = DROP_DIR / "logs"  # app output, one <page_id>.log per app
+ENV_FILE = DROP_DIR / "env.json"  # cached environment probes (detected IP, systemd)
+ENV_TTL = 600  # seconds before a cached probe is re-run
+
+T = TypeVar("T")
 
 
 def ensure_dir() -> None:
@@ -33,24 +57,348 @@ def ensure_dir() -> None:
     DROP_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def load_pages() -> dict[str, PageInfo]:
-    """Load pages registry."""
-    if not PAGES_FILE.exists():
-        return {}
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write file via temp file + rename so readers never see a partial write."""
+    import tempfile  # deferred: only writers pay for it
+
+    ensure_dir()
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
     try:
-        return json.loads(PAGES_FILE.read_text())
-    except Exception:
-        return {}
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on path (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    ensure_dir()
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+# Registry backends
+
+class JsonBackend:
+    """Registry in pages.json: every write rewrites the whole file.
+
+    Writers serialize on pages.json.lock so concurrent `drop add` calls do not
+    lose each other's entries; readers never lock (files are replaced atomically).
+    """
+
+    kind = "json"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock_path = path.with_name(path.name + ".lock")
+
+    def load(self) -> dict[str, PageInfo]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text())
+        except Exception:
+            return {}
+
+    def _write(self, pages: dict[str, PageInfo]) -> None:
+        atomic_write_text(self.path, json.dumps(pages, indent=2))
+
+    def save(self, pages: dict[str, PageInfo]) -> None:
+        with file_lock(self.lock_path):
+            self._write(pages)
+
+    def put(self, entries: dict[str, PageInfo]) -> None:
+        with file_lock(self.lock_path):
+            pages = self.load()
+            pages.update(entries)
+            self._write(pages)
+
+    def update(self, page_id: str, fields: dict) -> bool:
+        with file_lock(self.lock_path):
+            pages = self.load()
+            if page_id not in pages:
+                return False
+            pages[page_id].update(fields)
+            self._write(pages)
+            return True
+
+    def delete(self, page_ids: list[str]) -> int:
+        with file_lock(self.lock_path):
+            pages = self.load()
+            removed = [page_id for page_id in page_ids if pages.pop(page_id, None) is not None]
+            if removed:
+                self._write(pages)
+            return len(removed)
+
+    def fingerprint(self) -> object:
+        return file_fingerprint(self.path)
+
+
+_sqlite_ready: set[tuple[str, int]] = set()  # (path, inode) of databases with the schema in place
+_sqlite_ready_lock = threading.Lock()
+
+
+class SqliteBackend:
+    """Registry in an SQLite database (WAL): row-level writes, readers never block.
+
+    Page info is stored as a JSON document per row; `id` and `name` are
+    indexed columns. A generation counter bumped by triggers on every change
+    lets the server notice writes from other processes with one indexed read.
+    """
+
+    kind = "sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS pages ("
+        " id TEXT PRIMARY KEY, name TEXT NOT NULL DEFAULT '', info TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS pages_name ON pages(name)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)",
+        *(
+            f"CREATE TRIGGER IF NOT EXISTS pages_{event.lower()} AFTER {event} ON pages"
+            " BEGIN UPDATE meta SET value = value + 1 WHERE key = 'generation'; END"
+            for event in ("INSERT", "UPDATE", "DELETE")
+        ),
+    )
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> "sqlite3.Connection":
+        # One connection per thread, never reused across fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            import sqlite3  # deferred: JSON registries never load it
+
+            ensure_dir()
+            db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema(db)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _create_schema(self, db: "sqlite3.Connection") -> None:
+        # Once per database file and process: the DDL takes the write lock, and
+        # the threaded server opens a connection for every request thread
+        try:
+            key = (str(self.path), os.stat(self.path).st_ino)
+        except OSError:
+            key = None
+        if key in _sqlite_ready:
+            return
+        with _sqlite_ready_lock:
+            if key in _sqlite_ready:
+                return
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                db.execute(statement)
+            if key is None:
+                key = (str(self.path), os.stat(self.path).st_ino)
+            _sqlite_ready.add(key)
+
+    @contextmanager
+    def _transaction(self) -> Iterator["sqlite3.Connection"]:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None and self._local.pid == os.getpid():
+            db.close()
+        self._local.db = None
+
+    def load(self) -> dict[str, PageInfo]:
+        rows = self._connect().execute("SELECT id, info FROM pages ORDER BY rowid")
+        return {page_id: json.loads(info) for page_id, info in rows}
+
+    def save(self, pages: dict[str, PageInfo]) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM pages")
+            self._insert(db, pages)
+
+    @staticmethod
+    def _insert(db: "sqlite3.Connection", entries: dict[str, PageInfo]) -> None:
+        # Upsert keeps the rowid, so replaced pages keep their listing position
+        db.executemany(
+            "INSERT INTO pages (id, name, info) VALUES (?, ?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET name = excluded.name, info = excluded.info",
+            [(page_id, info.get("name") or "", json.dumps(info)) for page_id, info in entries.items()],
+        )
+
+    def put(self, entries: dict[str, PageInfo]) -> None:
+        with self._transaction() as db:
+            self._insert(db, entries)
+
+    def update(self, page_id: str, fields: dict) -> bool:
+        with self._transaction() as db:
+            row = db.execute("SELECT info FROM pages WHERE id = ?", (page_id,)).fetchone()
+            if row is None:
+                return False
+            info = json.loads(row[0])
+            info.update(fields)
+            db.execute(
+                "UPDATE pages SET name = ?, info = ? WHERE id = ?",
+                (info.get("name") or "", json.dumps(info), page_id),
+            )
+            return True
+
+    def delete(self, page_ids: list[str]) -> int:
+        with self._transaction() as db:
+            return db.executemany("DELETE FROM pages WHERE id = ?", [(i,) for i in page_ids]).rowcount
+
+    def checkpoint(self) -> None:
+        """Fold the WAL into the main database file."""
+        self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def fingerprint(self) -> object:
+        # Inode guards against the database being replaced or recreated
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            inode = None
+        return (inode, row[0])
+
+
+_backends: dict[str, JsonBackend | SqliteBackend] = {}
+
+
+def get_backend(kind: str | None = None) -> JsonBackend | SqliteBackend:
+    """Return registry backend: SQLite if pages.db exists, else pages.json."""
+    if kind is None:
+        kind = "sqlite" if PAGES_DB.exists() else "json"
+    backend = _backends.get(kind)
+    if backend is None:
+        backend = JsonBackend(PAGES_FILE) if kind == "json" else SqliteBackend(PAGES_DB)
+        backend = _backends.setdefault(kind, backend)
+    return backend
 
 
-def save_pages(pages: dict[str, PageInfo]) -> None:
-    """Save pages registry."""
-    ensure_dir()
-    PAGES_FILE.write_text(json.dumps(pages, indent=2))
+def load_pages() -> dict[str, PageInfo]:
+    """Load pages registry."""
+    return get_backend().load()
 
 
-def add_page(
-    page_id: str,
+def save_pages(pages: dict[str, PageInfo]) -> None:
+    """Save pages registry (replaces all entries)."""
+    get_backend().save(pages)
+
+
+def migrate_registry(target: str) -> int:
+    """Move the registry to the "sqlite" or "json" backend. Returns page count.
+
+    The old store is kept as pages.json.bak / pages.db.bak.
+    """
+    source = get_backend()
+    if source.kind == target:
+        raise ValueError(f"registry already uses {target}")
+    if target == "sqlite":
+        # Hold the JSON writer lock so no `drop add` lands in the old file mid-move
+        with file_lock(source.lock_path):
+            pages = source.load()
+            db = SqliteBackend(PAGES_DB.with_name(PAGES_DB.name + ".tmp"))
+            db.path.unlink(missing_ok=True)
+            db.save(pages)
+            db.checkpoint()
+            db.close()
+            os.replace(db.path, PAGES_DB)
+            if PAGES_FILE.exists():
+                os.replace(PAGES_FILE, PAGES_FILE.with_name(PAGES_FILE.name + ".bak"))
+    else:
+        pages = source.load()
+        JsonBackend(PAGES_FILE).save(pages)
+        source.checkpoint()
+        source.close()
+        os.replace(PAGES_DB, PAGES_DB.with_name(PAGES_DB.name + ".bak"))
+        for suffix in ("-wal", "-shm"):
+            PAGES_DB.with_name(PAGES_DB.name + suffix).unlink(missing_ok=True)
+    _backends.clear()
+    return len(pages)
+
+
+class RegistrySnapshot:
+    """Immutable parsed view of the registry, shared by all server threads.
+
+    Lookup indexes are built once per snapshot, so resolving an ID, ID prefix
+    or name costs the same regardless of how many pages are registered.
+    """
+
+    __slots__ = ("pages", "fingerprint", "_sorted_ids", "_names")
+
+    def __init__(self, pages: dict[str, PageInfo], fingerprint: object) -> None:
+        self.pages: Mapping[str, PageInfo] = MappingProxyType(
+            {page_id: MappingProxyType(info) for page_id, info in pages.items()}
+        )
+        self.fingerprint = fingerprint
+        # Sorted IDs: all keys sharing a prefix form one contiguous run
+        self._sorted_ids = sorted(pages)
+        # First page wins on duplicate names, same as registry order scan
+        self._names: dict[str, str] = {}
+        for page_id, info in pages.items():
+            name = info.get("name")
+            if name:
+                self._names.setdefault(name, page_id)
+
+    def _prefix_match(self, prefix: str) -> str | None:
+        """Return the only ID starting with prefix, None if none or ambiguous."""
+        ids = self._sorted_ids
+        i = bisect.bisect_left(ids, prefix)
+        if i == len(ids) or not ids[i].startswith(prefix):
+            return None
+        if i + 1 < len(ids) and ids[i + 1].startswith(prefix):
+            return None
+        return ids[i]
+
+    def resolve(self, page_id: str) -> str | None:
+        """Resolve full ID, unique ID prefix or name to a full page ID."""
+        if page_id in self.pages:
+            return page_id
+        return self._prefix_match(page_id) or self._names.get(page_id)
+
+    def get(self, page_id: str) -> PageInfo | None:
+        """Get page by ID, ID prefix or name."""
+        full_id = self.resolve(page_id)
+        return self.pages[full_id] if full_id else None
+
+
+_snapshot: RegistrySnapshot | None = None
+_snapshot_lock = threading.Lock()
+
+
+def registry_snapshot() -> RegistrySnapshot:
+    """Return cached registry snapshot, re-loading only when the registry changes.
+
+    One stat() (JSON) or one indexed read (SQLite) per call instead of a full
+    load. JSON writers replace the file atomically, so a new inode/size/mtime
+    always means new content; SQLite bumps a generation counter on every write.
+    """
+    global _snapshot
+    backend = get_backend()
+    fingerprint = (backend.kind, backend.fingerprint())
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.fingerprint == fingerprint:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.fingerprint != fingerprint:
+            _snapshot = RegistrySnapshot(backend.load(), fingerprint)
+        return _snapshot
+
+
+def page_info(
     source: Path,
     password_hash: str,
     description: str = "",
@@ -58,10 +406,11 @@ def add_page(
     page_type: str = "static",
     run_cmd: str = "",
     port: int = 0,
-) -> None:
-    """Add a page to registry."""
-    pages = load_pages()
-    pages[page_id] = {
+    keep: bool = False,
+    snapshot: str = "",
+) -> PageInfo:
+    """Build a registry entry for source."""
+    return {
         "source": str(source.resolve()),
         "is_dir": source.is_dir(),
         "password_hash": password_hash,
@@ -72,67 +421,58 @@ def add_page(
         "run_cmd": run_cmd,
         "port": port,
         "pid": 0,
+        "keep": keep,
+        "snapshot": snapshot,
     }
-    save_pages(pages)
+
+
+def add_page(
+    page_id: str,
+    source: Path,
+    password_hash: str,
+    description: str = "",
+    name: str = "",
+    page_type: str = "static",
+    run_cmd: str = "",
+    port: int = 0,
+) -> None:
+    """Add a page to registry."""
+    add_pages({page_id: page_info(source, password_hash, description, name, page_type, run_cmd, port)})
+
+
+def add_pages(entries: dict[str, PageInfo]) -> None:
+    """Add many pages with a single registry write."""
+    get_backend().put(entries)
 
 
 def remove_page(page_id: str) -> bool:
     """Remove a page from registry. Returns True if found."""
-    pages = load_pages()
-    if page_id in pages:
-        del pages[page_id]
-        save_pages(pages)
-        return True
-    # Try partial match
-    matches = [k for k in pages if k.startswith(page_id)]
-    if len(matches) == 1:
-        del pages[matches[0]]
-        save_pages(pages)
-        return True
-    return False
+    snapshot = registry_snapshot()
+    full_id = page_id if page_id in snapshot.pages else snapshot._prefix_match(page_id)
+    return bool(full_id) and get_backend().delete([full_id]) > 0
+
+
+def remove_pages(page_ids: list[str]) -> int:
+    """Remove pages by full ID in one write. Returns number removed."""
+    return get_backend().delete(page_ids)
 
 
 def get_page(page_id: str) -> PageInfo | None:
     """Get page by ID or name (supports partial ID match)."""
-    pages = load_pages()
-    if page_id in pages:
-        return pages[page_id]
-    # Try partial ID match
-    matches = [k for k in pages if k.startswith(page_id)]
-    if len(matches) == 1:
-        return pages[matches[0]]
-    # Try name match
-    for pid, info in pages.items():
-        if info.get("name") == page_id:
-            return info
-    return None
+    return registry_snapshot().get(page_id)
 
 
 def get_full_page_id(partial_id: str) -> str | None:
     """Get full page ID from partial ID or name match."""
-    pages = load_pages()
-    if partial_id in pages:
-        return partial_id
-    # Try partial ID match
-    matches = [k for k in pages if k.startswith(partial_id)]
-    if len(matches) == 1:
-        return matches[0]
-    # Try name match
-    for pid, info in pages.items():
-        if info.get("name") == partial_id:
-            return pid
-    return None
+    return registry_snapshot().resolve(partial_id)
 
 
 def update_page_pid(page_id: str, pid: int) -> bool:
     """Update running PID for an app. Returns True if found."""
-    pages = load_pages()
     full_id = get_full_page_id(page_id)
     if not full_id:
         return False
-    pages[full_id]["pid"] = pid
-    save_pages(pages)
-    return True
+    return get_backend().update(full_id, {"pid": pid})
 
 
 def get_app_status(page_id: str) -> str:
@@ -140,7 +480,11 @@ def get_app_status(page_id: str) -> str:
     page = get_page(page_id)
     if not page or page.get("type") != "app":
         return "not_app"
+    return app_status(page)
 
+
+def app_status(page: PageInfo) -> str:
+    """Status of an app from its registry entry (no registry lookup)."""
     pid = page.get("pid", 0)
     if pid == 0:
         return "stopped"
@@ -203,3 +547,27 @@ def load_host() -> str | None:
     if not HOST_FILE.exists():
         return None
     return HOST_FILE.read_text().strip() or None
+
+
+_env: dict | None = None
+
+
+def cached_env(key: str, probe: Callable[[], T], refresh: bool = False) -> T:
+    """Return probe() result, cached in env.json for ENV_TTL seconds."""
+    global _env
+    if _env is None:
+        try:
+            _env = json.loads(ENV_FILE.read_text())
+        except Exception:
+            _env = {}
+    now = time.time()
+    entry = _env.get(key)
+    if not refresh and isinstance(entry, dict) and 0 <= now - entry.get("at", 0) < ENV_TTL:
+        return entry["value"]
+    value = probe()
+    _env[key] = {"value": value, "at": now}
+    try:
+        atomic_write_text(ENV_FILE, json.dumps(_env))
+    except OSError:
+        pass
+    return value
@@ -2,11 +2,16 @@
 
 import fnmatch
 import hashlib
-import platform
+import os
+import re
 import secrets
 import socket
 import string
 import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 
 
@@ -69,17 +74,26 @@ def get_local_ip() -> str:
 
 
 def detect_ip(host_override: str | None = None) -> str:
-    """Detect best IP to use for URLs."""
+    """Detect best IP to use for URLs.
+
+    External and local probes run concurrently: the external IP is preferred,
+    and when it fails the local answer is already there.
+    """
     if host_override:
         return host_override
 
+    local: list[str] = []
+    probe = threading.Thread(target=lambda: local.append(get_local_ip()), daemon=True)
+    probe.start()
+
     # Try external IP first
     external = get_external_ip()
     if external:
         return external
 
     # Fall back to local IP
-    return get_local_ip()
+    probe.join()
+    return local[0] if local else "127.0.0.1"
 
 
 MANIFEST_FILE = ".drop-publish"
@@ -101,13 +115,18 @@ def load_manifest(directory: Path) -> list[str] | None:
     if not manifest_path.exists():
         return None
     try:
-        lines = manifest_path.read_text().strip().split("\n")
-        # Filter empty lines and comments
-        return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+        return parse_manifest(manifest_path.read_text())
     except Exception:
         return None
 
 
+def parse_manifest(text: str) -> list[str]:
+    """Manifest patterns from .drop-publish content."""
+    lines = text.strip().split("\n")
+    # Filter empty lines and comments
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
 def matches_manifest(relative_path: str, patterns: list[str]) -> bool:
     """Check if relative path matches any manifest pattern."""
     for pattern in patterns:
@@ -126,7 +145,70 @@ def matches_manifest(relative_path: str, patterns: list[str]) -> bool:
     return False
 
 
-def safe_path(base: Path, requested: str, manifest: list[str] | None = None) -> Path | None:
+class ManifestMatcher:
+    """Manifest patterns compiled into a single regex.
+
+    Same allow rules as matches_manifest(), but one regex match per path
+    instead of one fnmatch per pattern.
+    """
+
+    __slots__ = ("patterns", "_regex")
+
+    def __init__(self, patterns: list[str]) -> None:
+        self.patterns = list(patterns)
+        alternatives = []
+        for pattern in patterns:
+            if "**" in pattern:
+                # "assets/**" matches "assets" and anything below it
+                prefix = pattern.split("**")[0].rstrip("/")
+                alternatives.append(re.escape(prefix) + r"(?:/.*)?\Z")
+            else:
+                alternatives.append(fnmatch.translate(pattern))
+                # Pattern naming a parent directory
+                alternatives.append(re.escape(pattern.rstrip("/")) + r"/.*\Z")
+        self._regex = (
+            re.compile("|".join(f"(?:{alt})" for alt in alternatives), re.DOTALL)
+            if alternatives else None
+        )
+
+    def matches(self, relative_path: str) -> bool:
+        """Check if relative path is allowed by the manifest."""
+        return self._regex is not None and self._regex.match(relative_path) is not None
+
+
+def file_fingerprint(path: Path) -> tuple[int, int, int] | None:
+    """Cheap change detector: (inode, size, mtime_ns), or None if missing."""
+    try:
+        st = path.stat()
+    except (OSError, ValueError):  # ValueError: NUL byte in a requested path
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+# {directory: (manifest fingerprint, matcher)}
+_manifest_cache: dict[Path, tuple[tuple[int, int, int] | None, ManifestMatcher | None]] = {}
+MANIFEST_CACHE_SIZE = 1024
+
+
+def get_manifest_matcher(directory: Path) -> ManifestMatcher | None:
+    """Compiled manifest for directory, recompiled only when the file changes."""
+    fingerprint = file_fingerprint(directory / MANIFEST_FILE)
+    cached = _manifest_cache.get(directory)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    patterns = load_manifest(directory) if fingerprint is not None else None
+    matcher = ManifestMatcher(patterns) if patterns is not None else None
+    if len(_manifest_cache) >= MANIFEST_CACHE_SIZE:
+        _manifest_cache.clear()
+    _manifest_cache[directory] = (fingerprint, matcher)
+    return matcher
+
+
+def safe_path(
+    base: Path,
+    requested: str,
+    manifest: list[str] | ManifestMatcher | None = None,
+) -> Path | None:
     """
     Resolve path and ensure it's within base directory and allowed by manifest.
     Returns None if path is unsafe.
@@ -153,7 +235,11 @@ def safe_path(base: Path, requested: str, manifest: list[str] | None = None) ->
         # Check manifest if provided
         if manifest is not None:
             relative = str(full_path.relative_to(base))
-            if not matches_manifest(relative, manifest):
+            if isinstance(manifest, ManifestMatcher):
+                allowed = manifest.matches(relative)
+            else:
+                allowed = matches_manifest(relative, manifest)
+            if not allowed:
                 return None
 
         return full_path
@@ -161,9 +247,103 @@ def safe_path(base: Path, requested: str, manifest: list[str] | None = None) ->
         return None
 
 
+def supports_open_beneath() -> bool:
+    """Check if the platform can open files relative to a directory fd without following symlinks."""
+    return hasattr(os, "O_NOFOLLOW") and hasattr(os, "O_DIRECTORY") and os.open in os.supports_dir_fd
+
+
+def open_beneath(
+    base: Path,
+    requested: str,
+    manifest: list[str] | ManifestMatcher | None = None,
+) -> int | None:
+    """
+    Validate and open path under base in a single walk.
+    Each component is opened relative to its parent's fd with O_NOFOLLOW, so
+    nothing can be swapped for a symlink between the check and the open.
+    Stricter than safe_path(): symlinks and ".." are refused even if they stay
+    inside base. Returns a read-only fd (file or directory) or None if unsafe.
+    """
+    parts = [part for part in requested.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        return None
+
+    # Always block .env files (except .env.example)
+    if parts and is_env_file(parts[-1]):
+        return None
+
+    # Check manifest if provided
+    if manifest is not None and parts:
+        relative = "/".join(parts)
+        if isinstance(manifest, ManifestMatcher):
+            allowed = manifest.matches(relative)
+        else:
+            allowed = matches_manifest(relative, manifest)
+        if not allowed:
+            return None
+
+    flags = os.O_RDONLY | getattr(os, "O_CLOEXEC", 0)
+    try:
+        fd = os.open(base, flags | os.O_DIRECTORY)
+    except OSError:
+        return None
+    try:
+        for part in parts[:-1]:
+            next_fd = os.open(part, flags | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=fd)
+            os.close(fd)
+            fd = next_fd
+        if parts:
+            # O_NONBLOCK: never hang on a FIFO planted in the tree
+            last_fd = os.open(parts[-1], flags | os.O_NOFOLLOW | os.O_NONBLOCK, dir_fd=fd)
+            os.close(fd)
+            fd = last_fd
+        return fd
+    except OSError:
+        os.close(fd)
+        return None
+
+
+class PathCache:
+    """Bounded LRU of path resolutions that expire after ttl seconds.
+
+    Entries can carry a stamp (e.g. file fingerprints) that must match on
+    lookup, so known changes invalidate them at once; expiry bounds how long
+    other changes in the published tree can go unnoticed.
+    """
+
+    MISS = object()
+
+    def __init__(self, maxsize: int = 256, ttl: float = 2.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[object, tuple[float, object, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: object, stamp: object = None) -> object:
+        """Return cached value, or PathCache.MISS if absent, expired or stamped differently."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self.MISS
+            if entry[0] < now or entry[1] != stamp:
+                del self._entries[key]
+                return self.MISS
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key: object, value: object, stamp: object = None) -> None:
+        """Cache value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
 def has_systemd() -> bool:
     """Check if systemd is available (Linux with systemd user services)."""
-    if platform.system() != "Linux":
+    if not sys.platform.startswith("linux"):
         return False
     try:
         result = subprocess.run(
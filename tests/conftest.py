@@ -0,0 +1,44 @@
+"""Shared fixtures. drop keeps its state in ~/.drop, so HOME is a throwaway dir."""
+
+import os
+import tempfile
+
+os.environ["HOME"] = tempfile.mkdtemp(prefix="drop-tests-")
+
+import itertools  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+import pytest  # noqa: E402
+
+from drop import server, storage  # noqa: E402
+
+_ids = itertools.count()
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+@pytest.fixture
+def site(tmp_path: Path) -> Path:
+    """Directory with a manifest, an allowed file, a secret and a .env."""
+    (tmp_path / ".drop-publish").write_text("index.html\nassets/**\n")
+    (tmp_path / "index.html").write_text("<h1>hello</h1>")
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "app.js").write_text("console.log(1)")
+    (tmp_path / "assets" / ".env").write_text("SECRET=1")
+    (tmp_path / "secret.txt").write_text("secret")
+    return tmp_path
+
+
+@pytest.fixture
+def publish():
+    """Register a page for a source and return its ID."""
+
+    def add(source: Path) -> str:
+        page_id = f"testpage{next(_ids):08d}"
+        storage.add_page(page_id, source, "")
+        return page_id
+
+    return add
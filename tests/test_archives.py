@@ -0,0 +1,100 @@
+import gzip
+import io
+import itertools
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from drop import archives, storage
+
+SCRIPT = b"console.log('hello');\n" * 200  # Compressible: deflated in the zip
+MEMBERS = {
+    ".drop-publish": b"index.html\nassets/**\n",
+    "index.html": b"<h1>archive</h1>",
+    "assets/app.js": SCRIPT,
+    "assets/logo.png": bytes(range(256)) * 4,
+    "assets/.env": b"SECRET=1",
+    "secret.txt": b"secret",
+}
+
+_ids = itertools.count()
+
+
+def build_zip(path: Path, root: str = "") -> Path:
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in MEMBERS.items():
+            compression = zipfile.ZIP_DEFLATED if name.endswith(".js") else zipfile.ZIP_STORED
+            archive.writestr(root + name, data, compress_type=compression)
+        archive.writestr("../escape.html", b"escape")
+    return path
+
+
+def build_tar(path: Path, root: str = "") -> Path:
+    with tarfile.open(path, "w") as archive:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(root + name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo(root + "assets/passwd")
+        link.type, link.linkname = tarfile.SYMTYPE, "/etc/passwd"
+        archive.addfile(link)
+    return path
+
+
+@pytest.fixture(params=["zip", "tar", "zip in folder", "tar in folder"])
+def archive(request, tmp_path: Path) -> Path:
+    kind, _, folder = request.param.partition(" ")
+    build = build_zip if kind == "zip" else build_tar
+    return build(tmp_path / f"site.{kind}", "dist/" if folder else "")
+
+
+def test_index_members(archive: Path):
+    index = archives.ArchiveIndex(archive)
+    assert sorted(index.members) == ["assets/app.js", "assets/logo.png", "index.html"]
+    for name, member in index.members.items():
+        assert b"".join(index.read(member)) == MEMBERS[name]
+    assert index.lookup("")[0] == "index.html"
+    assert index.lookup("secret.txt") is None
+
+
+def test_archive_without_manifest(tmp_path: Path):
+    with zipfile.ZipFile(tmp_path / "bare.zip", "w") as archive:
+        archive.writestr("index.html", b"hi")
+    with pytest.raises(archives.ArchiveError):
+        archives.ArchiveIndex(tmp_path / "bare.zip")
+
+
+@pytest.fixture
+def page(archive: Path) -> str:
+    page_id = f"archivetest{next(_ids):05d}"
+    storage.add_page(page_id, archive, "", page_type="archive")
+    return page_id
+
+
+def test_served(client, page: str):
+    assert client.get(f"/p/{page}/").data == MEMBERS["index.html"]
+    response = client.get(f"/p/{page}/assets/logo.png")
+    assert response.status_code == 200 and response.data == MEMBERS["assets/logo.png"]
+    ranged = client.get(f"/p/{page}/assets/logo.png", headers={"Range": "bytes=10-19"})
+    assert ranged.status_code == 206 and ranged.data == MEMBERS["assets/logo.png"][10:20]
+    for path in ("secret.txt", "assets/.env", ".drop-publish", "assets/passwd", "../escape.html", "escape.html"):
+        assert client.get(f"/p/{page}/{path}").status_code == 404, path
+
+
+def test_deflated_member_as_gzip(client, tmp_path: Path):
+    page_id = f"archivetest{next(_ids):05d}"
+    storage.add_page(page_id, build_zip(tmp_path / "site.zip"), "", page_type="archive")
+    member = archives.get_index(tmp_path / "site.zip").members["assets/app.js"]
+    assert member.deflated
+    response = client.get(f"/p/{page_id}/assets/app.js", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) == len(response.data)
+    assert gzip.decompress(response.data) == SCRIPT
+    plain = client.get(f"/p/{page_id}/assets/app.js", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert plain.data == SCRIPT
+    assert client.get(
+        f"/p/{page_id}/assets/app.js", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]},
+    ).status_code == 304
@@ -0,0 +1,140 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from drop import fileindex
+from drop.fileindex import FileIndex
+
+
+def wait_for(check, timeout: float = 5.0):
+    """Poll check() until it returns a truthy value (background rebuilds)."""
+    deadline = time.monotonic() + timeout
+    while not (result := check()):
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.01)
+    return result
+
+
+@pytest.fixture(params=[True, False], ids=["watched", "rescanned"])
+def index(request, site: Path, monkeypatch):
+    if request.param and fileindex._shared_inotify() is None:
+        pytest.skip("inotify is not available")
+    monkeypatch.setattr(fileindex, "RESCAN_INTERVAL", 0.0)
+    index = FileIndex(site, watch=request.param)
+    yield index
+    index.close()
+
+
+def test_lookup(index: FileIndex, site: Path):
+    assert index.lookup("index.html") == site.resolve() / "index.html"
+    assert index.lookup("assets/app.js") == site.resolve() / "assets" / "app.js"
+    assert index.lookup("assets") == 403
+    for path in ("secret.txt", "assets/.env", ".drop-publish", "missing.js"):
+        assert index.lookup(path) == 404, path
+    assert index.lookup("../index.html") is None
+    assert sorted(index.files) == ["assets/app.js", "index.html"]
+
+
+def test_created_and_deleted(index: FileIndex, site: Path):
+    (site / "assets" / "new.js").write_text("new")
+    (site / "assets" / "css").mkdir()
+    (site / "assets" / "css" / "a.css").write_text("a")
+    wait_for(lambda: index.lookup("assets/css/a.css") == site.resolve() / "assets" / "css" / "a.css")
+    assert index.lookup("assets/new.js") == site.resolve() / "assets" / "new.js"
+    (site / "assets" / "app.js").unlink()
+    wait_for(lambda: index.lookup("assets/app.js") == 404)
+    assert index.lookup("index.html") == site.resolve() / "index.html"
+
+
+def test_directory_attributes_changed(index: FileIndex, site: Path):
+    assert index.lookup("assets/app.js") == site.resolve() / "assets" / "app.js"
+    os.chmod(site / "assets", 0o700)
+    os.utime(site / "assets")
+    (site / "assets" / "new.js").write_text("new")
+    wait_for(lambda: index.lookup("assets/new.js") == site.resolve() / "assets" / "new.js")
+    assert index.lookup("assets/app.js") == site.resolve() / "assets" / "app.js"
+
+
+def test_directory_moved_in_and_out(index: FileIndex, site: Path, tmp_path_factory):
+    outside = tmp_path_factory.mktemp("outside") / "lib"
+    (outside / "deep").mkdir(parents=True)
+    (outside / "deep" / "lib.js").write_text("lib")
+    os.rename(outside, site / "assets" / "lib")
+    moved = site.resolve() / "assets" / "lib" / "deep" / "lib.js"
+    wait_for(lambda: index.lookup("assets/lib/deep/lib.js") == moved)
+    (site / "assets" / "lib" / "deep" / "later.js").write_text("later")
+    wait_for(lambda: index.lookup("assets/lib/deep/later.js") == moved.with_name("later.js"))
+    os.rename(site / "assets" / "lib", outside)
+    wait_for(lambda: index.lookup("assets/lib/deep/lib.js") == 404)
+    assert index.lookup("assets/lib/deep/later.js") == 404
+    assert index.lookup("assets/app.js") == site.resolve() / "assets" / "app.js"
+
+
+def test_directory_deleted_and_recreated(index: FileIndex, site: Path):
+    shutil.rmtree(site / "assets")
+    wait_for(lambda: index.lookup("assets/app.js") == 404)
+    (site / "assets" / "js").mkdir(parents=True)
+    (site / "assets" / "js" / "app.js").write_text("again")
+    wait_for(lambda: index.lookup("assets/js/app.js") == site.resolve() / "assets" / "js" / "app.js")
+    assert index.lookup("assets/app.js") == 404
+    (site / "assets" / "app.js").write_text("back")
+    wait_for(lambda: index.lookup("assets/app.js") == site.resolve() / "assets" / "app.js")
+
+
+def test_manifest_change_rebuilds(index: FileIndex, site: Path):
+    (site / ".drop-publish").write_text("index.html\nsecret.txt\n")
+    wait_for(lambda: index.lookup("secret.txt") == site.resolve() / "secret.txt")
+    # Files the new manifest leaves out are no longer served
+    assert index.lookup("assets/app.js") == 404
+    assert index.lookup("index.html") == site.resolve() / "index.html"
+
+
+def test_symlink_escape_not_indexed(site: Path, tmp_path_factory):
+    outside = tmp_path_factory.mktemp("outside") / "private.txt"
+    outside.write_text("private")
+    (site / "assets" / "leak.txt").symlink_to(outside)
+    index = FileIndex(site, watch=False)
+    assert "assets/leak.txt" not in index.files
+    assert index.lookup("assets/leak.txt") == 404
+
+
+def test_least_recently_used_evicted(site: Path, tmp_path_factory, monkeypatch):
+    monkeypatch.setattr(fileindex, "INDEX_CACHE_SIZE", 2)
+    sources = [site]
+    for n in range(2):
+        other = tmp_path_factory.mktemp(f"site{n}")
+        (other / ".drop-publish").write_text("index.html\n")
+        (other / "index.html").write_text(str(n))
+        sources.append(other)
+    first, second, third = (str(source) for source in sources)
+    try:
+        assert fileindex.get(first) is None  # built in the background
+        first_index = wait_for(lambda: fileindex.get(first))
+        fileindex.get(second)
+        wait_for(lambda: fileindex.get(second))
+        fileindex.get(first)  # second is now least recently used
+        fileindex.get(third)
+        wait_for(lambda: fileindex.get(third))
+        assert list(fileindex._indexes) == [first, third]
+        assert fileindex.get(first) is first_index
+    finally:
+        fileindex.retain(set())
+
+
+def test_cache_bounded(site: Path, monkeypatch):
+    monkeypatch.setattr(fileindex, "INDEX_CACHE_SIZE", 2)
+    indexes = [FileIndex(site, watch=False) for _ in range(4)]
+    try:
+        for n, index in enumerate(indexes):
+            fileindex._indexes[f"/page{n}"] = (index, 0.0)
+        fileindex._indexes["/failed"] = (None, 0.0)
+        fileindex._indexes.move_to_end("/page0")  # Recently used
+        fileindex._evict()
+        assert list(fileindex._indexes) == ["/failed", "/page0"]
+        assert [index._closed for index in indexes] == [False, True, True, True]
+    finally:
+        fileindex.retain(set())
@@ -0,0 +1,31 @@
+from drop import storage
+
+
+def _page(client, cursor="", limit=2):
+    response = client.get("/api/pages", query_string={"cursor": cursor, "limit": limit})
+    assert response.status_code == 200
+    data = response.get_json()
+    return [page["id"] for page in data["pages"]], data["next_cursor"]
+
+
+def test_cursor_survives_removed_page(client, site, publish):
+    for _ in range(5):
+        publish(site)
+    ids, cursor = _page(client)
+    following, _ = _page(client, cursor)
+    storage.remove_page(cursor)
+    assert _page(client, cursor)[0] == following
+
+
+def test_pages_are_listed_once(client, site, publish):
+    for _ in range(5):
+        publish(site)
+    seen, cursor = _page(client)
+    while cursor:
+        ids, cursor = _page(client, cursor)
+        seen += ids
+    assert seen == sorted(storage.load_pages())
+
+
+def test_malformed_cursor(client):
+    assert client.get("/api/pages?cursor=../x").status_code == 400
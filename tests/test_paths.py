@@ -0,0 +1,110 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from drop import fileindex, server
+from drop.utils import ManifestMatcher, PathCache, matches_manifest, open_beneath, safe_path
+
+MANIFESTS = [
+    ["index.html"],
+    ["assets/**"],
+    ["*.html"],
+    ["docs", "img/"],
+    ["a?c.txt", "[ab].css"],
+    ["deep/**", "*.md", "exact/file.js"],
+    [],
+]
+PATHS = [
+    "index.html", "sub/index.html", "assets", "assets/app.js", "assets/css/a.css", "assetsx/a.js",
+    "page.html", "docs", "docs/guide/intro.md", "docsx", "img/logo.png", "img", "abc.txt", "a/c.txt",
+    "a.css", "c.css", "deep", "deep/x/y/z", "README.md", "exact/file.js", "exact/file.jsx", "",
+]
+
+
+@pytest.mark.parametrize("patterns", MANIFESTS)
+def test_matcher_agrees_with_matches_manifest(patterns):
+    matcher = ManifestMatcher(patterns)
+    for path in PATHS:
+        assert matcher.matches(path) == matches_manifest(path, patterns), path
+
+
+@pytest.fixture
+def escape(site: Path, tmp_path_factory) -> Path:
+    """site with assets/leak.txt -> a file outside the site."""
+    outside = tmp_path_factory.mktemp("outside") / "private.txt"
+    outside.write_text("private")
+    (site / "assets" / "leak.txt").symlink_to(outside)
+    return site
+
+
+def test_safe_path_rules(escape: Path):
+    manifest = ManifestMatcher(["index.html", "assets/**"])
+    assert safe_path(escape, "index.html", manifest) == escape / "index.html"
+    assert safe_path(escape, "assets/leak.txt", manifest) is None
+    assert safe_path(escape, "assets/.env", manifest) is None
+    assert safe_path(escape, "secret.txt", manifest) is None
+    assert safe_path(escape, "../" + escape.name + "/index.html", manifest) == escape / "index.html"
+    assert safe_path(escape, "../etc/passwd", manifest) is None
+
+
+def test_open_beneath_rules(escape: Path):
+    manifest = ManifestMatcher(["index.html", "assets/**"])
+    fd = open_beneath(escape, "index.html", manifest)
+    assert fd is not None
+    os.close(fd)
+    for path in ("assets/leak.txt", "assets/.env", "secret.txt", "../index.html"):
+        assert open_beneath(escape, path, manifest) is None, path
+
+
+@pytest.fixture(params=["resolve", "strict", "index"])
+def mode(request, monkeypatch):
+    """Serve through per-request checks, --strict-paths, or a ready file index."""
+    if request.param == "strict":
+        monkeypatch.setattr(server, "STRICT_PATHS", True)
+    elif request.param == "resolve":
+        monkeypatch.setattr(fileindex, "get", lambda source: None)
+    else:
+        monkeypatch.setattr(fileindex, "get", lambda source: fileindex.FileIndex(Path(source), watch=False))
+    return request.param
+
+
+def test_served_and_blocked(client, escape, publish, mode):
+    page_id = publish(escape)
+    assert client.get(f"/p/{page_id}/").data == b"<h1>hello</h1>"
+    assert client.get(f"/p/{page_id}/assets/app.js").status_code == 200
+    for path in ("assets/leak.txt", "assets/.env", "secret.txt", ".drop-publish"):
+        assert client.get(f"/p/{page_id}/{path}").status_code == 404, path
+
+
+def test_tree_changes_seen_at_once(client, site, publish, mode):
+    page_id = publish(site)
+    assert client.get(f"/p/{page_id}/assets/app.js").status_code == 200
+    assert client.get(f"/p/{page_id}/assets/new.js").status_code == 404
+    (site / "assets" / "new.js").write_text("new")
+    assert client.get(f"/p/{page_id}/assets/new.js").status_code == 200
+    (site / "assets" / "new.js").unlink()
+    assert client.get(f"/p/{page_id}/assets/new.js").status_code == 404
+    (site / ".drop-publish").write_text("index.html\n")
+    assert client.get(f"/p/{page_id}/assets/app.js").status_code == 404
+
+
+def test_path_cache_stamp():
+    cache = PathCache()
+    cache.put("a", 1, stamp=(1, 2))
+    assert cache.get("a", (1, 2)) == 1
+    assert cache.get("a", (1, 3)) is PathCache.MISS
+    assert cache.get("a", (1, 2)) is PathCache.MISS  # Dropped on mismatch
+
+
+def test_path_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("drop.utils.time.monotonic", lambda: now[0])
+    cache = PathCache(maxsize=2, ttl=2.0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # "b" is least recently used
+    assert cache.get("b") is PathCache.MISS
+    now[0] += 2.5
+    assert cache.get("a") is PathCache.MISS
@@ -0,0 +1,114 @@
+import itertools
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from drop import proxy, server, storage
+from drop.engine import PooledWSGIServer, RequestHandler
+
+_ids = itertools.count()
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """App answering with the request it received; upgrades become a byte echo."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.headers.get("Upgrade") == "websocket":
+            self.wfile.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n\r\n")
+            self.wfile.flush()
+            while data := self.connection.recv(1024):
+                self.connection.sendall(data)
+            self.close_connection = True
+            return
+        body = json.dumps({"path": self.path, "headers": self.headers.items()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Keep-Alive", "timeout=5")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def app_name(tmp_path: Path):
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    name = f"proxytest{next(_ids)}"
+    storage.add_page(f"proxytest{next(_ids):07d}", tmp_path, "", name=name, page_type="app",
+                     port=upstream.server_address[1])
+    yield name
+    upstream.shutdown()
+    upstream.server_close()
+
+
+def test_forward_headers(client, app_name: str):
+    client.set_cookie("drop_auth_other", "token")
+    client.set_cookie("theme", "dark")
+    response = client.get(
+        f"/a/{app_name}/api/items%2F1?q=a+b",
+        headers={"X-Forwarded-For": "203.0.113.7", "Connection": "keep-alive, X-Private", "TE": "trailers"},
+        environ_base={"REMOTE_ADDR": "198.51.100.2", "RAW_URI": f"/a/{app_name}/api/items%2F1?q=a+b"},
+    )
+    assert response.status_code == 200
+    assert "Keep-Alive" not in response.headers
+    echoed = response.get_json()
+    headers = {name.lower(): value for name, value in echoed["headers"]}
+    assert echoed["path"] == "/api/items%2F1?q=a+b"
+    assert headers["cookie"] == "theme=dark"
+    assert headers["x-forwarded-for"] == "203.0.113.7, 198.51.100.2"
+    assert headers["x-forwarded-prefix"] == f"/a/{app_name}"
+    assert headers["x-forwarded-proto"] == "http"
+    assert "te" not in headers and "keep-alive" not in headers
+
+
+def test_upgrade_needs_threaded_engine(client, app_name: str):
+    # The asyncio engine exposes no drop.socket to take over
+    response = client.get(f"/a/{app_name}/ws", headers={"Connection": "Upgrade", "Upgrade": "websocket"})
+    assert response.status_code == 501
+
+
+def _upgrade(port: int, app_name: str) -> tuple[socket.socket, bytes]:
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    sock.sendall(
+        f"GET /a/{app_name}/ws HTTP/1.1\r\nHost: localhost\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n\r\n".encode()
+    )
+    reply = b""
+    while b"\r\n\r\n" not in reply:
+        reply += sock.recv(1024)
+    return sock, reply
+
+
+def test_tunnels_capped(app_name: str, monkeypatch):
+    monkeypatch.setattr(proxy, "MAX_TUNNELS", 1)
+    httpd = PooledWSGIServer("127.0.0.1", 0, server.app, RequestHandler, threads=4)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+    try:
+        first, reply = _upgrade(port, app_name)
+        assert reply.startswith(b"HTTP/1.1 101")
+        first.sendall(b"ping")
+        assert first.recv(1024) == b"ping"
+        second, reply = _upgrade(port, app_name)
+        second.close()
+        assert reply.startswith(b"HTTP/1.1 503")
+        first.close()
+        for _ in range(50):
+            third, reply = _upgrade(port, app_name)
+            third.close()
+            if reply.startswith(b"HTTP/1.1 101"):
+                break
+            threading.Event().wait(0.05)  # Until the first tunnel's thread lets go
+        assert reply.startswith(b"HTTP/1.1 101")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
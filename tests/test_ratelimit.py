@@ -0,0 +1,105 @@
+import os
+import threading
+
+import pytest
+
+from drop import ratelimit
+from drop.ratelimit import MemoryRateLimiter, SqliteRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controlled time for both limiters (monotonic and wall clock)."""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(ratelimit.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make(request, tmp_path):
+    def make(limit: int = 5, window: float = 60, max_keys: int = ratelimit.MAX_KEYS):
+        if request.param == "memory":
+            return MemoryRateLimiter(limit, window, max_keys)
+        return SqliteRateLimiter(tmp_path / "ratelimit.db", limit, window, max_keys)
+
+    return make
+
+
+def test_burst_then_refill(make, clock):
+    limiter = make(limit=5, window=60)
+    for _ in range(5):
+        assert limiter.allow("1.2.3.4", "page")
+        limiter.record_failure("1.2.3.4", "page")
+    assert not limiter.allow("1.2.3.4", "page")
+    assert limiter.allow("1.2.3.4", "other")
+    assert limiter.allow("5.6.7.8", "page")
+    clock[0] += 11  # One token per 12 s
+    assert not limiter.allow("1.2.3.4", "page")
+    clock[0] += 1
+    assert limiter.allow("1.2.3.4", "page")
+    limiter.record_failure("1.2.3.4", "page")
+    assert not limiter.allow("1.2.3.4", "page")
+    clock[0] += 600  # Refills to the limit, not beyond
+    for _ in range(5):
+        limiter.record_failure("1.2.3.4", "page")
+    assert not limiter.allow("1.2.3.4", "page")
+
+
+def test_keys_bounded(make, clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "SWEEP_EVERY", 1)
+    limiter = make(limit=1, max_keys=3)
+    for n in range(10):
+        clock[0] += 1
+        limiter.record_failure(f"10.0.0.{n}", "page")
+    # The most recent keys stay limited; dropped ones start afresh
+    assert not limiter.allow("10.0.0.9", "page")
+    assert not limiter.allow("10.0.0.7", "page")
+    assert limiter.allow("10.0.0.0", "page")
+    if isinstance(limiter, MemoryRateLimiter):
+        assert len(limiter) == 3
+    else:
+        assert limiter._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0] == 3
+
+
+def test_idle_keys_swept(make, clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "SWEEP_EVERY", 2)
+    limiter = make(limit=2, window=60)
+    limiter.record_failure("10.0.0.1", "page")
+    clock[0] += 120
+    limiter.record_failure("10.0.0.2", "page")  # Second operation: sweeps the refilled bucket
+    if isinstance(limiter, MemoryRateLimiter):
+        assert len(limiter) == 1
+    else:
+        assert limiter._connect().execute("SELECT key FROM buckets").fetchall() == [("10.0.0.2 page",)]
+
+
+def test_concurrent_failures_all_counted(make):
+    limiter = make(limit=400, window=3600)
+
+    def fail():
+        for _ in range(100):
+            limiter.record_failure("1.2.3.4", "page")
+
+    threads = [threading.Thread(target=fail) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not limiter.allow("1.2.3.4", "page")
+
+
+def test_sqlite_shared_between_workers(tmp_path):
+    limiter = SqliteRateLimiter(tmp_path / "ratelimit.db", 3, 60)
+    pid = os.fork()
+    if pid == 0:
+        # A prefork worker spends the tokens
+        try:
+            for _ in range(3):
+                limiter.record_failure("1.2.3.4", "page")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert not limiter.allow("1.2.3.4", "page")
+    assert not SqliteRateLimiter(tmp_path / "ratelimit.db", 3, 60).allow("1.2.3.4", "page")
+    assert limiter.allow("1.2.3.4", "other")
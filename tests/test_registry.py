@@ -0,0 +1,105 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from drop import storage
+
+
+def test_snapshot_reused_until_registry_changes(tmp_path: Path):
+    before = storage.registry_snapshot()
+    assert storage.registry_snapshot() is before
+    storage.add_page("registrytest0001", tmp_path, "")
+    after = storage.registry_snapshot()
+    assert after is not before
+    assert after.resolve("registrytest0001") == "registrytest0001"
+    storage.remove_page("registrytest0001")
+    assert storage.registry_snapshot().resolve("registrytest0001") is None
+
+
+def test_edit_by_another_writer_is_seen(tmp_path: Path):
+    storage.add_page("registrytest0002", tmp_path, "", name="before")
+    assert storage.get_page("before") is not None
+    # What another drop process does: rewrite pages.json atomically
+    pages = json.loads(storage.PAGES_FILE.read_text())
+    pages["registrytest0002"]["name"] = "after"
+    storage.atomic_write_text(storage.PAGES_FILE, json.dumps(pages))
+    assert storage.get_page("before") is None
+    assert storage.get_page("after")["source"] == str(tmp_path)
+
+
+@pytest.mark.parametrize("backend", [storage.JsonBackend, storage.SqliteBackend])
+def test_fingerprint_changes_on_every_write(tmp_path: Path, backend):
+    store = backend(tmp_path / "pages")
+    info = storage.page_info(tmp_path, "")
+    seen = [store.fingerprint()]
+    store.put({"registrytest0003": info})
+    seen.append(store.fingerprint())
+    store.update("registrytest0003", {"pid": 42})
+    seen.append(store.fingerprint())
+    store.delete(["registrytest0003"])
+    seen.append(store.fingerprint())
+    assert len(set(map(repr, seen))) == len(seen)
+    assert store.load() == {}
+
+
+def test_sqlite_generation_bumped_by_other_connections(tmp_path: Path):
+    import sqlite3
+
+    store = storage.SqliteBackend(tmp_path / "pages.db")
+    store.put({"registrytest0004": storage.page_info(tmp_path, "")})
+    before = store.fingerprint()
+    # Another process writing rows directly: the triggers bump the generation
+    other = sqlite3.connect(tmp_path / "pages.db", isolation_level=None)
+    other.execute("UPDATE pages SET name = 'renamed' WHERE id = 'registrytest0004'")
+    other.close()
+    assert store.fingerprint() != before
+
+
+def test_sqlite_schema_created_once(tmp_path: Path):
+    import sqlite3
+
+    path = tmp_path / "pages.db"
+    storage.SqliteBackend(path).put({"registrytest0005": storage.page_info(tmp_path, "")})
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        # A new connection (new server thread) only reads: a held write lock does not stall it
+        store = storage.SqliteBackend(path)
+        thread = threading.Thread(target=lambda: result.append(store.load()), daemon=True)
+        result = []
+        thread.start()
+        thread.join(timeout=5)
+        assert list(result[0]) == ["registrytest0005"]
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+@pytest.fixture
+def registry(tmp_path: Path, monkeypatch):
+    """Empty registry files in a temporary directory."""
+    monkeypatch.setattr(storage, "PAGES_FILE", tmp_path / "pages.json")
+    monkeypatch.setattr(storage, "PAGES_DB", tmp_path / "pages.db")
+    monkeypatch.setattr(storage, "_backends", {})
+    return tmp_path
+
+
+def test_migrate_registry_round_trip(registry: Path):
+    storage.add_page("registrytest0006", registry, "", name="first")
+    storage.add_page("registrytest0007", registry, "described")
+    pages = storage.load_pages()
+    assert storage.migrate_registry("sqlite") == 2
+    assert storage.get_backend().kind == "sqlite"
+    assert (registry / "pages.json.bak").exists() and not (registry / "pages.json").exists()
+    assert storage.load_pages() == pages
+    storage.update_page_pid("registrytest0007", 42)
+    with pytest.raises(ValueError):
+        storage.migrate_registry("sqlite")
+    assert storage.migrate_registry("json") == 2
+    assert storage.get_backend().kind == "json"
+    assert (registry / "pages.db.bak").exists() and not (registry / "pages.db").exists()
+    assert list(storage.load_pages()) == ["registrytest0006", "registrytest0007"]
+    assert storage.get_page("first")["source"] == str(registry)
+    assert storage.load_pages()["registrytest0007"]["pid"] == 42
@@ -0,0 +1,24 @@
+import os
+from pathlib import Path
+
+from drop import snapshots
+
+
+def test_snapshot_holds_manifest_files(site: Path):
+    digest, count, size = snapshots.create(site)
+    tree = snapshots.load_tree(digest)
+    assert sorted(tree) == ["assets/app.js", "index.html"]
+    assert (count, size) == (2, len("<h1>hello</h1>") + len("console.log(1)"))
+    assert snapshots.lookup(tree, "")[0] == "index.html"
+
+
+def test_unreadable_tree_is_retried(site: Path):
+    digest, _count, _size = snapshots.create(site)
+    snapshots._read_tree.cache_clear()
+    path = snapshots.object_path(digest)
+    os.rename(path, path.with_name("moved"))
+    try:
+        assert snapshots.load_tree(digest) is None
+    finally:
+        os.rename(path.with_name("moved"), path)
+    assert sorted(snapshots.load_tree(digest)) == ["assets/app.js", "index.html"]
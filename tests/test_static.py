@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize("header", ["bytes=x-5", "bytes=0-1,x-5", "bytes=²-5", "bytes=0-²", "bytes=-", "bytes=5"])
+def test_malformed_range_is_ignored(client, site, publish, header):
+    page_id = publish(site)
+    response = client.get(f"/p/{page_id}/index.html", headers={"Range": header})
+    assert response.status_code == 200
+    assert response.data == b"<h1>hello</h1>"
+
+
+def test_range(client, site, publish):
+    page_id = publish(site)
+    response = client.get(f"/p/{page_id}/index.html", headers={"Range": "bytes=4-7"})
+    assert response.status_code == 206
+    assert response.data == b"hell"
+    response = client.get(f"/p/{page_id}/index.html", headers={"Range": "bytes=-5"})
+    assert response.data == b"</h1>"